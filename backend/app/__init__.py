@@ -1,6 +1,10 @@
+import time
 from flask import Flask
 from flask_cors import CORS
 
+# Cold-start timings are measured from the first import of the app package
+BOOT_STARTED = time.perf_counter()
+
 
 def create_app():
     app = Flask(__name__)
@@ -15,6 +19,8 @@ def create_app():
     from app.routes.stock_routes import stock_bp
     from app.routes.cash_transactions_routes import cash_transactions_bp
     from app.routes.friends_routes import friends_bp
+    from app.routes.search_routes import search_bp
+    from app.routes.job_routes import jobs_bp
 
     # Register blueprints
     app.register_blueprint(user_bp)
@@ -25,5 +31,17 @@ def create_app():
     app.register_blueprint(stock_bp)
     app.register_blueprint(cash_transactions_bp)
     app.register_blueprint(friends_bp)
+    app.register_blueprint(search_bp)
+    app.register_blueprint(jobs_bp)
+
+    # /healthz, /readyz and 503s until startup finishes (see app.lifecycle)
+    from app.lifecycle import register_lifecycle
+
+    register_lifecycle(app)
+
+    # gzip (or br/zstd when installed) for large JSON and streamed exports
+    from app.compression import register_compression
+
+    register_compression(app)
 
     return app
@@ -0,0 +1,76 @@
+import numpy as np
+
+# Vectorized portfolio backtests over a (days x symbols) close matrix with no
+# gaps. Between rebalances each variant is buy-and-hold, so its value is one
+# matrix product per day; rebalancing chains the segments with a cumprod.
+
+TRADING_DAYS = 252
+REBALANCE_PERIODS = {"weekly": "W", "monthly": "M", "quarterly": "Q", "yearly": "Y"}
+
+
+def rebalance_starts(days, rebalance):
+    # Row indexes where holdings reset to the target weights: the first
+    # trading day of each period, every N trading days, or only row 0
+    if rebalance in (None, "none"):
+        return np.array([0])
+    if isinstance(rebalance, int):
+        return np.arange(0, len(days), rebalance)
+
+    dates = days.astype("datetime64[D]")
+    if rebalance == "weekly":
+        # Day 0 (1970-01-01) was a Thursday; weeks start on Monday
+        periods = (days + 3) // 7
+    elif rebalance == "quarterly":
+        periods = dates.astype("datetime64[M]").astype(np.int64) // 3
+    else:
+        unit = REBALANCE_PERIODS[rebalance]
+        periods = dates.astype(f"datetime64[{unit}]").astype(np.int64)
+    return np.concatenate([[0], np.flatnonzero(np.diff(periods)) + 1])
+
+
+def simulate(closes, weights, starts, initial=1.0):
+    # closes: (days x symbols); weights: (variants x symbols), rows summing
+    # to 1; starts: sorted rebalance rows beginning with 0. Returns equity
+    # (days x variants), rebalancing at the close of each start row.
+    segment = np.searchsorted(starts, np.arange(len(closes)), side="right") - 1
+    growth = (closes / closes[starts[segment]]) @ weights.T
+
+    # Each segment starts with what the previous one ended at
+    factors = (closes[starts[1:]] / closes[starts[:-1]]) @ weights.T
+    start_values = initial * np.vstack(
+        [np.ones((1, len(weights))), np.cumprod(factors, axis=0)]
+    )
+    return start_values[segment] * growth
+
+
+def summarize(equity, days, risk_free_rate=0.0):
+    # Metrics per variant (column of equity)
+    years = (days[-1] - days[0]) / 365.25
+    ratio = equity[-1] / equity[0]
+    returns = equity[1:] / equity[:-1] - 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cagr = ratio ** (1 / years) - 1 if years > 0 else np.full(len(ratio), np.nan)
+        volatility = returns.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+        excess = returns.mean(axis=0) * TRADING_DAYS - risk_free_rate
+        sharpe = excess / volatility
+    drawdown = equity / np.maximum.accumulate(equity, axis=0) - 1
+
+    def clean(values):
+        return [round(float(v), 6) if np.isfinite(v) else None for v in values]
+
+    columns = {
+        "final_value": clean(equity[-1]),
+        "total_return": clean(ratio - 1),
+        "cagr": clean(cagr),
+        "volatility": clean(volatility),
+        "sharpe": clean(sharpe),
+        "max_drawdown": clean(drawdown.min(axis=0)),
+    }
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
+def run_backtest(closes, days, weights, rebalance, initial=1.0, risk_free_rate=0.0):
+    # One rebalance schedule, any number of weight vectors; top-level so a
+    # process pool can run schedules side by side
+    equity = simulate(closes, weights, rebalance_starts(days, rebalance), initial)
+    return equity, summarize(equity, days, risk_free_rate)
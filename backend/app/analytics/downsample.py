@@ -0,0 +1,37 @@
+import numpy as np
+
+# Largest-Triangle-Three-Buckets (Steinarsson, 2013): keeps the first and last
+# point and, from each bucket in between, the point forming the largest
+# triangle with the previously kept point and the next bucket's average. Peaks
+# and troughs survive, unlike plain striding.
+
+
+def lttb(x, y, threshold):
+    # Returns the indexes of the kept points; x must be increasing
+    count = len(x)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket edges over the points between the first and last
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, count - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Average of the next bucket (or the last point for the final bucket)
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else count
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        # Twice the triangle area, for every candidate in the bucket at once
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        kept[bucket + 1] = previous
+    return kept
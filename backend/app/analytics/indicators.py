@@ -0,0 +1,168 @@
+import numpy as np
+
+# Technical indicators over (rows x symbols) matrices, every symbol at once.
+# Columns are expected packed (see pack_columns): each symbol's trading days
+# contiguous from the top, so windows count trading days, not calendar gaps.
+# Warm-up rows without enough history are NaN.
+
+MAX_PERIOD = 500
+
+
+def pack_columns(valid, *matrices):
+    # Moves each column's valid rows to the top, keeping their order; returns
+    # the row order used so results can be mapped back to dates
+    order = np.argsort(~valid, axis=0, kind="stable")
+    packed = [np.take_along_axis(m, order, axis=0) for m in matrices]
+    for m in packed:
+        m[np.arange(len(m))[:, None] >= valid.sum(axis=0)] = np.nan
+    return order, packed
+
+
+def rolling_mean(x, window):
+    return _rolling_sums(x, window)[0]
+
+
+def rolling_std(x, window):
+    mean, mean_sq = _rolling_sums(x, window)
+    return np.sqrt(np.maximum(mean_sq - mean * mean, 0.0))
+
+
+def _rolling_sums(x, window):
+    # Windowed means of x and x^2 from cumulative sums; NaN until a window
+    # holds `window` finite values
+    finite = np.isfinite(x)
+    values = np.where(finite, x, 0.0)
+    pad = np.zeros((1, x.shape[1]))
+    sums = np.concatenate([pad, np.cumsum(values, axis=0)])
+    squares = np.concatenate([pad, np.cumsum(values * values, axis=0)])
+    counts = np.concatenate([pad, np.cumsum(finite, axis=0)])
+
+    def windowed(c):
+        out = np.full_like(x, np.nan)
+        out[window - 1 :] = c[window:] - c[:-window]
+        return out
+
+    n = windowed(counts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = windowed(sums) / n
+        mean_sq = windowed(squares) / n
+    full = n == window
+    mean[~full] = np.nan
+    mean_sq[~full] = np.nan
+    return mean, mean_sq
+
+
+def ewm(x, alpha, min_periods=1):
+    # Exponential smoothing seeded with the first value; steps over NaN rows
+    # keeping the previous state. Loops over rows, vectorized across symbols.
+    out = np.full_like(x, np.nan)
+    state = np.full(x.shape[1], np.nan)
+    for row in range(len(x)):
+        value = x[row]
+        ok = np.isfinite(value)
+        state = np.where(
+            ok, np.where(np.isnan(state), value, state + alpha * (value - state)), state
+        )
+        out[row] = np.where(ok, state, np.nan)
+    out[np.cumsum(np.isfinite(x), axis=0) < min_periods] = np.nan
+    return out
+
+
+def _diff(x):
+    out = np.full_like(x, np.nan)
+    out[1:] = x[1:] - x[:-1]
+    return out
+
+
+def rsi(close, period=14):
+    # Wilder's RSI: smoothed average gain over smoothed average loss
+    change = _diff(close)
+    gain = ewm(np.clip(change, 0, None), 1 / period, period)
+    loss = ewm(np.clip(-change, 0, None), 1 / period, period)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        value = 100 - 100 / (1 + gain / loss)
+    value[(loss == 0) & (gain > 0)] = 100.0
+    return {"rsi": value}
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    line = ewm(close, 2 / (fast + 1), fast) - ewm(close, 2 / (slow + 1), slow)
+    signal_line = ewm(line, 2 / (signal + 1), signal)
+    return {"macd": line, "signal": signal_line, "histogram": line - signal_line}
+
+
+def bollinger(close, period=20, width=2.0):
+    middle = rolling_mean(close, period)
+    spread = width * rolling_std(close, period)
+    return {"middle": middle, "upper": middle + spread, "lower": middle - spread}
+
+
+def atr(high, low, close, period=14):
+    # Average true range with Wilder smoothing
+    previous = np.full_like(close, np.nan)
+    previous[1:] = close[:-1]
+    # fmax ignores NaN, so the first row falls back to high - low
+    true_range = np.fmax(
+        high - low, np.fmax(np.abs(high - previous), np.abs(low - previous))
+    )
+    return {"atr": ewm(true_range, 1 / period, period)}
+
+
+# name -> (function, default parameters, price fields it reads)
+INDICATORS = {
+    "rsi": (rsi, (14,), ("close",)),
+    "macd": (macd, (12, 26, 9), ("close",)),
+    "bollinger": (bollinger, (20, 2.0), ("close",)),
+    "atr": (atr, (14,), ("high", "low", "close")),
+}
+
+
+def parse_indicators(text):
+    # "rsi,macd:8:21:5,bollinger:20:2.5" -> [("rsi", (14,)), ...]; missing
+    # trailing parameters take their defaults
+    specs = []
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        name, *values = item.lower().split(":")
+        if name not in INDICATORS:
+            raise ValueError(f"Unknown indicator: {name}")
+        defaults = INDICATORS[name][1]
+        if len(values) > len(defaults):
+            raise ValueError(f"Too many parameters for {name}")
+        try:
+            params = (
+                tuple(type(default)(value) for default, value in zip(defaults, values))
+                + defaults[len(values) :]
+            )
+        except ValueError:
+            raise ValueError(f"Invalid parameters for {name}") from None
+        if not all(0 < p <= MAX_PERIOD for p in params):
+            raise ValueError(
+                f"Parameters for {name} must be between 0 and {MAX_PERIOD}"
+            )
+        if (name, params) not in specs:
+            specs.append((name, params))
+    if not specs:
+        raise ValueError("At least one indicator is required")
+    return specs
+
+
+def spec_key(name, params):
+    return ":".join([name, *(f"{p:g}" for p in params)])
+
+
+def compute(specs, prices):
+    # prices: field -> packed matrix; returns spec key -> output -> matrix
+    results = {}
+    for name, params in specs:
+        function, _, fields = INDICATORS[name]
+        results[spec_key(name, params)] = function(
+            *(prices[field] for field in fields), *params
+        )
+    return results
+
+
+def required_fields(specs):
+    fields = {"close"}
+    for name, _ in specs:
+        fields.update(INDICATORS[name][2])
+    return tuple(sorted(fields))
@@ -0,0 +1,111 @@
+import numpy as np
+
+# Mean-variance optimization in closed form (Markowitz with a budget
+# constraint, short positions allowed). Inputs are daily simple returns as a
+# (days x assets) matrix with NaN gaps; outputs are annualized.
+
+TRADING_DAYS = 252
+# Added to the covariance diagonal, relative to its average variance, so
+# nearly collinear assets still give a solvable system
+RIDGE = 1e-8
+
+
+def daily_returns(closes):
+    returns = closes[1:] / closes[:-1] - 1
+    returns[~np.isfinite(returns)] = np.nan
+    return returns
+
+
+def pairwise_covariance(returns):
+    # Sample covariance over the days each pair has in common, vectorized as
+    # three matrix products instead of a loop over pairs
+    present = np.isfinite(returns).astype(np.float64)
+    x = np.where(present > 0, returns, 0.0)
+
+    counts = present.T @ present
+    cross = x.T @ x
+    sums = x.T @ present  # sums[i, j]: sum of asset i over days with asset j
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = (cross - sums * sums.T / counts) / (counts - 1)
+    cov[counts < 2] = 0.0
+    return cov, counts
+
+
+def nearest_psd(cov):
+    # Pairwise estimates need not be positive semi-definite; clip eigenvalues
+    values, vectors = np.linalg.eigh((cov + cov.T) / 2)
+    floor = RIDGE * max(values.mean(), RIDGE)
+    return (vectors * np.maximum(values, floor)) @ vectors.T
+
+
+def estimate(returns, min_observations=20):
+    # Assets with too little history are dropped; returns the kept column
+    # indexes with annualized mean returns and covariance
+    observations = np.isfinite(returns).sum(axis=0)
+    keep = np.flatnonzero(observations >= min_observations)
+    returns = returns[:, keep]
+
+    mean = np.nanmean(returns, axis=0) * TRADING_DAYS if len(keep) else np.empty(0)
+    cov, _ = pairwise_covariance(returns)
+    cov = nearest_psd(cov) * TRADING_DAYS if len(keep) else cov
+    return keep, mean, cov
+
+
+def _solve(cov, rhs):
+    ridge = RIDGE * np.trace(cov) / len(cov)
+    return np.linalg.solve(cov + ridge * np.eye(len(cov)), rhs)
+
+
+def portfolio_stats(weights, mean, cov, risk_free_rate=0.0):
+    expected = float(weights @ mean)
+    volatility = float(np.sqrt(max(weights @ cov @ weights, 0.0)))
+    sharpe = (expected - risk_free_rate) / volatility if volatility else None
+    return {"return": expected, "volatility": volatility, "sharpe": sharpe}
+
+
+def min_variance_weights(cov):
+    inv_ones = _solve(cov, np.ones(len(cov)))
+    return inv_ones / inv_ones.sum()
+
+
+def max_sharpe_weights(mean, cov, risk_free_rate=0.0):
+    inv_excess = _solve(cov, mean - risk_free_rate)
+    total = inv_excess.sum()
+    # With a non-positive sum the normalized vector is the lower tangency,
+    # the worst Sharpe ratio on the frontier; there is no maximum-Sharpe
+    # portfolio then, so fall back to minimum variance
+    if total <= 1e-12:
+        return min_variance_weights(cov)
+    return inv_excess / total
+
+
+def efficient_frontier(mean, cov, points=25):
+    # Every frontier portfolio is a combination of inv(C)1 and inv(C)mu:
+    # w(r) = (C*inv1 - B*invmu + r*(A*invmu - B*inv1)) / D
+    inv_ones = _solve(cov, np.ones(len(cov)))
+    inv_mean = _solve(cov, mean)
+    a, b, c = inv_ones.sum(), inv_mean.sum(), mean @ inv_mean
+    d = a * c - b * b
+    if d <= 1e-12:
+        return []
+
+    start = b / a  # return of the minimum-variance portfolio
+    targets = np.linspace(start, max(mean.max(), start), points)
+    weights = (
+        np.outer(c - b * targets, inv_ones) + np.outer(a * targets - b, inv_mean)
+    ) / d
+    variances = np.einsum("ij,jk,ik->i", weights, cov, weights)
+    return [
+        {"return": float(r), "volatility": float(np.sqrt(max(v, 0.0)))}
+        for r, v in zip(targets, variances)
+    ]
+
+
+def optimize(mean, cov, risk_free_rate=0.0, points=25):
+    min_var = min_variance_weights(cov)
+    tangency = max_sharpe_weights(mean, cov, risk_free_rate)
+    return {
+        "min_variance": (min_var, portfolio_stats(min_var, mean, cov, risk_free_rate)),
+        "max_sharpe": (tangency, portfolio_stats(tangency, mean, cov, risk_free_rate)),
+        "frontier": efficient_frontier(mean, cov, points),
+    }
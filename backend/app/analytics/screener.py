@@ -0,0 +1,297 @@
+import re
+import numpy as np
+from .indicators import pack_columns
+
+# Cross-sectional metrics for every symbol at once, plus a small filter/sort
+# language evaluated as NumPy masks. Expressions are parsed by hand, never
+# eval()'d: only metric names, numbers, comparisons, and/or/not and
+# parentheses are accepted.
+
+TRADING_DAYS = 252
+WINDOWS = (5, 21, 63, 90, 126, 252)
+WINDOWED_METRICS = ("return", "volatility", "avg_volume", "beta")
+METRICS = ("close",) + tuple(
+    f"{metric}_{window}" for metric in WINDOWED_METRICS for window in WINDOWS
+)
+
+COMPARISONS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "=": np.equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+TOKEN = re.compile(
+    r"\s*(?:(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+    r"|(?P<name>[A-Za-z_][A-Za-z0-9_]*)"
+    r"|(?P<op><=|>=|!=|==|=|<|>|\(|\)|-))"
+)
+
+# Filters arrive in a query string; both limits keep parsing and evaluation
+# well inside Python's recursion limit
+MAX_FILTER_LENGTH = 1000
+MAX_FILTER_DEPTH = 16
+
+
+def compute_metrics(closes, volumes, market_returns):
+    # closes/volumes: (days x symbols) aligned on the same days, with
+    # market_returns (days) on those days too. Each symbol is measured back
+    # from its own last close.
+    returns = np.full_like(closes, np.nan)
+    returns[1:] = closes[1:] / closes[:-1] - 1
+    valid = np.isfinite(closes)
+    market = np.broadcast_to(market_returns[:, None], closes.shape)
+    _, (closes, volumes, returns, market) = pack_columns(
+        valid, closes, volumes, returns, market
+    )
+    last = valid.sum(axis=0) - 1
+    columns = np.arange(closes.shape[1])
+
+    metrics = {
+        "close": np.where(last >= 0, closes[np.maximum(last, 0), columns], np.nan)
+    }
+    for window in WINDOWS:
+        start = last - window
+        with np.errstate(invalid="ignore", divide="ignore"):
+            metrics[f"return_{window}"] = np.where(
+                start >= 0,
+                metrics["close"] / closes[np.maximum(start, 0), columns] - 1,
+                np.nan,
+            )
+
+        # Rows (last - window, last], masked per column
+        rows = np.arange(len(closes))[:, None]
+        in_window = (rows > start) & (rows <= last) & (start >= 0)
+        metrics[f"volatility_{window}"] = _masked_std(returns, in_window) * np.sqrt(
+            TRADING_DAYS
+        )
+        metrics[f"avg_volume_{window}"] = _masked_mean(volumes, in_window)
+        metrics[f"beta_{window}"] = _masked_beta(returns, market, in_window)
+    return metrics
+
+
+def _masked_mean(values, mask):
+    mask = mask & np.isfinite(values)
+    count = mask.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(mask, values, 0.0).sum(axis=0) / count
+    return np.where(count > 0, mean, np.nan)
+
+
+def _masked_std(values, mask):
+    mask = mask & np.isfinite(values)
+    mean = _masked_mean(values, mask)
+    count = mask.sum(axis=0)
+    squares = np.where(mask, (values - mean) ** 2, 0.0).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 1, np.sqrt(squares / (count - 1)), np.nan)
+
+
+def _masked_beta(returns, market, mask):
+    mask = mask & np.isfinite(returns) & np.isfinite(market)
+    stock_mean = _masked_mean(returns, mask)
+    market_mean = _masked_mean(market, mask)
+    covariance = _masked_mean((returns - stock_mean) * (market - market_mean), mask)
+    variance = _masked_mean((market - market_mean) ** 2, mask)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(variance > 0, covariance / variance, np.nan)
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if not match:
+            raise ValueError(
+                f"Unexpected input at position {position}: {text[position:]!r}"
+            )
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "name" and value.lower() in ("and", "or", "not"):
+            kind, value = "op", value.lower()
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    # expr := term ("or" term)*; term := factor ("and" factor)*;
+    # factor := "not" factor | "(" expr ")" | operand comparison operand
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+        self.depth = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def take(self, value=None):
+        token = self.peek()
+        if token[0] is None or (value is not None and token[1] != value):
+            raise ValueError(f"Expected {value or 'more input'}")
+        self.position += 1
+        return token
+
+    def parse(self):
+        node = self.expr()
+        if self.peek()[0] is not None:
+            raise ValueError(f"Unexpected {self.peek()[1]!r}")
+        return node
+
+    def expr(self):
+        node = self.term()
+        while self.peek() == ("op", "or"):
+            self.take()
+            node = ("or", node, self.term())
+        return node
+
+    def term(self):
+        node = self.factor()
+        while self.peek() == ("op", "and"):
+            self.take()
+            node = ("and", node, self.factor())
+        return node
+
+    def nested(self, parse):
+        self.depth += 1
+        if self.depth > MAX_FILTER_DEPTH:
+            raise ValueError(f"Filter nested more than {MAX_FILTER_DEPTH} levels deep")
+        node = parse()
+        self.depth -= 1
+        return node
+
+    def factor(self):
+        if self.peek() == ("op", "not"):
+            self.take()
+            return ("not", self.nested(self.factor))
+        if self.peek() == ("op", "("):
+            self.take()
+            node = self.nested(self.expr)
+            self.take(")")
+            return node
+        left = self.operand()
+        kind, op = self.take()
+        if kind != "op" or op not in COMPARISONS:
+            raise ValueError(f"Expected a comparison, got {op!r}")
+        return ("compare", op, left, self.operand())
+
+    def operand(self):
+        kind, value = self.take()
+        if kind == "op" and value == "-":
+            kind, value = self.take()
+            if kind != "number":
+                raise ValueError("Expected a number after '-'")
+            return ("number", -float(value))
+        if kind == "number":
+            return ("number", float(value))
+        if kind == "name":
+            return ("metric", _metric_name(value))
+        raise ValueError(f"Unexpected {value!r}")
+
+
+def _metric_name(name):
+    name = name.lower()
+    if name == "beta":
+        name = f"beta_{TRADING_DAYS}"
+    if name not in METRICS:
+        raise ValueError(f"Unknown metric: {name}")
+    return name
+
+
+def parse_filter(text):
+    # e.g. "return_90 > 0.1 and (beta < 0.5 or volatility_21 <= 0.2)"
+    if not text or not text.strip():
+        return None
+    if len(text) > MAX_FILTER_LENGTH:
+        raise ValueError(f"Filter is longer than {MAX_FILTER_LENGTH} characters")
+    return _Parser(_tokenize(text)).parse()
+
+
+def filter_metrics(node):
+    # Metric names a parsed filter reads
+    if node is None:
+        return []
+    if node[0] == "metric":
+        return [node[1]]
+    if node[0] == "number":
+        return []
+    return [
+        name
+        for child in node[1:]
+        if isinstance(child, tuple)
+        for name in filter_metrics(child)
+    ]
+
+
+def evaluate(node, metrics, count):
+    # Boolean mask over symbols. NaN metrics make a comparison unknown, and
+    # unknowns combine as in SQL: never matched, negated or not
+    if node is None:
+        return np.ones(count, dtype=bool)
+    return _evaluate(node, metrics, count)[0]
+
+
+def _evaluate(node, metrics, count):
+    # (true, known) masks
+    kind = node[0]
+    if kind in ("or", "and"):
+        true1, known1 = _evaluate(node[1], metrics, count)
+        true2, known2 = _evaluate(node[2], metrics, count)
+        false1, false2 = known1 & ~true1, known2 & ~true2
+        if kind == "or":
+            true, false = true1 | true2, false1 & false2
+        else:
+            true, false = true1 & true2, false1 | false2
+        return true, true | false
+    if kind == "not":
+        true, known = _evaluate(node[1], metrics, count)
+        return known & ~true, known
+
+    _, op, left, right = node
+    left, right = _operand(left, metrics), _operand(right, metrics)
+    with np.errstate(invalid="ignore"):
+        known = np.broadcast_to(np.isfinite(left + right), (count,))
+        true = COMPARISONS[op](left, right) & known
+    return np.broadcast_to(true, (count,)).copy(), known.copy()
+
+
+def _operand(node, metrics):
+    return metrics[node[1]] if node[0] == "metric" else node[1]
+
+
+DEFAULT_FIELDS = ("close", "return_90", "volatility_90", "avg_volume_90", "beta_252")
+
+
+def parse_fields(text):
+    # Metrics to return per symbol; defaults when none are given
+    names = [part.strip() for part in (text or "").split(",") if part.strip()]
+    return [_metric_name(name) for name in names] or list(DEFAULT_FIELDS)
+
+
+def parse_sort(text):
+    # "-return_90,volatility_21" -> [("return_90", True), ("volatility_21", False)]
+    keys = []
+    for item in filter(None, (part.strip() for part in (text or "").split(","))):
+        descending = item.startswith("-")
+        keys.append((_metric_name(item.lstrip("+-")), descending))
+    return keys
+
+
+def sort_order(indexes, keys, metrics):
+    # Indexes reordered by the sort keys; NaN sorts last either way, ties
+    # keep their original order
+    if not keys:
+        return indexes
+    columns = [np.arange(len(indexes))]
+    for name, descending in reversed(keys):
+        values = metrics[name][indexes]
+        values = -values if descending else values
+        columns.append(np.where(np.isfinite(values), values, np.inf))
+    return indexes[np.lexsort(columns)]
@@ -0,0 +1,46 @@
+import numpy as np
+
+# Column-wise transforms on (days x symbols) price matrices with NaN gaps,
+# as returned by price_arrays.fetch_close_matrix
+
+VALUE_MODES = ("close", "returns", "cumulative")
+
+
+def forward_fill(matrix):
+    # Carry the last seen value down each column; leading gaps stay NaN
+    rows = np.arange(len(matrix))[:, None]
+    last_seen = np.where(np.isfinite(matrix), rows, -1)
+    np.maximum.accumulate(last_seen, axis=0, out=last_seen)
+    filled = matrix[np.maximum(last_seen, 0), np.arange(matrix.shape[1])]
+    filled[last_seen < 0] = np.nan
+    return filled
+
+
+def sample_rows(count, max_points):
+    # Evenly spaced row indexes that always keep the first and last row
+    if not max_points or count <= max_points:
+        return np.arange(count)
+    return np.unique(np.linspace(0, count - 1, max_points).round().astype(np.int64))
+
+
+def transform(matrix, mode):
+    if mode == "returns":
+        # Change from the previous row, so sampled rows give period returns
+        out = np.full_like(matrix, np.nan)
+        out[1:] = matrix[1:] / matrix[:-1] - 1
+    elif mode == "cumulative":
+        # Change since each column's first price, for comparing on one axis
+        finite = np.isfinite(matrix)
+        first = matrix[finite.argmax(axis=0), np.arange(matrix.shape[1])]
+        out = matrix / first - 1
+    else:
+        return matrix
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def column_lists(matrix, decimals=6):
+    # JSON-ready columns with NaN as None
+    values = matrix.round(decimals).astype(object)
+    values[~np.isfinite(matrix)] = None
+    return [column.tolist() for column in values.T]
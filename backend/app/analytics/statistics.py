@@ -0,0 +1,66 @@
+import numpy as np
+from .series import forward_fill
+
+# Betas and the correlation matrix behind list and portfolio statistics, for
+# every symbol at once from a (days x symbols) close matrix with NaN gaps
+
+
+def gap_returns(closes):
+    # Each close against the symbol's previous close, skipping days it has no
+    # price, as LAG() over its own rows would
+    previous = forward_fill(closes)
+    returns = np.full_like(closes, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns[1:] = closes[1:] / previous[:-1] - 1
+    returns[~np.isfinite(returns)] = np.nan
+    return returns
+
+
+def betas_against(market_days, market_returns, days, returns):
+    # Population covariance / variance of every column of returns (days x
+    # symbols) against the market, each over the days both have a return
+    _, market_idx, stock_idx = np.intersect1d(
+        market_days, days, assume_unique=True, return_indices=True
+    )
+    stock = returns[stock_idx]
+    market = np.broadcast_to(market_returns[market_idx, None], stock.shape)
+    valid = np.isfinite(stock) & np.isfinite(market)
+    stock = np.where(valid, stock, 0.0)
+    market = np.where(valid, market, 0.0)
+
+    count = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        market_mean = market.sum(axis=0) / count
+        stock_mean = stock.sum(axis=0) / count
+        covariance = (market * stock).sum(axis=0) / count - market_mean * stock_mean
+        variance = (market * market).sum(axis=0) / count - market_mean**2
+        betas = covariance / variance
+    betas[~np.isfinite(betas) | (variance <= 0)] = 0.0
+    return betas.round(4)
+
+
+def pairwise_correlation(returns):
+    # Pearson correlation of every pair of columns over the days both have a
+    # return, like CORR() over a join on timestamp; 0 where it's undefined
+    present = np.isfinite(returns).astype(np.float64)
+    x = np.where(present > 0, returns, 0.0)
+
+    counts = present.T @ present
+    sums = x.T @ present  # sums[i, j]: sum of column i over days with column j
+    squares = (x * x).T @ present
+    with np.errstate(invalid="ignore", divide="ignore"):
+        covariance = counts * (x.T @ x) - sums * sums.T
+        variance = counts * squares - sums**2
+        correlation = covariance / np.sqrt(variance * variance.T)
+    correlation[~np.isfinite(correlation)] = 0.0
+    np.clip(correlation, -1.0, 1.0, out=correlation)
+    np.fill_diagonal(correlation, 1.0)
+    return correlation.round(4)
+
+
+def return_statistics(market_days, market_returns, days, closes):
+    returns = gap_returns(closes)
+    return (
+        betas_against(market_days, market_returns, days, returns),
+        pairwise_correlation(returns),
+    )
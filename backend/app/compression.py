@@ -0,0 +1,140 @@
+import os
+import zlib
+from flask import request
+
+# Response compression negotiated from Accept-Encoding. gzip always works;
+# br and zstd are used when the brotli / zstandard packages are installed.
+# Levels favour speed (gzip 1 is nginx's default too): large JSON still
+# shrinks several times over, and the request thread isn't held up for long.
+# Streamed (generator) responses are compressed on the fly as they go out.
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_ENCODINGS = [
+    name.strip()
+    for name in os.environ.get("COMPRESS_ENCODINGS", "zstd,br,gzip").split(",")
+    if name.strip()
+]
+
+GZIP_LEVEL = 1
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "image/svg+xml",
+}
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class _Gzip:
+    def __init__(self):
+        self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._z.compress(data)
+
+    def finish(self):
+        return self._z.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._c.process(data)
+
+    def finish(self):
+        return self._c.finish()
+
+
+class _Zstd:
+    def __init__(self):
+        self._c = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data):
+        return self._c.compress(data)
+
+    def finish(self):
+        return self._c.flush()
+
+
+ENCODERS = {"gzip": _Gzip}
+if brotli is not None:
+    ENCODERS["br"] = _Brotli
+if zstandard is not None:
+    ENCODERS["zstd"] = _Zstd
+
+# Server preference among what's installed, for clients that accept several
+# equally
+AVAILABLE_ENCODINGS = [name for name in COMPRESS_ENCODINGS if name in ENCODERS]
+
+
+def _compressible(response):
+    mimetype = response.mimetype or ""
+    return mimetype.startswith("text/") or mimetype in COMPRESSIBLE_TYPES
+
+
+def _stream(chunks, encoder):
+    # Output goes out whenever the compressor emits some: about once per
+    # window of input for large streams, without flushing tiny chunks (which
+    # would cost most of the ratio)
+    for chunk in chunks:
+        out = encoder.compress(chunk)
+        if out:
+            yield out
+    yield encoder.finish()
+
+
+def compress_response(response):
+    if (
+        not AVAILABLE_ENCODINGS
+        or request.method == "HEAD"
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or "no-transform" in response.headers.get("Cache-Control", "")
+        or not _compressible(response)
+    ):
+        return response
+
+    # The body depends on Accept-Encoding whether or not this one is encoded
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(AVAILABLE_ENCODINGS)
+    if encoding is None:
+        return response
+    encoder = ENCODERS[encoding]()
+
+    if response.is_streamed:
+        # The original iterable still gets closed (export cancellation, etc.)
+        original = response.response
+        if hasattr(original, "close"):
+            response.call_on_close(original.close)
+        response.response = _stream(response.iter_encoded(), encoder)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        compressed = encoder.compress(data) + encoder.finish()
+        if len(compressed) >= len(data):
+            return response
+        response.set_data(compressed)
+
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def register_compression(app):
+    app.after_request(compress_response)
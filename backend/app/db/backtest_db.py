@@ -0,0 +1,247 @@
+from flask import jsonify
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from app.executor import AnalyticsTimeout, analytics_pool
+from .base import get_connection
+from .stock_lists_db import can_view_list
+
+# Variants sharing a rebalance schedule run as one matrix product; distinct
+# schedules run side by side on the analytics workers (see app.executor)
+MAX_VARIANTS = 50
+REBALANCE_OPTIONS = ("none", "weekly", "monthly", "quarterly", "yearly")
+
+
+def parse_variants(variants):
+    # [{"rebalance": "monthly" | 21 | "none", "weights": {"AAPL": 2, ...}}];
+    # weights are optional and relative, defaulting to the holdings
+    if variants is None:
+        return [("none", None)]
+    if not isinstance(variants, list) or not variants:
+        raise ValueError("Variants must be a non-empty list")
+    if len(variants) > MAX_VARIANTS:
+        raise ValueError(f"At most {MAX_VARIANTS} variants are allowed")
+
+    parsed = []
+    for variant in variants:
+        if not isinstance(variant, dict):
+            raise ValueError("Each variant must be an object")
+        rebalance = variant.get("rebalance", "none")
+        if isinstance(rebalance, bool) or not (
+            rebalance in REBALANCE_OPTIONS
+            or (isinstance(rebalance, int) and rebalance > 0)
+        ):
+            raise ValueError(
+                "Rebalance must be none, weekly, monthly, quarterly, yearly "
+                "or a positive number of trading days"
+            )
+        weights = variant.get("weights")
+        if weights is not None:
+            weights = parse_weights(weights)
+        parsed.append((rebalance, weights))
+    return parsed
+
+
+def parse_weights(weights):
+    if not isinstance(weights, dict) or not weights:
+        raise ValueError("Weights must be a non-empty object of symbol to weight")
+    parsed = {}
+    for symbol, weight in weights.items():
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)):
+            raise ValueError(f"Weight for {symbol} must be a number")
+        if weight < 0:
+            raise ValueError("Weights cannot be negative")
+        parsed[str(symbol).upper()] = float(weight)
+    if not sum(parsed.values()):
+        raise ValueError("Weights must not all be zero")
+    return parsed
+
+
+def _run_groups(closes, days, groups, initial_capital, risk_free_rate):
+    from app.analytics.backtest import run_backtest
+
+    return analytics_pool.map(
+        run_backtest,
+        [
+            (closes, days, weights, rebalance, initial_capital, risk_free_rate)
+            for rebalance, weights in groups
+        ],
+    )
+
+
+def _backtest(
+    conn,
+    holdings,
+    by_shares,
+    variants,
+    start_date,
+    end_date,
+    initial_capital,
+    risk_free_rate,
+):
+    import numpy as np
+    from app.analytics.series import forward_fill
+    from .price_arrays import day_to_date_string, fetch_close_matrix
+
+    symbols = list(holdings)
+    # Variants reweight the backtested symbols; they can't add new ones
+    outside = sorted(
+        {symbol for _, weights in variants if weights for symbol in weights}
+        - set(symbols)
+    )
+    if outside:
+        return jsonify(
+            {
+                "error": "Variant weights name symbols not being backtested: "
+                + ", ".join(outside)
+            }
+        ), 400
+
+    days, closes = fetch_close_matrix(conn, symbols, start_date, end_date)
+    closes = forward_fill(closes)
+    has_data = np.isfinite(closes).any(axis=0)
+    kept = [symbol for symbol, ok in zip(symbols, has_data) if ok]
+    closes = closes[:, has_data]
+
+    # Starts on the first day every kept symbol has a price
+    complete = np.flatnonzero(np.isfinite(closes).all(axis=1)) if kept else []
+    if len(complete) == 0 or len(days) - complete[0] < 2:
+        return jsonify({"error": "Not enough price history in this date range"}), 400
+    days, closes = days[complete[0] :], closes[complete[0] :]
+
+    # A list holds share counts, worth their value at the first close
+    amounts = np.array([holdings[symbol] for symbol in kept], dtype=np.float64)
+    default = amounts * closes[0] if by_shares else amounts
+    if not default.sum():
+        return jsonify({"error": "Holdings have no value at the start date"}), 400
+
+    vectors = []
+    for _, weights in variants:
+        vector = (
+            default
+            if weights is None
+            else np.array([weights.get(symbol, 0.0) for symbol in kept])
+        )
+        if not vector.sum():
+            return jsonify({"error": "A variant has no weight on any symbol"}), 400
+        vectors.append(vector / vector.sum())
+
+    # Variants with the same schedule share one simulation
+    schedules = list(dict.fromkeys(rebalance for rebalance, _ in variants))
+    groups = [
+        (
+            rebalance,
+            np.array([v for (r, _), v in zip(variants, vectors) if r == rebalance]),
+        )
+        for rebalance in schedules
+    ]
+    outputs = _run_groups(closes, days, groups, initial_capital, risk_free_rate)
+
+    # Back into request order
+    columns = {rebalance: 0 for rebalance in schedules}
+    results = []
+    for (rebalance, _), vector in zip(variants, vectors):
+        equity, metrics = outputs[schedules.index(rebalance)]
+        column = columns[rebalance]
+        columns[rebalance] += 1
+        results.append(
+            {
+                "rebalance": rebalance,
+                "weights": dict(zip(kept, vector.round(6).tolist())),
+                "metrics": metrics[column],
+                "equity_curve": equity[:, column].round(2).tolist(),
+            }
+        )
+
+    return jsonify(
+        {
+            "symbols": kept,
+            "excluded_symbols": [s for s in symbols if s not in kept],
+            "date_range": {
+                "start_date": day_to_date_string(days[0]),
+                "end_date": day_to_date_string(days[-1]),
+            },
+            "initial_capital": initial_capital,
+            "dates": [day_to_date_string(day) for day in days],
+            "results": results,
+        }
+    ), 200
+
+
+def backtest_stock_list(
+    list_id,
+    user_id,
+    variants=None,
+    start_date=None,
+    end_date=None,
+    initial_capital=10000.0,
+    risk_free_rate=0.0,
+):
+    try:
+        variants = parse_variants(variants)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if not can_view_list(cur, list_id, user_id):
+                return jsonify({"error": "Stock list not found or access denied"}), 403
+
+            cur.execute(
+                "SELECT symbol, num_shares FROM StockListItems WHERE list_id = %s",
+                (list_id,),
+            )
+            holdings = {row["symbol"]: row["num_shares"] for row in cur.fetchall()}
+            if not holdings:
+                return jsonify({"error": "No stocks found in this list"}), 404
+
+        return _backtest(
+            conn,
+            holdings,
+            True,
+            variants,
+            start_date,
+            end_date,
+            initial_capital,
+            risk_free_rate,
+        )
+    except AnalyticsTimeout as e:
+        return jsonify({"error": str(e)}), 504
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+
+def backtest_weights(
+    weights,
+    variants=None,
+    start_date=None,
+    end_date=None,
+    initial_capital=10000.0,
+    risk_free_rate=0.0,
+):
+    try:
+        weights = parse_weights(weights)
+        variants = parse_variants(variants)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_connection()
+    try:
+        return _backtest(
+            conn,
+            weights,
+            False,
+            variants,
+            start_date,
+            end_date,
+            initial_capital,
+            risk_free_rate,
+        )
+    except AnalyticsTimeout as e:
+        return jsonify({"error": str(e)}), 504
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
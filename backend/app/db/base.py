@@ -1,7 +1,93 @@
+import os
+import threading
 import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+DB_SETTINGS = {
+    "dbname": "snfs",
+    "user": "c43",
+    "password": "c43",
+    "host": "db",
+    "port": "5432",
+}
+
+# Connections are kept open between requests so per-connection state such as
+# prepared statements survives; callers block when all of them are checked out
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(DB_POOL_SIZE)
+
+
+class PreparingConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Names PREPAREd on this physical connection; None until synced with
+        # pg_prepared_statements (see app.db.prepared)
+        self.prepared_statements = None
+
+
+class PooledConnection:
+    # Thin proxy over a pooled psycopg2 connection: close() hands it back to
+    # the pool instead of closing the socket, everything else is delegated
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    @property
+    def raw(self):
+        return self._conn
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            # The pool rolls back unfinished transactions and drops broken
+            # connections, which are then replaced on the next checkout
+            self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            _pool_slots.release()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    DB_POOL_SIZE,
+                    DB_POOL_SIZE,
+                    connection_factory=PreparingConnection,
+                    **DB_SETTINGS,
+                )
+    return _pool
 
 
 def get_connection():
-    return psycopg2.connect(
-        dbname="snfs", user="c43", password="c43", host="db", port="5432"
-    )
+    pool = _get_pool()
+    _pool_slots.acquire()
+    try:
+        conn = pool.getconn()
+        if conn.closed:
+            # Server closed an idle connection; recycle it for a fresh one
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+    except Exception:
+        _pool_slots.release()
+        raise
+    return PooledConnection(pool, conn)
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
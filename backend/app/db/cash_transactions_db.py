@@ -2,6 +2,7 @@ from flask import jsonify
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from .base import get_connection
+from .prepared import execute_prepared
 
 
 def handle_cash_transaction(portfolio_id, transaction_type, amount):
@@ -81,14 +82,7 @@ def get_cash_transactions(portfolio_id, user_id):
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             # Check if user owns portfolio
-            cur.execute(
-                """
-                SELECT 1 FROM Portfolios
-                WHERE portfolio_id = %s
-                AND user_id = %s
-            """,
-                (portfolio_id, user_id),
-            )
+            execute_prepared(cur, "portfolio_owned_by", (portfolio_id, user_id))
 
             if not cur.fetchone():
                 return jsonify({"error": "Unauthorized access"}), 403
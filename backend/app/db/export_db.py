@@ -0,0 +1,170 @@
+import os
+import queue
+import threading
+from flask import Response, jsonify
+import psycopg2
+from .base import DB_SETTINGS
+from .schema import STOCK_PRICES_FIELDS
+
+# StockPrices streamed straight out of COPY ... TO STDOUT. A thread runs the
+# COPY into a small bounded queue and the response generator drains it, so
+# memory stays constant however many rows go out, and a slow client just
+# makes the COPY wait. A client that goes away cancels the COPY.
+#
+# A download lasts as long as the client takes, so exports run on their own
+# connections outside the pool, at most EXPORT_CONCURRENCY per process; past
+# that they're turned away with a 503. Compression is negotiated from
+# Accept-Encoding like any other response (see app.compression).
+EXPORT_CONCURRENCY = int(os.environ.get("EXPORT_CONCURRENCY", "2"))
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_QUEUE_CHUNKS = 16
+EXPORT_RETRY_AFTER_SECONDS = 5
+
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+_export_slots = threading.BoundedSemaphore(EXPORT_CONCURRENCY)
+
+
+def _export_query(symbols, start_date, end_date, fmt):
+    conditions, params = [], []
+    if symbols:
+        conditions.append("symbol = ANY(%s)")
+        params.append(list(symbols))
+    if start_date:
+        conditions.append("timestamp >= %s")
+        params.append(start_date)
+    if end_date:
+        conditions.append("timestamp <= %s")
+        params.append(end_date)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    # Ordered like the primary key, so rows come off its index presorted
+    rows = f"""
+        SELECT {STOCK_PRICES_FIELDS} FROM StockPrices {where}
+        ORDER BY symbol, timestamp
+    """
+    if fmt == "csv":
+        # Same columns and header as the CSV the loader reads
+        return f"COPY ({rows}) TO STDOUT WITH (FORMAT csv, HEADER)", params
+    # One JSON object per line. JSON escapes every control character, so
+    # with these as delimiter and quote COPY never quotes or escapes a line.
+    return (
+        f"""
+        COPY (SELECT row_to_json(p) FROM ({rows}) AS p) TO STDOUT
+        WITH (FORMAT csv, DELIMITER E'\\x1f', QUOTE E'\\x1e')
+        """,
+        params,
+    )
+
+
+class _CopyStream:
+    # File-like target for copy_expert that batches COPY's row-sized writes
+    # into chunks for the queue; None on the queue marks the end. Owns the
+    # connection and the export slot, both given up when the COPY ends.
+
+    def __init__(self, conn, statement):
+        self.conn = conn
+        self.statement = statement
+        self.chunks = queue.Queue(EXPORT_QUEUE_CHUNKS)
+        self.pending = []
+        self.pending_bytes = 0
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.finished = False
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name="price-export", daemon=True)
+        thread.start()
+
+    def _run(self):
+        try:
+            with self.conn.cursor() as cur:
+                cur.copy_expert(self.statement, self)
+            self.flush()
+            self._put(None)
+        except Exception as e:
+            self._put(e)
+        finally:
+            with self.lock:
+                self.finished = True
+            self.conn.close()
+            _export_slots.release()
+
+    def write(self, data):
+        if self.cancelled:
+            return
+        self.pending.append(data)
+        self.pending_bytes += len(data)
+        if self.pending_bytes >= EXPORT_CHUNK_BYTES:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            chunk = b"".join(self.pending)
+            self.pending, self.pending_bytes = [], 0
+            self._put(chunk)
+
+    def _put(self, item):
+        # Blocks while the client is behind, but never past a cancel
+        while not self.cancelled:
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+
+    def cancel(self):
+        # The server aborts the COPY; the connection is never touched after
+        # it was closed
+        with self.lock:
+            if self.finished or self.cancelled:
+                return
+            self.cancelled = True
+            self.conn.cancel()
+
+    def body(self, first):
+        chunk = first
+        while chunk is not None:
+            if isinstance(chunk, Exception):
+                # Too late for an error status: end the body early
+                raise chunk
+            yield chunk
+            chunk = self.chunks.get()
+
+
+def export_stock_prices(symbols=None, start_date=None, end_date=None, fmt="csv"):
+    if not _export_slots.acquire(blocking=False):
+        return (
+            jsonify({"error": "Too many exports in progress, try again later"}),
+            503,
+            {"Retry-After": str(EXPORT_RETRY_AFTER_SECONDS)},
+        )
+
+    query, params = _export_query(symbols, start_date, end_date, fmt)
+    conn = None
+    try:
+        conn = psycopg2.connect(**DB_SETTINGS)
+        with conn.cursor() as cur:
+            # copy_expert takes no parameters, so they're bound here
+            statement = cur.mogrify(query, params).decode()
+    except psycopg2.Error as e:
+        if conn is not None:
+            conn.close()
+        _export_slots.release()
+        return jsonify({"error": str(e)}), 500
+
+    stream = _CopyStream(conn, statement)
+    stream.start()
+    # Errors such as a malformed date arrive before any data, while a proper
+    # status can still be sent
+    first = stream.chunks.get()
+    if isinstance(first, psycopg2.DataError):
+        return jsonify({"error": str(first)}), 400
+    if isinstance(first, Exception):
+        return jsonify({"error": str(first)}), 500
+
+    response = Response(stream.body(first), mimetype=CONTENT_TYPES[fmt])
+    response.call_on_close(stream.cancel)
+    response.headers["Content-Disposition"] = f"attachment; filename=stock_prices.{fmt}"
+    return response
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from .base import get_connection
+from .lru import LRUCache
+
+# Adjacency cached per process for the FRIEND_GRAPH_SIZE most recently used
+# users; accept/remove invalidate locally, the TTL bounds how long another
+# worker's change can go unseen. Every invalidation bumps a generation, and
+# lists read before the latest one are returned but never cached, so a load
+# racing an accept/remove can't store the old list.
+FRIEND_GRAPH_TTL = float(os.environ.get("FRIEND_GRAPH_TTL", "30"))
+FRIEND_GRAPH_SIZE = int(os.environ.get("FRIEND_GRAPH_SIZE", "10000"))
+
+
+class FriendGraph:
+    def __init__(self):
+        self._adjacency = LRUCache(FRIEND_GRAPH_SIZE)
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    @property
+    def generation(self):
+        # Read before querying friends to pass to prime()
+        return self._generation
+
+    def _store(self, adjacency, generation):
+        loaded_at = time.monotonic()
+        with self._lock:
+            if generation != self._generation:
+                return
+            for user_id, friends in adjacency.items():
+                self._adjacency.put(user_id, (frozenset(friends), loaded_at))
+
+    def _cached(self, user_id):
+        entry = self._adjacency.get(user_id)
+        if entry and time.monotonic() - entry[1] <= FRIEND_GRAPH_TTL:
+            return entry[0]
+        return None
+
+    def _load(self, user_ids, conn=None):
+        # One round trip for any number of users; Friends is indexed on both
+        # (user1_id, user2_id) and (user2_id, user1_id), so each side is a scan
+        generation = self._generation
+        own_conn = conn is None
+        conn = conn or get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT user1_id, user2_id FROM Friends WHERE user1_id = ANY(%s)
+                    UNION ALL
+                    SELECT user1_id, user2_id FROM Friends WHERE user2_id = ANY(%s)
+                    """,
+                    (list(user_ids), list(user_ids)),
+                )
+                edges = cur.fetchall()
+        finally:
+            if own_conn:
+                conn.close()
+
+        wanted = set(user_ids)
+        adjacency = {user_id: set() for user_id in wanted}
+        for user1, user2 in edges:
+            if user1 in wanted:
+                adjacency[user1].add(user2)
+            if user2 in wanted:
+                adjacency[user2].add(user1)
+
+        self._store(adjacency, generation)
+        return {user_id: frozenset(friends) for user_id, friends in adjacency.items()}
+
+    def friends_of_many(self, user_ids, conn=None):
+        user_ids = {int(user_id) for user_id in user_ids}
+        result = {}
+        missing = []
+        for user_id in user_ids:
+            friends = self._cached(user_id)
+            if friends is None:
+                missing.append(user_id)
+            else:
+                result[user_id] = friends
+        if missing:
+            result.update(self._load(missing, conn))
+        return result
+
+    def friends_of(self, user_id, conn=None):
+        user_id = int(user_id)
+        return self.friends_of_many([user_id], conn)[user_id]
+
+    def are_friends(self, user_id, other_id, conn=None):
+        return int(other_id) in self.friends_of(user_id, conn)
+
+    def mutual_friends(self, user_id, other_id, conn=None):
+        adjacency = self.friends_of_many([user_id, other_id], conn)
+        return adjacency[int(user_id)] & adjacency[int(other_id)]
+
+    def suggestions(self, user_id, exclude=(), conn=None):
+        # Friends of friends ranked by how many friends they share with user_id
+        user_id = int(user_id)
+        friends = self.friends_of(user_id, conn)
+        if not friends:
+            return []
+
+        skip = friends | {user_id} | set(exclude)
+        counts = {}
+        for friend_friends in self.friends_of_many(friends, conn).values():
+            for candidate in friend_friends - skip:
+                counts[candidate] = counts.get(candidate, 0) + 1
+        return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+    def prime(self, user_id, friend_ids, generation):
+        # generation: self.generation as read before friend_ids were queried
+        self._store({int(user_id): {int(f) for f in friend_ids}}, generation)
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._adjacency.pop(int(user_id))
+
+
+friend_graph = FriendGraph()
+
+
+def are_friends_now(cur, user_id, other_id):
+    # Authoritative check for write paths, in the caller's transaction; the
+    # cached graph may be up to FRIEND_GRAPH_TTL stale. FOR SHARE holds off a
+    # concurrent remove_friend until the caller commits.
+    user_id, other_id = int(user_id), int(other_id)
+    cur.execute(
+        """
+        SELECT 1 FROM Friends
+        WHERE user1_id = %s AND user2_id = %s
+        FOR SHARE
+        """,
+        (min(user_id, other_id), max(user_id, other_id)),
+    )
+    return cur.fetchone() is not None
@@ -2,30 +2,19 @@ from flask import jsonify
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from .base import get_connection
+from .prepared import execute_prepared
+from .friend_graph import friend_graph
 
 
 def get_users_friends(user_id):
     conn = get_connection()
+    generation = friend_graph.generation
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """
-                SELECT
-                    u.user_id AS friend_id,
-                    u.username,
-                    f.since
-                FROM Friends f
-                JOIN Users u
-                  ON u.user_id = CASE
-                    WHEN f.user1_id = %s THEN f.user2_id
-                    ELSE f.user1_id
-                  END
-                WHERE f.user1_id = %s OR f.user2_id = %s;
-            """,
-                (user_id, user_id, user_id),
-            )
+            execute_prepared(cur, "user_friends", (user_id, user_id))
             friends = cur.fetchall()
 
+        friend_graph.prime(user_id, [f["friend_id"] for f in friends], generation)
         return jsonify({"friends": friends}), 200
     except psycopg2.Error as e:
         return jsonify({"error": str(e)}), 500
@@ -48,8 +37,72 @@ def remove_friend(user_id, friend_id):
                 (user1_id, user2_id),
             )
         conn.commit()
+        friend_graph.invalidate(user_id, friend_id)
         return jsonify({"message": "Friendship removed successfully"}), 200
     except psycopg2.Error as e:
         return jsonify({"error": str(e)}), 500
     finally:
         conn.close()
+
+
+def _usernames(cur, user_ids):
+    cur.execute(
+        "SELECT user_id, username FROM Users WHERE user_id = ANY(%s)",
+        (list(user_ids),),
+    )
+    return {row["user_id"]: row["username"] for row in cur.fetchall()}
+
+
+def get_mutual_friends(user_id, other_id):
+    conn = get_connection()
+    try:
+        mutual = friend_graph.mutual_friends(user_id, other_id, conn)
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            names = _usernames(cur, mutual)
+
+        friends = [
+            {"friend_id": friend_id, "username": names[friend_id]}
+            for friend_id in sorted(mutual)
+            if friend_id in names
+        ]
+        return jsonify({"mutualFriends": friends, "count": len(friends)}), 200
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+
+def get_friend_suggestions(user_id, limit=10):
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Don't suggest people with a request already pending either way
+            cur.execute(
+                """
+                SELECT to_user_id AS other_id FROM FriendRequests
+                WHERE from_user_id = %s AND status = 'pending'
+                UNION
+                SELECT from_user_id FROM FriendRequests
+                WHERE to_user_id = %s AND status = 'pending'
+                """,
+                (user_id, user_id),
+            )
+            pending = {row["other_id"] for row in cur.fetchall()}
+
+            ranked = friend_graph.suggestions(user_id, pending, conn)[:limit]
+            names = _usernames(cur, [candidate for candidate, _ in ranked])
+
+        suggestions = [
+            {
+                "user_id": candidate,
+                "username": names[candidate],
+                "mutual_friends": mutual,
+            }
+            for candidate, mutual in ranked
+            if candidate in names
+        ]
+        return jsonify({"suggestions": suggestions}), 200
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
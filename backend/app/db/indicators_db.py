@@ -0,0 +1,124 @@
+import os
+from flask import jsonify
+from app.executor import AnalyticsTimeout, analytics_pool
+from .base import get_connection
+from .latest_prices import current_price_data_version, symbol_price_versions
+from .lru import LRUCache
+
+# Indicator series per (symbol, indicator with parameters, the symbol's price
+# versions), computed over each symbol's full history so warm-up periods don't
+# depend on the requested range; responses slice out the range
+INDICATOR_CACHE_SIZE = int(os.environ.get("INDICATOR_CACHE_SIZE", "1024"))
+
+_indicator_cache = LRUCache(INDICATOR_CACHE_SIZE)
+
+
+def _compute_missing(conn, symbols, specs, versions):
+    # Every uncached symbol in one query and one vectorized pass
+    import numpy as np
+    from app.analytics.indicators import (
+        compute,
+        pack_columns,
+        required_fields,
+        spec_key,
+    )
+    from .price_arrays import fetch_field_matrices
+
+    fields = required_fields(specs)
+    days, prices = fetch_field_matrices(conn, symbols, fields=fields)
+    valid = np.isfinite(prices["close"])
+    order, packed = pack_columns(valid, *(prices[field] for field in fields))
+    results = analytics_pool.run(compute, specs, dict(zip(fields, packed)))
+
+    for column, symbol in enumerate(symbols):
+        length = int(valid[:, column].sum())
+        symbol_days = days[order[:length, column]]
+        for name, params in specs:
+            key = spec_key(name, params)
+            outputs = {
+                output: matrix[:length, column].copy()
+                for output, matrix in results[key].items()
+            }
+            _indicator_cache.put(
+                (symbol, key, versions[symbol]), (symbol_days, outputs)
+            )
+
+
+def get_stock_indicators(symbols, indicators, start_date=None, end_date=None):
+    from app.analytics.indicators import parse_indicators, spec_key
+    from app.analytics.series import column_lists
+    from .price_arrays import date_string_to_day, day_to_date_string
+
+    # e.g. "rsi,macd:8:21:5,bollinger:20:2.5"
+    try:
+        specs = parse_indicators(indicators)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            version = current_price_data_version(cur)
+            changed = symbol_price_versions(cur, symbols)
+        versions = {symbol: (version, changed.get(symbol, 0)) for symbol in symbols}
+
+        keys = [spec_key(name, params) for name, params in specs]
+        missing = [
+            symbol
+            for symbol in symbols
+            if any(
+                _indicator_cache.get((symbol, k, versions[symbol])) is None
+                for k in keys
+            )
+        ]
+        if missing:
+            _compute_missing(conn, missing, specs, versions)
+
+        start = date_string_to_day(start_date) if start_date else None
+        end = date_string_to_day(end_date) if end_date else None
+
+        series = {}
+        missing_symbols = []
+        for symbol in symbols:
+            entries = [
+                _indicator_cache.get((symbol, k, versions[symbol])) for k in keys
+            ]
+            # Entries can be evicted between computing and reading under load
+            if any(entry is None for entry in entries):
+                _compute_missing(conn, [symbol], specs, versions)
+                entries = [
+                    _indicator_cache.get((symbol, k, versions[symbol])) for k in keys
+                ]
+
+            days = entries[0][0]
+            if not len(days):
+                missing_symbols.append(symbol)
+                continue
+
+            lo = days.searchsorted(start) if start is not None else 0
+            hi = days.searchsorted(end, side="right") if end is not None else len(days)
+            series[symbol] = {
+                "dates": [day_to_date_string(day) for day in days[lo:hi]],
+                **{
+                    key: {
+                        output: column_lists(values[lo:hi, None])[0]
+                        for output, values in outputs.items()
+                    }
+                    for key, (_, outputs) in zip(keys, entries)
+                },
+            }
+
+        return jsonify(
+            {
+                "indicators": keys,
+                "series": series,
+                "missing_symbols": missing_symbols,
+                "price_data_version": version,
+            }
+        )
+    except AnalyticsTimeout as e:
+        return jsonify({"error": str(e)}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
@@ -0,0 +1,314 @@
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from flask import jsonify
+import psycopg2
+from psycopg2.extras import Json, RealDictCursor
+from .base import get_connection
+from .singleflight import materialize
+from .stock_db import load_stock_csv, predict_stock_prices
+from .stock_lists_db import get_stocklist_statistics
+from .stock_transactions_db import get_portfolio_statistics
+
+# Jobs are rows in Postgres claimed with FOR UPDATE SKIP LOCKED, so any
+# number of worker threads across processes can share the queue
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "1"))
+# A running job holds a lease its worker renews every third of this; one
+# whose lease ran out belongs to a dead process and is requeued, until it
+# has been tried JOB_MAX_ATTEMPTS times
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION = int(os.environ.get("JOB_RETENTION", "86400"))
+MAX_WAIT = 60
+
+# kind -> function called with the job's params as keyword arguments
+JOB_HANDLERS = {
+    "stocklist_statistics": get_stocklist_statistics,
+    "portfolio_statistics": get_portfolio_statistics,
+    "predict": predict_stock_prices,
+    "load_stock_csv": load_stock_csv,
+}
+
+# Jobs are exposed by their random handle, never the sequential job_id
+JOB_FIELDS = """
+    handle AS job_id, kind, params, status, status_code, result, error, attempts,
+    created_at, started_at, finished_at
+"""
+
+_wakeup = threading.Event()
+_finished = threading.Condition()
+_workers = []
+
+
+def dedupe_key(kind, params):
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return f"{kind}:{hashlib.sha1(canonical.encode()).hexdigest()}"
+
+
+def enqueue_job(kind, params, owner_id=None):
+    # Identical queued/running jobs share one row (partial unique index);
+    # the owner is part of the key so users never share a job.
+    # Returns (handle, created)
+    key = dedupe_key(kind, {**params, "_owner": owner_id})
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            while True:
+                cur.execute(
+                    """
+                    INSERT INTO Jobs (kind, params, dedupe_key, owner_id)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (dedupe_key) WHERE status IN ('queued', 'running')
+                    DO NOTHING
+                    RETURNING handle::text
+                    """,
+                    (kind, Json(params), key, owner_id),
+                )
+                row = cur.fetchone()
+                if row:
+                    conn.commit()
+                    _wakeup.set()
+                    return row[0], True
+
+                cur.execute(
+                    """
+                    SELECT handle::text FROM Jobs
+                    WHERE dedupe_key = %s AND status IN ('queued', 'running')
+                    """,
+                    (key,),
+                )
+                row = cur.fetchone()
+                conn.commit()
+                # Otherwise the duplicate finished in between; insert again
+                if row:
+                    return row[0], False
+    finally:
+        conn.close()
+
+
+def enqueue_job_response(kind, params, owner_id=None):
+    try:
+        handle, created = enqueue_job(kind, params, owner_id)
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    status_url = f"/jobs/{handle}"
+    if owner_id is not None:
+        status_url += f"?user_id={owner_id}"
+    return jsonify(
+        {
+            "job_id": handle,
+            "status": "queued" if created else "deduplicated",
+            "status_url": status_url,
+        }
+    ), 202
+
+
+def _fetch_job(handle, user_id):
+    # Someone else's job looks the same as a missing one
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(
+                f"""
+                SELECT {JOB_FIELDS} FROM Jobs
+                WHERE handle = %s AND (owner_id IS NULL OR owner_id = %s)
+                """,
+                (handle, user_id),
+            )
+            return cur.fetchone()
+    finally:
+        conn.close()
+
+
+def get_job(handle, user_id=None, wait=0):
+    # Long-polls up to wait seconds; finishes in this process wake us early,
+    # jobs run by other processes are noticed on the next poll
+    deadline = time.monotonic() + min(wait, MAX_WAIT)
+    try:
+        while True:
+            job = _fetch_job(handle, user_id)
+            if not job:
+                return jsonify({"error": "Job not found"}), 404
+            remaining = deadline - time.monotonic()
+            if job["status"] in ("succeeded", "failed") or remaining <= 0:
+                break
+            with _finished:
+                _finished.wait(min(remaining, JOB_POLL_INTERVAL))
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+
+    done = job["status"] in ("succeeded", "failed")
+    return jsonify({"job": job}), 200 if done else 202
+
+
+def _claim(cur, worker):
+    cur.execute(
+        """
+        UPDATE Jobs
+        SET status = 'running', started_at = CURRENT_TIMESTAMP,
+            attempts = attempts + 1, worker = %s,
+            lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+        WHERE job_id = (
+            SELECT job_id FROM Jobs
+            WHERE status = 'queued'
+            ORDER BY job_id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING job_id, kind, params
+        """,
+        (worker, JOB_LEASE_SECONDS),
+    )
+    return cur.fetchone()
+
+
+def _renew_lease(job_id, worker):
+    # False once the job is no longer ours (lease expired and swept)
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE Jobs
+                SET lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                WHERE job_id = %s AND worker = %s AND status = 'running'
+                """,
+                (JOB_LEASE_SECONDS, job_id, worker),
+            )
+            renewed = cur.rowcount == 1
+        conn.commit()
+        return renewed
+    finally:
+        conn.close()
+
+
+def _heartbeat(job_id, worker, stop):
+    while not stop.wait(JOB_LEASE_SECONDS / 3):
+        try:
+            if not _renew_lease(job_id, worker):
+                return
+        except psycopg2.Error as e:
+            # Missed beats are fine as long as one lands within the lease
+            print(f"Job worker {worker}: lease renewal failed: {e}")
+
+
+def _finish(job_id, worker, status, status_code=None, result=None, error=None):
+    # Only the worker holding the job records its outcome; one whose lease
+    # was swept would otherwise overwrite the retry's
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE Jobs
+                SET status = %s, status_code = %s, result = %s, error = %s,
+                    finished_at = CURRENT_TIMESTAMP, lease_expires_at = NULL
+                WHERE job_id = %s AND worker = %s AND status = 'running'
+                """,
+                (status, status_code, Json(result), error, job_id, worker),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    with _finished:
+        _finished.notify_all()
+
+
+def _sweep():
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            # Expired leases: give up on jobs out of attempts, requeue the rest
+            cur.execute(
+                """
+                UPDATE Jobs
+                SET status = 'failed', status_code = 500, worker = NULL,
+                    lease_expires_at = NULL, finished_at = CURRENT_TIMESTAMP,
+                    error = 'Worker lost on each of ' || attempts || ' attempts'
+                WHERE status = 'running'
+                  AND lease_expires_at < CURRENT_TIMESTAMP
+                  AND attempts >= %s
+                """,
+                (JOB_MAX_ATTEMPTS,),
+            )
+            failed = cur.rowcount
+            cur.execute(
+                """
+                UPDATE Jobs SET status = 'queued', worker = NULL, lease_expires_at = NULL
+                WHERE status = 'running' AND lease_expires_at < CURRENT_TIMESTAMP
+                """
+            )
+            cur.execute(
+                """
+                DELETE FROM Jobs
+                WHERE status IN ('succeeded', 'failed')
+                  AND finished_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                """,
+                (JOB_RETENTION,),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    if failed:
+        with _finished:
+            _finished.notify_all()
+
+
+def run_next_job(app, worker):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            job = _claim(cur, worker)
+        conn.commit()
+    finally:
+        conn.close()
+    if not job:
+        return False
+
+    job_id, kind, params = job
+    stop = threading.Event()
+    threading.Thread(
+        target=_heartbeat, args=(job_id, worker, stop), daemon=True
+    ).start()
+    try:
+        with app.app_context():
+            body, status_code = materialize(JOB_HANDLERS[kind](**params))
+        state = "succeeded" if status_code < 400 else "failed"
+        _finish(job_id, worker, state, status_code, body)
+    except Exception as e:
+        _finish(job_id, worker, "failed", 500, error=str(e))
+    finally:
+        stop.set()
+    return True
+
+
+def _work(app, worker):
+    last_sweep = 0.0
+    while True:
+        try:
+            if time.monotonic() - last_sweep > 60:
+                _sweep()
+                last_sweep = time.monotonic()
+            if run_next_job(app, worker):
+                continue
+        except Exception as e:
+            # Database unavailable or similar; back off and keep the worker
+            print(f"Job worker {worker}: {e}")
+        _wakeup.wait(JOB_POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_job_workers(app, count=JOB_WORKERS):
+    if _workers:
+        return
+    host = f"{socket.gethostname()}:{os.getpid()}"
+    for index in range(count):
+        thread = threading.Thread(
+            target=_work, args=(app, f"{host}/{index}"), daemon=True
+        )
+        thread.start()
+        _workers.append(thread)
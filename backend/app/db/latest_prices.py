@@ -0,0 +1,120 @@
+from .price_rollups import rebuild_rollups, refresh_rollup_buckets
+
+# LatestStockPrices holds each symbol's most recent non-NULL close so
+# valuations join one row per holding instead of probing StockPrices,
+# PriceDataVersion and SymbolPriceVersions count changes so derived caches
+# know when to recompute, and StockPriceRollups (price_rollups.py) keeps
+# weekly and monthly bars. Every write to StockPrices must go through
+# record_price_change (single rows) or record_bulk_price_load (CSV loads), in
+# the same transaction as the write.
+#
+# Bulk loads bump the global PriceDataVersion. A single-row write (a trade's
+# price, custom data) only bumps its symbol's version, so it doesn't throw
+# away caches for every other symbol: per-symbol results key on
+# price_versions(), and whole-universe ones (screener metrics, benchmark
+# returns and betas) on universe_price_version().
+
+
+def bump_price_data_version(cur):
+    # Committed together with the prices, so a reader never pairs the new
+    # version with old data
+    cur.execute("UPDATE PriceDataVersion SET version = version + 1")
+
+
+def bump_symbol_price_version(cur, symbol):
+    cur.execute(
+        """
+        INSERT INTO SymbolPriceVersions (symbol, version) VALUES (%s, 1)
+        ON CONFLICT (symbol) DO UPDATE SET version = SymbolPriceVersions.version + 1
+        """,
+        (symbol,),
+    )
+
+
+def current_price_data_version(cur):
+    cur.execute("SELECT version FROM PriceDataVersion")
+    row = cur.fetchone()
+    return row[0] if isinstance(row, tuple) else row["version"]
+
+
+def symbol_price_versions(cur, symbols=None):
+    # {symbol: version} for symbols written to row by row since the last bulk
+    # load (every symbol if symbols is None); absent means 0
+    if symbols is None:
+        cur.execute("SELECT symbol, version FROM SymbolPriceVersions")
+    else:
+        cur.execute(
+            "SELECT symbol, version FROM SymbolPriceVersions WHERE symbol = ANY(%s)",
+            (list(symbols),),
+        )
+    return dict(
+        row if isinstance(row, tuple) else (row["symbol"], row["version"])
+        for row in cur.fetchall()
+    )
+
+
+def price_versions(cur, symbols):
+    # Cache key part for results derived from these symbols' prices only
+    changed = symbol_price_versions(cur, symbols)
+    return current_price_data_version(cur), tuple(sorted(changed.items()))
+
+
+def universe_price_version(cur, symbols=None):
+    # (global version, row writes since the last bulk load) over symbols, or
+    # every symbol if None. Each row write adds one and bulk loads reset the
+    # count while bumping the global version, so the pair never repeats.
+    if symbols is None:
+        cur.execute(
+            "SELECT COALESCE(SUM(version), 0) AS writes FROM SymbolPriceVersions"
+        )
+    else:
+        cur.execute(
+            """
+            SELECT COALESCE(SUM(version), 0) AS writes FROM SymbolPriceVersions
+            WHERE symbol = ANY(%s)
+            """,
+            (list(symbols),),
+        )
+    row = cur.fetchone()
+    writes = int(row[0] if isinstance(row, tuple) else row["writes"])
+    return current_price_data_version(cur), writes
+
+
+def record_price_change(cur, symbol, timestamp, close):
+    bump_symbol_price_version(cur, symbol)
+    refresh_rollup_buckets(cur, symbol, timestamp)
+    if close is None:
+        return
+    # Only moves forward; back-filled history never replaces a newer price
+    cur.execute(
+        """
+        INSERT INTO LatestStockPrices (symbol, timestamp, close)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (symbol) DO UPDATE
+        SET timestamp = EXCLUDED.timestamp, close = EXCLUDED.close
+        WHERE LatestStockPrices.timestamp <= EXCLUDED.timestamp
+        """,
+        (symbol, timestamp, close),
+    )
+
+
+def refresh_latest_prices(cur):
+    # DELETE rather than TRUNCATE so readers keep seeing the old snapshot
+    # until the load commits
+    cur.execute("DELETE FROM LatestStockPrices")
+    cur.execute("""
+        INSERT INTO LatestStockPrices (symbol, timestamp, close)
+        SELECT DISTINCT ON (symbol) symbol, timestamp, close
+        FROM StockPrices
+        WHERE close IS NOT NULL
+        ORDER BY symbol, timestamp DESC
+    """)
+    return cur.rowcount
+
+
+def record_bulk_price_load(cur):
+    # The new global version supersedes every per-symbol one
+    bump_price_data_version(cur)
+    cur.execute("DELETE FROM SymbolPriceVersions")
+    rebuild_rollups(cur)
+    return refresh_latest_prices(cur)
@@ -0,0 +1,271 @@
+import argparse
+from collections import deque
+from decimal import Decimal
+from psycopg2.extras import execute_values
+from .base import get_connection
+
+# PositionLedger keeps, per portfolio and symbol, the shares held plus cost
+# basis and realized P&L under both average-cost and FIFO accounting; FIFO
+# draws down the open StockLots oldest first. Trades update it incrementally
+# inside their own transaction; rebuild_ledger replays StockTransactions.
+# It is the only record of cost: holdings and summaries read cost_avg here.
+
+COST_METHODS = {
+    "average": ("cost_avg", "realized_avg"),
+    "fifo": ("cost_fifo", "realized_fifo"),
+}
+
+
+class Position:
+    def __init__(
+        self, shares=0, cost_avg=0, cost_fifo=0, realized_avg=0, realized_fifo=0
+    ):
+        self.shares = shares
+        self.cost_avg = Decimal(cost_avg)
+        self.cost_fifo = Decimal(cost_fifo)
+        self.realized_avg = Decimal(realized_avg)
+        self.realized_fifo = Decimal(realized_fifo)
+        # Open lots as [lot_id or None, remaining, price], oldest first
+        self.lots = deque()
+
+    def buy(self, num_shares, price, lot_id=None):
+        cost = num_shares * price
+        self.shares += num_shares
+        self.cost_avg += cost
+        self.cost_fifo += cost
+        self.lots.append([lot_id, num_shares, price])
+
+    def sell(self, num_shares, price):
+        # Selling more than is on record (history predating the ledger) only
+        # realizes against what is known; the rest is treated as zero cost
+        proceeds = num_shares * price
+        known = min(num_shares, self.shares)
+
+        avg_out = self.cost_avg * known / self.shares if self.shares else Decimal(0)
+        fifo_out = Decimal(0)
+        touched = []
+        left = known
+        while left and self.lots:
+            lot = self.lots[0]
+            used = min(left, lot[1])
+            fifo_out += used * lot[2]
+            lot[1] -= used
+            left -= used
+            touched.append(lot)
+            if not lot[1]:
+                self.lots.popleft()
+
+        self.shares -= known
+        self.cost_avg -= avg_out
+        self.cost_fifo -= fifo_out
+        self.realized_avg += proceeds - avg_out
+        self.realized_fifo += proceeds - fifo_out
+        return touched
+
+    def ledger_values(self):
+        return (
+            self.shares,
+            self.cost_avg,
+            self.cost_fifo,
+            self.realized_avg,
+            self.realized_fifo,
+        )
+
+
+def _upsert_position(cur, portfolio_id, symbol, position):
+    cur.execute(
+        """
+        INSERT INTO PositionLedger
+            (portfolio_id, symbol, shares, cost_avg, cost_fifo,
+             realized_avg, realized_fifo)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (portfolio_id, symbol) DO UPDATE SET
+            shares = EXCLUDED.shares,
+            cost_avg = EXCLUDED.cost_avg,
+            cost_fifo = EXCLUDED.cost_fifo,
+            realized_avg = EXCLUDED.realized_avg,
+            realized_fifo = EXCLUDED.realized_fifo,
+            updated_at = CURRENT_TIMESTAMP
+        """,
+        (portfolio_id, symbol, *position.ledger_values()),
+    )
+
+
+def apply_trade(cur, transaction):
+    # transaction is the StockTransactions row just inserted; runs in the
+    # trade's transaction so the ledger can never disagree with the history.
+    # The trade's StockHoldings write already holds the row lock that
+    # serializes concurrent trades on the same position.
+    portfolio_id, symbol = transaction["portfolio_id"], transaction["symbol"]
+    num_shares, price = transaction["num_shares"], transaction["price"]
+
+    cur.execute(
+        """
+        SELECT shares, cost_avg, cost_fifo, realized_avg, realized_fifo
+        FROM PositionLedger
+        WHERE portfolio_id = %s AND symbol = %s
+        FOR UPDATE
+        """,
+        (portfolio_id, symbol),
+    )
+    row = cur.fetchone()
+    position = Position(**row) if row else Position()
+
+    if transaction["type"] == "buy":
+        position.buy(num_shares, price)
+        cur.execute(
+            """
+            INSERT INTO StockLots
+                (portfolio_id, symbol, transaction_id, acquired_at, price,
+                 num_shares, remaining)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                portfolio_id,
+                symbol,
+                transaction["transaction_id"],
+                transaction["timestamp"],
+                price,
+                num_shares,
+                num_shares,
+            ),
+        )
+    else:
+        cur.execute(
+            """
+            SELECT lot_id, remaining, price
+            FROM StockLots
+            WHERE portfolio_id = %s AND symbol = %s AND remaining > 0
+            ORDER BY acquired_at, lot_id
+            FOR UPDATE
+            """,
+            (portfolio_id, symbol),
+        )
+        position.lots.extend(
+            [lot["lot_id"], lot["remaining"], lot["price"]] for lot in cur.fetchall()
+        )
+        touched = position.sell(num_shares, price)
+        if touched:
+            execute_values(
+                cur,
+                """
+                UPDATE StockLots SET remaining = v.remaining
+                FROM (VALUES %s) AS v (lot_id, remaining)
+                WHERE StockLots.lot_id = v.lot_id
+                """,
+                [(lot_id, remaining) for lot_id, remaining, _ in touched],
+            )
+
+    _upsert_position(cur, portfolio_id, symbol, position)
+
+
+TRANSACTION_FIELDS = (
+    "transaction_id",
+    "portfolio_id",
+    "symbol",
+    "type",
+    "num_shares",
+    "price",
+    "timestamp",
+)
+
+
+def replay(transactions):
+    # StockTransactions rows (tuples in TRANSACTION_FIELDS order, or dict
+    # rows from RealDictCursor) ordered by portfolio, symbol and time ->
+    # ({(portfolio_id, symbol): Position}, StockLots rows to insert)
+    positions = {}
+    lots = []
+    for row in transactions:
+        if not isinstance(row, dict):
+            row = dict(zip(TRANSACTION_FIELDS, row))
+        key = (row["portfolio_id"], row["symbol"])
+        position = positions.setdefault(key, Position())
+        if row["type"] == "buy":
+            # Lots are tracked by their index in the insert batch
+            position.buy(row["num_shares"], row["price"], lot_id=len(lots))
+            lots.append(
+                [
+                    *key,
+                    row["transaction_id"],
+                    row["timestamp"],
+                    row["price"],
+                    row["num_shares"],
+                    0,
+                ]
+            )
+        else:
+            position.sell(row["num_shares"], row["price"])
+
+    for position in positions.values():
+        for index, remaining, _ in position.lots:
+            lots[index][6] = remaining
+    return positions, lots
+
+
+def rebuild_ledger(cur, portfolio_id=None):
+    # Replays the full history in memory and bulk-writes the result; only for
+    # migrations and repairs, requests never replay
+    scope, params = (
+        ("WHERE portfolio_id = %s", (portfolio_id,)) if portfolio_id else ("", ())
+    )
+    cur.execute(f"DELETE FROM StockLots {scope}", params)
+    cur.execute(f"DELETE FROM PositionLedger {scope}", params)
+    cur.execute(
+        f"""
+        SELECT {", ".join(TRANSACTION_FIELDS)}
+        FROM StockTransactions
+        {scope}
+        ORDER BY portfolio_id, symbol, timestamp, transaction_id
+        """,
+        params,
+    )
+    positions, lots = replay(cur.fetchall())
+
+    if lots:
+        execute_values(
+            cur,
+            """
+            INSERT INTO StockLots
+                (portfolio_id, symbol, transaction_id, acquired_at, price,
+                 num_shares, remaining)
+            VALUES %s
+            """,
+            lots,
+        )
+    if positions:
+        execute_values(
+            cur,
+            """
+            INSERT INTO PositionLedger
+                (portfolio_id, symbol, shares, cost_avg, cost_fifo,
+                 realized_avg, realized_fifo)
+            VALUES %s
+            """,
+            [
+                (pid, symbol, *position.ledger_values())
+                for (pid, symbol), position in positions.items()
+            ],
+        )
+    return len(positions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Rebuild StockLots and PositionLedger from StockTransactions"
+    )
+    parser.add_argument("--portfolio-id", type=int, help="Only this portfolio")
+    args = parser.parse_args(argv)
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            count = rebuild_ledger(cur, args.portfolio_id)
+        conn.commit()
+        print(f"Rebuilt {count} positions")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import os
+from flask import jsonify
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from .base import get_connection
+from .latest_prices import universe_price_version
+
+# Benchmark for beta: a ticker, or a daily index synthesized from every
+# symbol, either equal-weighted ("equal") or weighted by the previous day's
+# dollar volume ("volume"; the price data has no share counts for true cap
+# weights). Its return series and every symbol's full-history beta are stored
+# per benchmark and recomputed only after the prices they cover change:
+# version arguments below are universe_price_version() pairs.
+MARKET_BENCHMARK = os.environ.get("MARKET_BENCHMARK", "NVDA")
+SYNTHETIC_BENCHMARKS = ("equal", "volume")
+
+# Arbitrary key for pg_advisory_xact_lock so one process refreshes at a time
+MARKET_LOCK_ID = 4304303
+
+DAILY_RETURNS = """
+    SELECT symbol, timestamp,
+        close / NULLIF(LAG(close) OVER w, 0) - 1 AS r,
+        LAG(close * volume) OVER w AS weight
+    FROM StockPrices
+    {where}
+    WINDOW w AS (PARTITION BY symbol ORDER BY timestamp)
+"""
+
+
+def benchmark_name(benchmark=None):
+    benchmark = (benchmark or MARKET_BENCHMARK).strip()
+    if benchmark.lower() in SYNTHETIC_BENCHMARKS:
+        return benchmark.lower()
+    return benchmark.upper()
+
+
+def known_benchmark(cur, benchmark):
+    # Each benchmark stores a return series and a beta per symbol, so only
+    # the configured one, the synthetic ones and real tickers are accepted
+    if benchmark in SYNTHETIC_BENCHMARKS or benchmark == benchmark_name():
+        return True
+    cur.execute(
+        "SELECT EXISTS(SELECT 1 FROM StockPrices WHERE symbol = %s)", (benchmark,)
+    )
+    return cur.fetchone()[0]
+
+
+def _market_returns_query(benchmark):
+    if benchmark == "equal":
+        returns, where, params = "AVG(r)", "", []
+    elif benchmark == "volume":
+        returns = "SUM(r * weight) / NULLIF(SUM(weight), 0)"
+        where, params = "", []
+    else:
+        returns, where, params = "AVG(r)", "WHERE symbol = %s", [benchmark]
+    query = f"""
+        SELECT timestamp, {returns}
+        FROM ({DAILY_RETURNS.format(where=where)}) AS returns
+        WHERE r IS NOT NULL
+        GROUP BY timestamp
+    """
+    return query, params
+
+
+def refresh_market_returns(cur, benchmark, version):
+    query, params = _market_returns_query(benchmark)
+    cur.execute("DELETE FROM MarketReturns WHERE benchmark = %s", (benchmark,))
+    cur.execute(
+        f"""
+        INSERT INTO MarketReturns (benchmark, timestamp, market_return)
+        SELECT %s, timestamp, market_return
+        FROM ({query}) AS market (timestamp, market_return)
+        WHERE market_return IS NOT NULL
+        """,
+        [benchmark, *params],
+    )
+    _mark_fresh(cur, benchmark, "returns", version)
+
+
+def refresh_symbol_betas(cur, benchmark, version):
+    # OLS slope of each symbol's returns on the market's, all symbols in one
+    # aggregate; regr_slope skips days where either return is missing
+    cur.execute("DELETE FROM SymbolBetas WHERE benchmark = %s", (benchmark,))
+    cur.execute(
+        f"""
+        INSERT INTO SymbolBetas (benchmark, symbol, beta, observations)
+        SELECT %s, returns.symbol,
+            regr_slope(returns.r, m.market_return),
+            regr_count(returns.r, m.market_return)
+        FROM ({DAILY_RETURNS.format(where="")}) AS returns
+        JOIN MarketReturns m
+            ON m.benchmark = %s AND m.timestamp = returns.timestamp
+        GROUP BY returns.symbol
+        """,
+        (benchmark, benchmark),
+    )
+    _mark_fresh(cur, benchmark, "betas", version)
+
+
+def _mark_fresh(cur, benchmark, prefix, version):
+    cur.execute(
+        f"""
+        INSERT INTO MarketBenchmarks
+            (benchmark, {prefix}_version, {prefix}_writes, refreshed_at)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (benchmark) DO UPDATE
+        SET {prefix}_version = EXCLUDED.{prefix}_version,
+            {prefix}_writes = EXCLUDED.{prefix}_writes,
+            refreshed_at = EXCLUDED.refreshed_at
+        """,
+        (benchmark, *version),
+    )
+
+
+def _versions(cur, benchmark):
+    # A ticker's returns only read its own prices; synthetic returns and
+    # betas read every symbol's
+    universe = universe_price_version(cur)
+    if benchmark in SYNTHETIC_BENCHMARKS:
+        return universe, universe
+    return universe_price_version(cur, [benchmark]), universe
+
+
+def _stale(cur, benchmark, returns_version, betas_version, betas):
+    cur.execute(
+        """
+        SELECT returns_version, returns_writes, betas_version, betas_writes
+        FROM MarketBenchmarks WHERE benchmark = %s
+        """,
+        (benchmark,),
+    )
+    row = cur.fetchone() or (None,) * 4
+    if not isinstance(row, tuple):
+        row = tuple(row.values())
+    returns_stale = row[:2] != returns_version
+    return returns_stale, betas and (returns_stale or row[2:] != betas_version)
+
+
+def ensure_market_data(conn, benchmark=None, betas=False):
+    # Returns the benchmark name once its stored return series (and with
+    # betas=True, the SymbolBetas rows) match the current price data. Betas
+    # scan every symbol, so only /stocks/betas and startup ask for them.
+    benchmark = benchmark_name(benchmark)
+    with conn.cursor() as cur:
+        versions = _versions(cur, benchmark)
+        if any(_stale(cur, benchmark, *versions, betas)):
+            # Other processes wait here, then find the data fresh
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MARKET_LOCK_ID,))
+            versions = _versions(cur, benchmark)
+            returns_stale, betas_stale = _stale(cur, benchmark, *versions, betas)
+            if returns_stale:
+                refresh_market_returns(cur, benchmark, versions[0])
+            if betas_stale:
+                refresh_symbol_betas(cur, benchmark, versions[1])
+        conn.commit()
+    return benchmark
+
+
+def fetch_market_returns(conn, benchmark, start_date=None, end_date=None):
+    from .price_arrays import DAY_NUMBER, fetch_matrix
+
+    query = f"""
+        SELECT {DAY_NUMBER}, market_return FROM MarketReturns
+        WHERE benchmark = %s
+    """
+    params = [benchmark]
+    if start_date:
+        query += " AND timestamp >= %s"
+        params.append(start_date)
+    if end_date:
+        query += " AND timestamp <= %s"
+        params.append(end_date)
+    query += " ORDER BY timestamp"
+
+    matrix = fetch_matrix(conn, query, params, 2)
+    return matrix[:, 0].astype("int64"), matrix[:, 1]
+
+
+def get_symbol_betas(symbols=None, benchmark=None):
+    conn = get_connection()
+    try:
+        benchmark = benchmark_name(benchmark)
+        with conn.cursor() as cur:
+            if not known_benchmark(cur, benchmark):
+                return jsonify({"error": f"Unknown benchmark: {benchmark}"}), 400
+        benchmark = ensure_market_data(conn, benchmark, betas=True)
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            query = """
+                SELECT b.symbol, ROUND(b.beta::numeric, 4)::float8 AS beta,
+                    b.observations
+                FROM SymbolBetas b
+                WHERE b.benchmark = %s
+            """
+            params = [benchmark]
+            if symbols:
+                query += " AND b.symbol = ANY(%s)"
+                params.append(list(symbols))
+            query += " ORDER BY b.symbol"
+            cur.execute(query, params)
+            betas = cur.fetchall()
+
+            cur.execute(
+                """
+                SELECT betas_version, refreshed_at FROM MarketBenchmarks
+                WHERE benchmark = %s
+                """,
+                (benchmark,),
+            )
+            meta = cur.fetchone()
+
+            return jsonify(
+                {
+                    "benchmark": benchmark,
+                    "betas": betas,
+                    "price_data_version": meta["betas_version"],
+                    "refreshed_at": meta["refreshed_at"],
+                }
+            ), 200
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
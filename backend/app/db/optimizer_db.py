@@ -0,0 +1,124 @@
+import os
+from flask import jsonify
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from app.executor import AnalyticsTimeout, analytics_pool
+from .base import get_connection
+from .latest_prices import price_versions
+from .lru import LRUCache
+from .prepared import execute_prepared
+from .stock_lists_db import can_view_list
+
+# Estimated means/covariances keyed by (symbols, date range, price versions
+# of those symbols); a price write moves the versions of what it touched, so
+# entries never go stale
+COVARIANCE_CACHE_SIZE = int(os.environ.get("COVARIANCE_CACHE_SIZE", "32"))
+
+_estimates_cache = LRUCache(COVARIANCE_CACHE_SIZE)
+
+
+def _estimates(conn, symbols, start_date, end_date, versions):
+    from app.analytics.optimizer import daily_returns, estimate
+    from .price_arrays import fetch_close_matrix
+
+    key = (tuple(sorted(set(symbols))), start_date, end_date, versions)
+    cached = _estimates_cache.get(key)
+    if cached is not None:
+        return cached
+
+    ordered = list(key[0])
+    _, closes = fetch_close_matrix(conn, ordered, start_date, end_date)
+    keep, mean, cov = analytics_pool.run(estimate, daily_returns(closes))
+    result = ([ordered[i] for i in keep], mean, cov)
+    _estimates_cache.put(key, result)
+    return result
+
+
+def _optimize(conn, cur, symbols, start_date, end_date, risk_free_rate, points):
+    from app.analytics.optimizer import optimize
+
+    versions = price_versions(cur, symbols)
+    kept, mean, cov = _estimates(conn, symbols, start_date, end_date, versions)
+    if len(kept) < 2:
+        return jsonify(
+            {"error": "At least two symbols with enough price history are required"}
+        ), 400
+
+    result = analytics_pool.run(optimize, mean, cov, risk_free_rate, points)
+
+    def portfolio(name):
+        weights, stats = result[name]
+        return {**stats, "weights": dict(zip(kept, weights.round(6).tolist()))}
+
+    return jsonify(
+        {
+            "symbols": kept,
+            "excluded_symbols": sorted(set(symbols) - set(kept)),
+            "date_range": {"start_date": start_date, "end_date": end_date},
+            "risk_free_rate": risk_free_rate,
+            "expected_returns": dict(zip(kept, mean.round(6).tolist())),
+            "volatilities": dict(zip(kept, (cov.diagonal() ** 0.5).round(6).tolist())),
+            "min_variance": portfolio("min_variance"),
+            "max_sharpe": portfolio("max_sharpe"),
+            "efficient_frontier": result["frontier"],
+            "price_data_version": versions[0],
+        }
+    ), 200
+
+
+def optimize_stock_list(
+    list_id, user_id, start_date=None, end_date=None, risk_free_rate=0.0, points=25
+):
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if not can_view_list(cur, list_id, user_id):
+                return jsonify({"error": "Stock list not found or access denied"}), 403
+
+            cur.execute(
+                "SELECT symbol FROM StockListItems WHERE list_id = %s", (list_id,)
+            )
+            symbols = [row["symbol"] for row in cur.fetchall()]
+            if not symbols:
+                return jsonify({"error": "No stocks found in this list"}), 404
+
+            return _optimize(
+                conn, cur, symbols, start_date, end_date, risk_free_rate, points
+            )
+    except AnalyticsTimeout as e:
+        return jsonify({"error": str(e)}), 504
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+
+def optimize_portfolio(
+    portfolio_id, user_id, start_date=None, end_date=None, risk_free_rate=0.0, points=25
+):
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Check if user owns portfolio
+            execute_prepared(cur, "portfolio_owned_by", (portfolio_id, user_id))
+
+            if not cur.fetchone():
+                return jsonify({"error": "Portfolio not found or access denied"}), 403
+
+            cur.execute(
+                "SELECT symbol FROM StockHoldings WHERE portfolio_id = %s",
+                (portfolio_id,),
+            )
+            symbols = [row["symbol"] for row in cur.fetchall()]
+            if not symbols:
+                return jsonify({"error": "No holdings found in portfolio"}), 404
+
+            return _optimize(
+                conn, cur, symbols, start_date, end_date, risk_free_rate, points
+            )
+    except AnalyticsTimeout as e:
+        return jsonify({"error": str(e)}), 504
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
@@ -64,6 +64,84 @@ def get_portfolio_by_id(portfolio_id, user_id):
         conn.close()
 
 
+def get_portfolio_summary(portfolio_id, user_id):
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Ownership, balance and every valued holding in one read of the
+            # ledger's average cost basis and the latest price snapshot
+            cur.execute(
+                """
+                WITH holdings AS (
+                    SELECT sh.portfolio_id, sh.symbol, s.company_name, sh.num_shares,
+                        COALESCE(pl.cost_avg, 0)::float8 AS cost_basis,
+                        lp.close AS current_price,
+                        lp.timestamp AS price_date,
+                        sh.num_shares * lp.close AS market_value
+                    FROM StockHoldings sh
+                    JOIN Stocks s ON sh.symbol = s.symbol
+                    LEFT JOIN PositionLedger pl
+                        ON pl.portfolio_id = sh.portfolio_id AND pl.symbol = sh.symbol
+                    LEFT JOIN LatestStockPrices lp ON lp.symbol = sh.symbol
+                    WHERE sh.portfolio_id = %s
+                )
+                SELECT p.portfolio_id, p.name, p.balance::float8 AS balance,
+                    h.symbol, h.company_name, h.num_shares, h.cost_basis,
+                    h.current_price, h.price_date, h.market_value,
+                    h.market_value - h.cost_basis AS unrealized_pnl,
+                    h.market_value / NULLIF(SUM(h.market_value) OVER (), 0) AS weight
+                FROM Portfolios p
+                LEFT JOIN holdings h ON h.portfolio_id = p.portfolio_id
+                WHERE p.portfolio_id = %s AND p.user_id = %s
+                ORDER BY h.market_value DESC NULLS LAST, h.symbol
+                """,
+                (portfolio_id, portfolio_id, user_id),
+            )
+            rows = cur.fetchall()
+
+        if not rows:
+            return jsonify({"error": "Portfolio not found or access denied"}), 403
+
+        portfolio = rows[0]
+        holdings = [
+            {
+                key: row[key]
+                for key in (
+                    "symbol",
+                    "company_name",
+                    "num_shares",
+                    "cost_basis",
+                    "current_price",
+                    "price_date",
+                    "market_value",
+                    "unrealized_pnl",
+                    "weight",
+                )
+            }
+            for row in rows
+            if row["symbol"] is not None
+        ]
+        market_value = sum(h["market_value"] or 0 for h in holdings)
+        cost_basis = sum(h["cost_basis"] for h in holdings)
+
+        return jsonify(
+            {
+                "portfolio_id": portfolio["portfolio_id"],
+                "name": portfolio["name"],
+                "balance": portfolio["balance"],
+                "market_value": market_value,
+                "total_value": portfolio["balance"] + market_value,
+                "cost_basis": cost_basis,
+                "unrealized_pnl": sum(h["unrealized_pnl"] or 0 for h in holdings),
+                "holdings": holdings,
+            }
+        ), 200
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+
 def transfer_funds(from_id, to_id, amount):
     conn = get_connection()
     try:
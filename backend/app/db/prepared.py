@@ -0,0 +1,120 @@
+import os
+import re
+import psycopg2
+import psycopg2.extensions
+
+# Set to "off" behind a transaction-pooling proxy (e.g. PgBouncer), where
+# session state such as prepared statements does not follow the client
+PREPARED_STATEMENTS_ENABLED = (
+    os.environ.get("DB_PREPARED_STATEMENTS", "on").lower() != "off"
+)
+
+# Hot fixed-shape queries, written with psycopg2 placeholders so the same text
+# runs unprepared when prepared statements are disabled or unavailable
+PREPARED_QUERIES = {
+    "portfolio_owned_by": """
+        SELECT 1 FROM Portfolios WHERE portfolio_id = %s AND user_id = %s
+    """,
+    "portfolio_owner": """
+        SELECT user_id FROM Portfolios WHERE portfolio_id = %s
+    """,
+    "latest_price": """
+        SELECT * FROM StockPrices
+        WHERE symbol = %s
+        ORDER BY timestamp DESC
+        LIMIT 1
+    """,
+    # One branch per side of the edge so each uses its own index
+    "user_friends": """
+        SELECT u.user_id AS friend_id, u.username, f.since
+        FROM Friends f
+        JOIN Users u ON u.user_id = f.user2_id
+        WHERE f.user1_id = %s
+        UNION ALL
+        SELECT u.user_id AS friend_id, u.username, f.since
+        FROM Friends f
+        JOIN Users u ON u.user_id = f.user1_id
+        WHERE f.user2_id = %s
+    """,
+    # Per-symbol daily return mean/stddev behind list and portfolio statistics;
+    # symbols are bound as one array so the text never varies
+    "symbol_return_stats": """
+        WITH daily_prices AS (
+            SELECT symbol, close,
+                LAG(close) OVER (PARTITION BY symbol ORDER BY timestamp) AS prev_close
+            FROM StockPrices
+            WHERE symbol = ANY(%s) AND timestamp BETWEEN %s AND %s
+        ),
+        stock_stats AS (
+            SELECT symbol,
+                AVG((close - prev_close) / prev_close) AS mean_return,
+                STDDEV((close - prev_close) / prev_close) AS stddev_return,
+                COUNT(*) AS days
+            FROM daily_prices
+            WHERE prev_close IS NOT NULL
+            GROUP BY symbol
+        )
+        SELECT symbol, mean_return, stddev_return,
+            CASE
+                WHEN mean_return = 0 THEN NULL
+                ELSE stddev_return / ABS(mean_return)
+            END AS coefficient_of_variation,
+            days
+        FROM stock_stats
+    """,
+}
+
+_PLACEHOLDER = re.compile(r"%s")
+
+
+def _to_server_params(query):
+    counter = iter(range(1, query.count("%s") + 1))
+    return _PLACEHOLDER.sub(lambda _: f"${next(counter)}", query)
+
+
+def _prepared_names(conn):
+    # A connection fresh from the pool (or replaced after a failure) starts
+    # with no record; sync once with the server instead of assuming
+    if conn.prepared_statements is None:
+        with conn.cursor() as cur:
+            cur.execute("SELECT name FROM pg_prepared_statements")
+            conn.prepared_statements = {row[0] for row in cur.fetchall()}
+    return conn.prepared_statements
+
+
+def _prepare(cur, conn, name):
+    names = _prepared_names(conn)
+    if name not in names:
+        cur.execute(f"PREPARE {name} AS {_to_server_params(PREPARED_QUERIES[name])}")
+        names.add(name)
+
+
+def prepare_all(cur):
+    # Startup warm-up: PREPARE every hot statement on this cursor's connection
+    conn = cur.connection
+    if PREPARED_STATEMENTS_ENABLED and hasattr(conn, "prepared_statements"):
+        for name in PREPARED_QUERIES:
+            _prepare(cur, conn, name)
+
+
+def execute_prepared(cur, name, params=()):
+    conn = cur.connection
+    if not PREPARED_STATEMENTS_ENABLED or not hasattr(conn, "prepared_statements"):
+        cur.execute(PREPARED_QUERIES[name], params)
+        return
+
+    placeholders = ", ".join(["%s"] * len(params))
+    statement = f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}"
+    idle = conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    try:
+        _prepare(cur, conn, name)
+        cur.execute(statement, params)
+    except psycopg2.errors.InvalidSqlStatementName:
+        # The server lost our statements (DISCARD ALL, proxy reassignment):
+        # forget them, and retry transparently if nothing else was in flight
+        conn.prepared_statements = None
+        if not idle:
+            raise
+        conn.rollback()
+        _prepare(cur, conn, name)
+        cur.execute(statement, params)
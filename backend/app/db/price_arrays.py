@@ -0,0 +1,117 @@
+import numpy as np
+
+# Read path for analytical queries: plain tuple cursors drained with
+# fetchmany() into preallocated float64 arrays, instead of one dict per row.
+# Dates travel as integer day numbers (days since 1970-01-01) so no
+# datetime.date objects are built either; NULLs arrive as NaN.
+
+EPOCH = np.datetime64("1970-01-01", "D")
+FETCH_BATCH = 5000
+
+DAY_NUMBER = "(timestamp - DATE '1970-01-01')::float8"
+
+
+def fetch_matrix(conn, query, params, columns):
+    # Every selected column must be numeric (float8-compatible)
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        out = np.empty((max(cur.rowcount, 0), columns), dtype=np.float64)
+        filled = 0
+        while True:
+            rows = cur.fetchmany(FETCH_BATCH)
+            if not rows:
+                break
+            block = np.fromiter(
+                (value for row in rows for value in row),
+                dtype=np.float64,
+                count=len(rows) * columns,
+            )
+            out[filled : filled + len(rows)] = block.reshape(len(rows), columns)
+            filled += len(rows)
+        return out[:filled]
+
+
+def _nan(column):
+    return f"COALESCE({column}, 'NaN'::float8)"
+
+
+def _day_bounds(start_date, end_date):
+    return (
+        date_string_to_day(str(start_date)) if start_date else None,
+        date_string_to_day(str(end_date)) if end_date else None,
+    )
+
+
+def fetch_price_series(conn, symbol, start_date=None, end_date=None, fields=("close",)):
+    from .price_cache import fresh_price_file
+
+    cached = fresh_price_file(conn, [symbol], fields)
+    if cached is not None:
+        return cached.series(symbol, *_day_bounds(start_date, end_date), fields)
+
+    query = f"""
+        SELECT {DAY_NUMBER}, {", ".join(_nan(f) for f in fields)}
+        FROM StockPrices
+        WHERE symbol = %s
+    """
+    params = [symbol]
+    if start_date:
+        query += " AND timestamp >= %s"
+        params.append(start_date)
+    if end_date:
+        query += " AND timestamp <= %s"
+        params.append(end_date)
+    query += " ORDER BY timestamp"
+
+    matrix = fetch_matrix(conn, query, params, len(fields) + 1)
+    return matrix[:, 0].astype(np.int64), matrix[:, 1:]
+
+
+def day_to_date_string(day):
+    return str(EPOCH + np.timedelta64(int(day), "D"))
+
+
+def date_string_to_day(value):
+    return int((np.datetime64(value, "D") - EPOCH).astype(np.int64))
+
+
+def fetch_field_matrices(
+    conn, symbols, start_date=None, end_date=None, fields=("close",)
+):
+    # One query for any number of symbols, pivoted into (days x symbols)
+    # matrices aligned on the union of trading days; gaps are NaN. Served
+    # from the mapped price file instead when it's current (price_cache.py)
+    from .price_cache import fresh_price_file
+
+    cached = fresh_price_file(conn, symbols, fields)
+    if cached is not None:
+        return cached.matrices(symbols, *_day_bounds(start_date, end_date), fields)
+
+    query = f"""
+        SELECT {DAY_NUMBER}, array_position(%s::text[], symbol::text)::float8,
+            {", ".join(_nan(f) for f in fields)}
+        FROM StockPrices
+        WHERE symbol = ANY(%s)
+    """
+    params = [list(symbols), list(symbols)]
+    if start_date:
+        query += " AND timestamp >= %s"
+        params.append(start_date)
+    if end_date:
+        query += " AND timestamp <= %s"
+        params.append(end_date)
+
+    rows = fetch_matrix(conn, query, params, len(fields) + 2)
+    days, day_index = np.unique(rows[:, 0].astype(np.int64), return_inverse=True)
+    symbol_index = rows[:, 1].astype(np.int64) - 1
+    matrices = {}
+    for column, field in enumerate(fields, start=2):
+        matrix = np.full((len(days), len(symbols)), np.nan)
+        matrix[day_index, symbol_index] = rows[:, column]
+        matrices[field] = matrix
+    return days, matrices
+
+
+def fetch_close_matrix(conn, symbols, start_date=None, end_date=None):
+    days, matrices = fetch_field_matrices(conn, symbols, start_date, end_date)
+    return days, matrices["close"]
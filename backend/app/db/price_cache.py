@@ -0,0 +1,266 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import numpy as np
+import psycopg2
+from .base import get_connection
+from .latest_prices import current_price_data_version, symbol_price_versions
+from .price_arrays import DAY_NUMBER, _nan, fetch_matrix
+
+# The whole price history as one columnar file every process on the host maps
+# read-only: the OS page cache holds a single copy however many workers there
+# are, and a worker starting up maps it instead of loading prices. Layout:
+#
+#   magic, header length, JSON header (symbols, price versions, arrays)
+#   offsets (symbols + 1 int64): symbol i owns rows offsets[i]:offsets[i + 1]
+#   day (int32 days since 1970-01-01), close, volume (float64, NaN if NULL)
+#
+# Rows are ordered by symbol, then date. A new file is written beside the old
+# one and renamed over it, so readers see either file whole; mappings of the
+# old one stay valid until dropped. The file only serves reads while its
+# version matches PriceDataVersion; a stale file triggers a rebuild in the
+# background and readers fall back to Postgres meanwhile. Symbols written to
+# row by row since the file was built (see latest_prices.py) are read from
+# Postgres until the next bulk load rebuilds it.
+PRICE_CACHE = os.environ.get("PRICE_CACHE", "on").lower() != "off"
+PRICE_CACHE_PATH = os.environ.get(
+    "PRICE_CACHE_PATH", os.path.join(tempfile.gettempdir(), "snfs-prices.bin")
+)
+CACHED_FIELDS = ("close", "volume")
+
+# Arbitrary key for pg_advisory_lock so one process rebuilds the file at a time
+PRICE_CACHE_LOCK_ID = 4304304
+
+MAGIC = b"SNFSPRC2"
+PREFIX = struct.Struct("<8sQ")
+ALIGN = 64
+
+_mapped = None
+_mapped_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+
+
+def _aligned(position):
+    return -(-position // ALIGN) * ALIGN
+
+
+class PriceFile:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+
+        magic, header_length = PREFIX.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a price cache file")
+        header = json.loads(buffer[PREFIX.size : PREFIX.size + header_length])
+        base = _aligned(PREFIX.size + header_length)
+
+        self.version = header["version"]
+        self.symbol_versions = header["symbol_versions"]
+        self.symbols = header["symbols"]
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        # Views straight into the mapping, read-only, nothing copied
+        self.arrays = {
+            name: np.frombuffer(buffer, dtype=dtype, count=count, offset=base + start)
+            for name, (start, dtype, count) in header["arrays"].items()
+        }
+
+    def _rows(self, symbol, start_day, end_day):
+        i = self.index.get(symbol)
+        if i is None:
+            return 0, 0
+        lo, hi = (int(row) for row in self.arrays["offsets"][i : i + 2])
+        days = self.arrays["day"][lo:hi]
+        if start_day is not None:
+            lo += int(days.searchsorted(start_day))
+        if end_day is not None:
+            hi -= len(days) - int(days.searchsorted(end_day, side="right"))
+        return lo, max(lo, hi)
+
+    def series(self, symbol, start_day=None, end_day=None, fields=("close",)):
+        lo, hi = self._rows(symbol, start_day, end_day)
+        days = self.arrays["day"][lo:hi].astype(np.int64)
+        return days, np.column_stack([self.arrays[f][lo:hi] for f in fields])
+
+    def matrices(self, symbols, start_day=None, end_day=None, fields=("close",)):
+        # Same shape as price_arrays.fetch_field_matrices: (days x symbols)
+        # per field on the union of the symbols' trading days
+        ranges = [self._rows(symbol, start_day, end_day) for symbol in symbols]
+        day_column = self.arrays["day"]
+        days = np.unique(
+            np.concatenate([day_column[lo:hi] for lo, hi in ranges] or [[]])
+        ).astype(np.int64)
+        matrices = {
+            field: np.full((len(days), len(symbols)), np.nan) for field in fields
+        }
+        for column, (lo, hi) in enumerate(ranges):
+            rows = days.searchsorted(day_column[lo:hi])
+            for field in fields:
+                matrices[field][rows, column] = self.arrays[field][lo:hi]
+        return days, matrices
+
+
+def write_price_file(
+    path, version, symbol_versions, symbols, offsets, days, closes, volumes
+):
+    arrays = {
+        "offsets": np.ascontiguousarray(offsets, dtype="<i8"),
+        "day": np.ascontiguousarray(days, dtype="<i4"),
+        "close": np.ascontiguousarray(closes, dtype="<f8"),
+        "volume": np.ascontiguousarray(volumes, dtype="<f8"),
+    }
+    layout, position = {}, 0
+    for name, array in arrays.items():
+        layout[name] = (position, array.dtype.str, len(array))
+        position = _aligned(position + array.nbytes)
+    header = json.dumps(
+        {
+            "version": version,
+            "symbol_versions": symbol_versions,
+            "symbols": symbols,
+            "arrays": layout,
+        }
+    ).encode()
+    base = _aligned(PREFIX.size + len(header))
+
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporary, "wb") as f:
+            f.write(PREFIX.pack(MAGIC, len(header)))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(base + layout[name][0])
+                f.write(array.tobytes())
+            f.truncate(base + position)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def build_price_file(conn, path=PRICE_CACHE_PATH):
+    # Version first: prices written after it make the file look stale, never
+    # the other way round
+    with conn.cursor() as cur:
+        version = current_price_data_version(cur)
+        symbol_versions = symbol_price_versions(cur)
+        cur.execute("SELECT DISTINCT symbol FROM StockPrices ORDER BY symbol")
+        symbols = [row[0] for row in cur.fetchall()]
+
+    rows = fetch_matrix(
+        conn,
+        f"""
+        SELECT array_position(%s::text[], symbol::text)::float8, {DAY_NUMBER},
+            {_nan("close")}, {_nan("volume")}
+        FROM StockPrices
+        WHERE symbol = ANY(%s)
+        ORDER BY 1, 2
+        """,
+        [symbols, symbols],
+        4,
+    )
+    counts = np.bincount(rows[:, 0].astype(np.int64) - 1, minlength=len(symbols))
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    write_price_file(
+        path,
+        version,
+        symbol_versions,
+        symbols,
+        offsets,
+        rows[:, 1],
+        rows[:, 2],
+        rows[:, 3],
+    )
+    conn.commit()
+    return version
+
+
+def price_file():
+    # The mapped file, remapped when it has been replaced since; None if
+    # there is none yet
+    global _mapped
+    try:
+        stat = os.stat(PRICE_CACHE_PATH)
+    except FileNotFoundError:
+        return None
+    with _mapped_lock:
+        if _mapped is None or _mapped.identity != (stat.st_ino, stat.st_mtime_ns):
+            try:
+                _mapped = PriceFile(PRICE_CACHE_PATH)
+            except (OSError, ValueError, struct.error):
+                # Unreadable counts as missing, so the next build replaces it
+                return None
+        return _mapped
+
+
+def ensure_price_file(conn):
+    # Rebuilds the file if it's missing or behind the price data; other
+    # processes wait on the lock, then find it fresh
+    if not PRICE_CACHE:
+        return None
+    try:
+        with conn.cursor() as cur:
+            version = current_price_data_version(cur)
+            current = price_file()
+            if current is not None and current.version == version:
+                return current
+
+            cur.execute("SELECT pg_advisory_lock(%s)", (PRICE_CACHE_LOCK_ID,))
+            conn.commit()
+            try:
+                version = current_price_data_version(cur)
+                current = price_file()
+                if current is None or current.version != version:
+                    build_price_file(conn)
+                    current = price_file()
+            finally:
+                # Session-level lock: survives the rollback of a failed build
+                conn.rollback()
+                cur.execute("SELECT pg_advisory_unlock(%s)", (PRICE_CACHE_LOCK_ID,))
+                conn.commit()
+            return current
+    except (OSError, psycopg2.Error) as e:
+        conn.rollback()
+        print(f"Price cache file not available: {e}")
+        return None
+
+
+def _rebuild_in_background():
+    if not _rebuild_lock.acquire(blocking=False):
+        return
+
+    def rebuild():
+        conn = get_connection()
+        try:
+            ensure_price_file(conn)
+        finally:
+            conn.close()
+            _rebuild_lock.release()
+
+    threading.Thread(target=rebuild, name="price-cache-rebuild", daemon=True).start()
+
+
+def fresh_price_file(conn, symbols, fields=("close",)):
+    # The mapped file if it matches the current prices of symbols and holds
+    # the fields asked for, else None (rebuilding it in the background if a
+    # bulk load made it stale)
+    if not PRICE_CACHE or not set(fields) <= set(CACHED_FIELDS):
+        return None
+    with conn.cursor() as cur:
+        version = current_price_data_version(cur)
+        changed = symbol_price_versions(cur, symbols)
+    current = price_file()
+    if current is None or current.version != version:
+        _rebuild_in_background()
+        return None
+    if any(current.symbol_versions.get(s, 0) != v for s, v in changed.items()):
+        return None
+    return current
@@ -0,0 +1,113 @@
+# Weekly and monthly OHLCV bars per symbol in StockPriceRollups, so long
+# ranges read one row per period instead of every trading day. Bulk loads
+# rebuild the table; single-row writes recompute just the buckets containing
+# that day (both through the hooks in latest_prices.py).
+
+ROLLUP_INTERVALS = ("week", "month")
+
+# One bar per bucket: first open, max high, min low, last close
+BUCKET_SELECT = """
+    SELECT
+        %(resolution)s AS resolution,
+        symbol,
+        date_trunc(%(resolution)s, timestamp)::date AS timestamp,
+        (array_agg(open ORDER BY timestamp) FILTER (WHERE open IS NOT NULL))[1],
+        MAX(high),
+        MIN(low),
+        (array_agg(close ORDER BY timestamp DESC)
+            FILTER (WHERE close IS NOT NULL))[1],
+        SUM(volume)::bigint,
+        COUNT(*)
+    FROM StockPrices
+"""
+
+ROLLUP_FIELDS = (
+    "resolution, symbol, timestamp, open, high, low, close, volume, trading_days"
+)
+
+ROLLUP_COLUMNS = "symbol, timestamp, open, high, low, close, volume, trading_days"
+
+
+def rebuild_rollups(cur):
+    # DELETE rather than TRUNCATE so readers keep the old bars until commit
+    cur.execute("DELETE FROM StockPriceRollups")
+    for interval in ROLLUP_INTERVALS:
+        cur.execute(
+            f"""
+            INSERT INTO StockPriceRollups ({ROLLUP_FIELDS})
+            {BUCKET_SELECT}
+            GROUP BY symbol, 3
+            """,
+            {"resolution": interval},
+        )
+
+
+def refresh_rollup_buckets(cur, symbol, timestamp):
+    # Recomputed from the daily rows (at most ~23 via the primary key), which
+    # also handles a changed or corrected day correctly
+    for interval in ROLLUP_INTERVALS:
+        cur.execute(
+            f"""
+            INSERT INTO StockPriceRollups ({ROLLUP_FIELDS})
+            {BUCKET_SELECT}
+            WHERE symbol = %(symbol)s
+                AND timestamp >= date_trunc(%(resolution)s, %(day)s::date)
+                AND timestamp < date_trunc(%(resolution)s, %(day)s::date)
+                    + ('1 ' || %(resolution)s)::interval
+            GROUP BY symbol, 3
+            ON CONFLICT (resolution, symbol, timestamp) DO UPDATE SET
+                open = EXCLUDED.open,
+                high = EXCLUDED.high,
+                low = EXCLUDED.low,
+                close = EXCLUDED.close,
+                volume = EXCLUDED.volume,
+                trading_days = EXCLUDED.trading_days
+            """,
+            {"resolution": interval, "symbol": symbol, "day": timestamp},
+        )
+
+
+def count_rollup_points(cur, symbol, start_date=None, end_date=None):
+    query = """
+        SELECT resolution, COUNT(*) AS points FROM StockPriceRollups
+        WHERE symbol = %s
+    """
+    params = [symbol]
+    if start_date:
+        query += " AND timestamp >= date_trunc(resolution, %s::date)"
+        params.append(start_date)
+    if end_date:
+        query += " AND timestamp <= %s"
+        params.append(end_date)
+    query += " GROUP BY resolution"
+
+    cur.execute(query, params)
+    return {row["resolution"]: row["points"] for row in cur.fetchall()}
+
+
+def pick_interval(counts, points):
+    # Coarsest resolution that still gives at least the requested points;
+    # daily rows when no rollup is dense enough
+    for interval in reversed(ROLLUP_INTERVALS):
+        if counts.get(interval, 0) >= points:
+            return interval
+    return "day"
+
+
+def fetch_rollups(cur, symbol, interval, start_date=None, end_date=None):
+    # Whole buckets overlapping the range, so the first bar may start before it
+    query = f"""
+        SELECT {ROLLUP_COLUMNS} FROM StockPriceRollups
+        WHERE resolution = %s AND symbol = %s
+    """
+    params = [interval, symbol]
+    if start_date:
+        query += " AND timestamp >= date_trunc(%s, %s::date)"
+        params.extend([interval, start_date])
+    if end_date:
+        query += " AND timestamp <= %s"
+        params.append(end_date)
+    query += " ORDER BY timestamp"
+
+    cur.execute(query, params)
+    return cur.fetchall()
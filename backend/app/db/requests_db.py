@@ -3,6 +3,7 @@ from flask import jsonify
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from .base import get_connection
+from .friend_graph import are_friends_now, friend_graph
 
 
 def get_user_id_by_username(username):
@@ -45,15 +46,7 @@ def send_request(senderId, receiverId):
             # Check if already friends
             senderId = int(senderId)
             receiverId = int(receiverId)
-            user1, user2 = sorted([senderId, receiverId])
-            cur.execute(
-                """
-                SELECT 1 FROM Friends
-                WHERE user1_id = %s AND user2_id = %s;
-            """,
-                (user1, user2),
-            )
-            if cur.fetchone():
+            if are_friends_now(cur, senderId, receiverId):
                 return jsonify({"error": "You are already friends"}), 400
 
             # Check for existing pending request
@@ -143,6 +136,7 @@ def accept_request(request_id):
             )
 
         conn.commit()
+        friend_graph.invalidate(from_id, to_id)
         return jsonify({"message": "Request accepted", "request": updated_request}), 200
     except psycopg2.Error as e:
         return jsonify({"error": str(e)}), 500
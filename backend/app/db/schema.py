@@ -0,0 +1,446 @@
+import os
+from decimal import Decimal
+from .base import get_connection
+from .latest_prices import refresh_latest_prices
+from .ledger import rebuild_ledger
+from .price_rollups import rebuild_rollups
+
+# "heap" keeps StockPrices as a single table, "partitioned" range-partitions it
+# by year with a BRIN index on timestamp
+STOCK_PRICES_LAYOUT = os.environ.get("STOCK_PRICES_LAYOUT", "heap").lower()
+
+# Canonical StockPrices columns, shared by schema.sql, migrations and loaders.
+# Native float8/int8 so analytics read plain Python floats instead of Decimals.
+STOCK_PRICES_COLUMNS = """
+    timestamp DATE NOT NULL,
+    open DOUBLE PRECISION NULL,
+    high DOUBLE PRECISION NULL,
+    low DOUBLE PRECISION NULL,
+    close DOUBLE PRECISION,
+    volume BIGINT,
+    symbol VARCHAR(5) NOT NULL
+"""
+
+STOCK_PRICES_FIELDS = "timestamp, open, high, low, close, volume, symbol"
+
+# Arbitrary key for pg_advisory_lock so only one process migrates at a time
+MIGRATION_LOCK_ID = 4304301
+
+
+def partitioning_enabled():
+    return STOCK_PRICES_LAYOUT == "partitioned"
+
+
+def create_stock_prices_table(cur, name="StockPrices", partitioned=False, keys=True):
+    partition_clause = "PARTITION BY RANGE (timestamp)" if partitioned else ""
+    primary_key = ", PRIMARY KEY (symbol, timestamp)" if keys or partitioned else ""
+    cur.execute(
+        f"CREATE TABLE {name} ({STOCK_PRICES_COLUMNS}{primary_key}) {partition_clause}"
+    )
+    if keys or partitioned:
+        create_stock_prices_indexes(cur, name, partitioned)
+
+
+def create_stock_prices_indexes(cur, name, partitioned=False):
+    if partitioned:
+        # Daily prices arrive in date order so BRIN summarizes each partition
+        # in a handful of pages; the PK still serves point lookups
+        cur.execute(
+            f"CREATE INDEX {name}_timestamp_brin ON {name} USING BRIN (timestamp)"
+        )
+    else:
+        # Symbol lookups are served by the PK's leading column
+        cur.execute(f"CREATE INDEX {name}_timestamp_idx ON {name}(timestamp)")
+
+
+def swap_stock_prices_table(cur, new_name):
+    # Replace the live table in one transaction: readers keep using the old
+    # table until commit and never observe an empty or missing StockPrices
+    cur.execute("ALTER TABLE IF EXISTS StockPrices RENAME TO stockprices_old")
+    cur.execute("DROP TABLE IF EXISTS stockprices_old")
+    cur.execute(f"ALTER TABLE {new_name} RENAME TO StockPrices")
+    cur.execute(f"ALTER INDEX {new_name}_pkey RENAME TO stockprices_pkey")
+    rename_stock_prices_indexes(cur, new_name)
+
+
+def rename_stock_prices_indexes(cur, name):
+    cur.execute(
+        f"ALTER INDEX IF EXISTS {name}_timestamp_idx "
+        "RENAME TO idx_stockprices_timestamp"
+    )
+    cur.execute(
+        f"ALTER INDEX IF EXISTS {name}_timestamp_brin "
+        "RENAME TO idx_stockprices_timestamp_brin"
+    )
+
+
+def backfill_stocks(cur):
+    # Prices are not FK-bound to Stocks (bulk loads would pay for the check on
+    # every row), so register any new symbols after a load instead
+    cur.execute("""
+        INSERT INTO Stocks (symbol, company_name)
+        SELECT DISTINCT symbol, 'Company ' || symbol
+        FROM StockPrices
+        ON CONFLICT (symbol) DO NOTHING
+    """)
+    return cur.rowcount
+
+
+def _stock_prices_canonical_types(cur):
+    cur.execute("SELECT to_regclass('stockprices') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        create_stock_prices_table(cur, partitioned=partitioning_enabled())
+        rename_stock_prices_indexes(cur, "stockprices")
+        return
+
+    # schema.sql used DECIMAL/BIGINT and the old loader REAL/INT; converge
+    cur.execute("""
+        ALTER TABLE StockPrices
+            ALTER COLUMN open TYPE DOUBLE PRECISION,
+            ALTER COLUMN high TYPE DOUBLE PRECISION,
+            ALTER COLUMN low TYPE DOUBLE PRECISION,
+            ALTER COLUMN close TYPE DOUBLE PRECISION,
+            ALTER COLUMN volume TYPE BIGINT,
+            ALTER COLUMN open DROP NOT NULL,
+            ALTER COLUMN high DROP NOT NULL,
+            ALTER COLUMN low DROP NOT NULL,
+            ALTER COLUMN close DROP NOT NULL,
+            ALTER COLUMN volume DROP NOT NULL
+    """)
+    cur.execute(
+        "ALTER TABLE StockPrices DROP CONSTRAINT IF EXISTS stockprices_symbol_fkey"
+    )
+    cur.execute("DROP INDEX IF EXISTS idx_stockprices_symbol")
+    backfill_stocks(cur)
+
+
+def _search_indexes(cur):
+    # Expression indexes rather than stored tsvector columns, so the many
+    # SELECT * / RETURNING * queries on these tables don't start returning
+    # them; search queries must use the exact same to_tsvector() expression
+    cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_stocklists_name_fts
+        ON StockLists USING GIN (to_tsvector('english', name))
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_stocklists_name_trgm
+        ON StockLists USING GIN (name gin_trgm_ops)
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_reviews_content_fts
+        ON Reviews USING GIN (to_tsvector('english', content))
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_reviews_content_trgm
+        ON Reviews USING GIN (content gin_trgm_ops)
+    """)
+    # Access checks probe SharedLists by user, not by list
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sharedlists_shared_user
+        ON SharedLists (shared_user, list_id)
+    """)
+
+
+def _friends_reverse_index(cur):
+    # The PK only serves lookups by user1_id; edges are stored once with
+    # user1_id < user2_id, so the other side needs its own index
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_friends_user2
+        ON Friends (user2_id, user1_id)
+    """)
+
+
+def _holdings_valuation(cur):
+    # Total cost of the shares still held, at average cost
+    cur.execute("""
+        ALTER TABLE StockHoldings
+        ADD COLUMN IF NOT EXISTS cost_basis NUMERIC(20, 6) NOT NULL DEFAULT 0
+    """)
+    cur.execute("""
+        SELECT portfolio_id, symbol, type, num_shares, price
+        FROM StockTransactions
+        ORDER BY portfolio_id, symbol, timestamp, transaction_id
+    """)
+    shares, basis = {}, {}
+    for portfolio_id, symbol, kind, num_shares, price in cur.fetchall():
+        key = (portfolio_id, symbol)
+        held = shares.get(key, 0)
+        if kind == "buy":
+            basis[key] = basis.get(key, Decimal(0)) + num_shares * price
+            shares[key] = held + num_shares
+        elif held:
+            basis[key] -= basis[key] * num_shares / held
+            shares[key] = held - num_shares
+    cur.executemany(
+        """
+        UPDATE StockHoldings SET cost_basis = %s
+        WHERE portfolio_id = %s AND symbol = %s
+        """,
+        [(cost, key[0], key[1]) for key, cost in basis.items()],
+    )
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS LatestStockPrices (
+            symbol VARCHAR(5) PRIMARY KEY,
+            timestamp DATE NOT NULL,
+            close DOUBLE PRECISION NOT NULL
+        )
+    """)
+    refresh_latest_prices(cur)
+
+
+def _position_ledger(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS StockLots (
+            lot_id SERIAL PRIMARY KEY,
+            portfolio_id INT NOT NULL REFERENCES Portfolios(portfolio_id) ON DELETE CASCADE,
+            symbol VARCHAR(5) NOT NULL,
+            transaction_id INT REFERENCES StockTransactions(transaction_id) ON DELETE CASCADE,
+            acquired_at TIMESTAMP NOT NULL,
+            price NUMERIC(15, 2) NOT NULL,
+            num_shares INT NOT NULL CHECK (num_shares > 0),
+            remaining INT NOT NULL CHECK (remaining >= 0 AND remaining <= num_shares)
+        )
+    """)
+    # FIFO sells only ever read the open lots of one position, oldest first
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_stocklots_open
+        ON StockLots (portfolio_id, symbol, acquired_at, lot_id)
+        WHERE remaining > 0
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS PositionLedger (
+            portfolio_id INT NOT NULL REFERENCES Portfolios(portfolio_id) ON DELETE CASCADE,
+            symbol VARCHAR(5) NOT NULL,
+            shares INT NOT NULL DEFAULT 0,
+            cost_avg NUMERIC(20, 6) NOT NULL DEFAULT 0,
+            cost_fifo NUMERIC(20, 6) NOT NULL DEFAULT 0,
+            realized_avg NUMERIC(20, 6) NOT NULL DEFAULT 0,
+            realized_fifo NUMERIC(20, 6) NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (portfolio_id, symbol)
+        )
+    """)
+    rebuild_ledger(cur)
+
+
+def _jobs_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS Jobs (
+            job_id BIGSERIAL PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            params JSONB NOT NULL DEFAULT '{}',
+            dedupe_key TEXT NOT NULL,
+            status VARCHAR(10) NOT NULL DEFAULT 'queued'
+                CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+            status_code INT,
+            result JSONB,
+            error TEXT,
+            attempts INT NOT NULL DEFAULT 0,
+            worker TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+    # At most one in-flight job per identical request
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_inflight_dedupe
+        ON Jobs (dedupe_key) WHERE status IN ('queued', 'running')
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_queued
+        ON Jobs (job_id) WHERE status = 'queued'
+    """)
+
+
+def _single_flight_results(cur):
+    # Short-lived results handed between workers by app/db/singleflight.py
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS SingleFlightResults (
+            key TEXT PRIMARY KEY,
+            body JSONB,
+            status_code INT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL
+        )
+    """)
+
+
+def _price_data_version(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS PriceDataVersion (
+            singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+            version BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+    cur.execute("INSERT INTO PriceDataVersion DEFAULT VALUES ON CONFLICT DO NOTHING")
+
+
+def _price_rollups(cur):
+    # Kept in step with StockPrices by app/db/price_rollups.py
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS StockPriceRollups (
+            resolution VARCHAR(5) NOT NULL CHECK (resolution IN ('week', 'month')),
+            symbol VARCHAR(5) NOT NULL,
+            timestamp DATE NOT NULL,
+            open DOUBLE PRECISION,
+            high DOUBLE PRECISION,
+            low DOUBLE PRECISION,
+            close DOUBLE PRECISION,
+            volume BIGINT,
+            trading_days INT NOT NULL,
+            PRIMARY KEY (resolution, symbol, timestamp)
+        )
+    """)
+    rebuild_rollups(cur)
+
+
+def _market_benchmarks(cur):
+    # Filled on first use by app/db/market.py
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS MarketBenchmarks (
+            benchmark VARCHAR(10) PRIMARY KEY,
+            returns_version BIGINT,
+            betas_version BIGINT,
+            refreshed_at TIMESTAMP
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS MarketReturns (
+            benchmark VARCHAR(10) NOT NULL,
+            timestamp DATE NOT NULL,
+            market_return DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (benchmark, timestamp)
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS SymbolBetas (
+            benchmark VARCHAR(10) NOT NULL,
+            symbol VARCHAR(5) NOT NULL,
+            beta DOUBLE PRECISION,
+            observations INT NOT NULL,
+            PRIMARY KEY (benchmark, symbol)
+        )
+    """)
+
+
+def _job_leases(cur):
+    # Renewed by the worker running the job (app/db/jobs.py); jobs running
+    # when this is applied get an expired lease and are retried
+    cur.execute("ALTER TABLE Jobs ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP")
+    cur.execute("""
+        UPDATE Jobs SET lease_expires_at = CURRENT_TIMESTAMP
+        WHERE status = 'running' AND lease_expires_at IS NULL
+    """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_running_lease
+        ON Jobs (lease_expires_at) WHERE status = 'running'
+    """)
+
+
+def _symbol_price_versions(cur):
+    # Bumped by single-row price writes (app/db/latest_prices.py)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS SymbolPriceVersions (
+            symbol VARCHAR(5) PRIMARY KEY,
+            version BIGINT NOT NULL
+        )
+    """)
+
+
+def _drop_holdings_cost_basis(cur):
+    # PositionLedger.cost_avg is the one record of average cost
+    cur.execute("ALTER TABLE StockHoldings DROP COLUMN IF EXISTS cost_basis")
+
+
+def _job_handles(cur):
+    # Jobs are read back by an unguessable handle, and only by the user who
+    # queued them when there is one (app/db/jobs.py)
+    cur.execute("""
+        ALTER TABLE Jobs
+        ADD COLUMN IF NOT EXISTS handle UUID NOT NULL DEFAULT gen_random_uuid()
+    """)
+    cur.execute("ALTER TABLE Jobs ADD COLUMN IF NOT EXISTS owner_id INT")
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_handle ON Jobs (handle)")
+
+
+def _market_benchmark_writes(cur):
+    # Single-row price writes since the last bulk load that each benchmark's
+    # stored data has seen (app/db/market.py); NULL recomputes once
+    cur.execute("""
+        ALTER TABLE MarketBenchmarks
+        ADD COLUMN IF NOT EXISTS returns_writes BIGINT,
+        ADD COLUMN IF NOT EXISTS betas_writes BIGINT
+    """)
+
+
+# Ordered (version, description, migration); append only, never renumber
+MIGRATIONS = [
+    (1, "Canonical float8/int8 StockPrices columns", _stock_prices_canonical_types),
+    (2, "Full-text and trigram search indexes", _search_indexes),
+    (3, "Reverse Friends index", _friends_reverse_index),
+    (4, "Holding cost basis and latest price snapshot", _holdings_valuation),
+    (5, "FIFO lots and realized P&L ledger", _position_ledger),
+    (6, "Background job queue", _jobs_table),
+    (7, "Shared single-flight results", _single_flight_results),
+    (8, "Price data version counter", _price_data_version),
+    (9, "Weekly and monthly price rollups", _price_rollups),
+    (10, "Stored market benchmark returns and betas", _market_benchmarks),
+    (11, "Job leases", _job_leases),
+    (12, "Per-symbol price versions", _symbol_price_versions),
+    (13, "Cost basis only in PositionLedger", _drop_holdings_cost_basis),
+    (14, "Job handles and owners", _job_handles),
+    (15, "Row-write counts on stored benchmark data", _market_benchmark_writes),
+]
+
+
+def apply_migrations():
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+            try:
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS SchemaMigrations (
+                        version INT PRIMARY KEY,
+                        description TEXT NOT NULL,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                conn.commit()
+
+                cur.execute("SELECT version FROM SchemaMigrations")
+                applied = {row[0] for row in cur.fetchall()}
+
+                # Each migration commits on its own so a failure keeps earlier ones
+                newly_applied = []
+                for version, description, migrate in MIGRATIONS:
+                    if version in applied:
+                        continue
+                    migrate(cur)
+                    cur.execute(
+                        "INSERT INTO SchemaMigrations (version, description) "
+                        "VALUES (%s, %s)",
+                        (version, description),
+                    )
+                    conn.commit()
+                    newly_applied.append(version)
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+                conn.commit()
+
+        return {
+            "success": True,
+            "message": f"Applied {len(newly_applied)} migrations",
+            "applied": newly_applied,
+            "version": max([v for v, _, _ in MIGRATIONS]),
+        }
+    except Exception as e:
+        conn.rollback()
+        return {"success": False, "message": f"Error applying migrations: {str(e)}"}
+    finally:
+        conn.close()
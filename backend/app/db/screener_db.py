@@ -0,0 +1,113 @@
+import os
+from flask import jsonify
+import psycopg2
+from app.executor import AnalyticsTimeout, analytics_pool
+from .base import get_connection
+from .latest_prices import universe_price_version
+from .lru import LRUCache
+from .market import ensure_market_data, fetch_market_returns
+
+# Metrics for the whole symbol universe are computed once per
+# universe_price_version() (and benchmark) from a single price matrix; each screen after that
+# is just a mask and a sort over ~500 values
+SCREENER_LOOKBACK_DAYS = int(os.environ.get("SCREENER_LOOKBACK_DAYS", "400"))
+
+_universe_cache = LRUCache(4)
+
+
+def _universe(conn, benchmark, version):
+    import numpy as np
+    from app.analytics.screener import compute_metrics
+    from .price_arrays import day_to_date_string, fetch_field_matrices
+
+    key = (benchmark, version)
+    cached = _universe_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT symbol FROM LatestStockPrices ORDER BY symbol")
+        symbols = [row[0] for row in cur.fetchall()]
+        # Enough calendar days for the longest (252 trading day) window
+        cur.execute(
+            "SELECT MAX(timestamp) - %s FROM LatestStockPrices",
+            (SCREENER_LOOKBACK_DAYS,),
+        )
+        start_date = cur.fetchone()[0]
+
+    days, prices = fetch_field_matrices(
+        conn, symbols, start_date, fields=("close", "volume")
+    )
+    market_days, market_returns = fetch_market_returns(conn, benchmark, start_date)
+    market = np.full(len(days), np.nan)
+    _, day_idx, market_idx = np.intersect1d(
+        days, market_days, assume_unique=True, return_indices=True
+    )
+    market[day_idx] = market_returns[market_idx]
+
+    metrics = analytics_pool.run(
+        compute_metrics, prices["close"], prices["volume"], market
+    )
+    as_of = day_to_date_string(days[-1]) if len(days) else None
+    result = (symbols, metrics, as_of)
+    _universe_cache.put(key, result)
+    return result
+
+
+def screen_stocks(filter_text="", sort_text="", fields_text="", limit=50):
+    import numpy as np
+    from app.analytics.screener import (
+        evaluate,
+        filter_metrics,
+        parse_fields,
+        parse_filter,
+        parse_sort,
+        sort_order,
+    )
+
+    try:
+        condition = parse_filter(filter_text)
+        sort_keys = parse_sort(sort_text)
+        fields = parse_fields(fields_text)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Anything filtered or sorted on is returned too
+    for name in filter_metrics(condition) + [name for name, _ in sort_keys]:
+        if name not in fields:
+            fields.append(name)
+
+    conn = get_connection()
+    try:
+        benchmark = ensure_market_data(conn)
+        with conn.cursor() as cur:
+            version, writes = universe_price_version(cur)
+        symbols, metrics, as_of = _universe(conn, benchmark, (version, writes))
+
+        matched = np.flatnonzero(evaluate(condition, metrics, len(symbols)))
+        ordered = sort_order(matched, sort_keys, metrics)[:limit]
+
+        results = []
+        for index in ordered:
+            row = {"symbol": symbols[index]}
+            for name in fields:
+                value = float(metrics[name][index])
+                row[name] = round(value, 6) if np.isfinite(value) else None
+            results.append(row)
+
+        return jsonify(
+            {
+                "results": results,
+                "matched": len(matched),
+                "universe_size": len(symbols),
+                "as_of": as_of,
+                "benchmark": benchmark,
+                "price_data_version": version,
+            }
+        ), 200
+    except AnalyticsTimeout as e:
+        return jsonify({"error": str(e)}), 504
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
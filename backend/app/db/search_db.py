@@ -0,0 +1,176 @@
+from flask import jsonify
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from .base import get_connection
+
+# Full-text matches rank by ts_rank, substring/fuzzy ones by trigram similarity.
+# The to_tsvector() expressions must match the GIN indexes in schema.py.
+LIST_VECTOR = "to_tsvector('english', sl.name)"
+REVIEW_VECTOR = "to_tsvector('english', r.content)"
+
+
+# Headlines are HTML: the text is escaped before ts_headline, so the <mark>
+# tags it inserts are the only markup in them. The parser reads the escapes
+# as entities, not words, so they're never highlighted themselves.
+def _escaped(column):
+    text = column
+    for char, entity in (
+        ("&", "&amp;"),
+        ("<", "&lt;"),
+        (">", "&gt;"),
+        ('"', "&quot;"),
+        ("''", "&#39;"),
+    ):
+        text = f"replace({text}, '{char}', '{entity}')"
+    return text
+
+
+NAME_HEADLINE_TEXT = _escaped("page.name")
+REVIEW_HEADLINE_TEXT = _escaped("page.content")
+
+# List names are short, so highlight the whole name; reviews get fragments
+NAME_HEADLINE_OPTIONS = "HighlightAll=true, StartSel=<mark>, StopSel=</mark>"
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20"
+
+# Visible to the user if public, owned, or shared with them while the list
+# is still 'shared' (as reviews_db.can_access_list); user_id may be NULL
+LIST_SHARED_WITH_USER = """
+    (sl.visibility = 'shared' AND EXISTS (
+        SELECT 1 FROM SharedLists sh
+        WHERE sh.list_id = sl.list_id AND sh.shared_user = %(user_id)s
+    ))
+"""
+LIST_ACCESS = f"""
+    (sl.visibility = 'public'
+     OR sl.user_id = %(user_id)s
+     OR {LIST_SHARED_WITH_USER})
+"""
+LIST_ACCESS_TYPE = f"""
+    CASE
+        WHEN sl.user_id = %(user_id)s THEN 'owned'
+        WHEN {LIST_SHARED_WITH_USER} THEN 'shared'
+        ELSE 'public'
+    END
+"""
+# Name matches: full text, substring or trigram similarity (all indexed)
+LIST_NAME_MATCH = f"""
+    ({LIST_VECTOR} @@ websearch_to_tsquery('english', %(term)s)
+     OR sl.name ILIKE %(pattern)s
+     OR sl.name %% %(term)s)
+"""
+
+
+def search_pattern(term):
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _search_params(term, user_id, page, per_page):
+    return {
+        "term": term,
+        "pattern": search_pattern(term),
+        "user_id": user_id,
+        "limit": per_page,
+        "offset": (page - 1) * per_page,
+    }
+
+
+def _paginated(key, rows, page, per_page):
+    total_items = rows[0]["total_items"] if rows else 0
+    for row in rows:
+        del row["total_items"]
+    return jsonify(
+        {
+            key: rows,
+            "pagination": {
+                "page": page,
+                "per_page": per_page,
+                "total_items": total_items,
+                "total_pages": (total_items + per_page - 1) // per_page,
+            },
+        }
+    ), 200
+
+
+def search_stock_lists(term, user_id=None, page=1, per_page=20):
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Matching, access filtering, ranking and the total count happen in
+            # one pass; headlines are only built for the rows on the page
+            cur.execute(
+                f"""
+                WITH q AS (SELECT websearch_to_tsquery('english', %(term)s) AS query),
+                page AS (
+                    SELECT sl.*, u.username AS creator_name,
+                           {LIST_ACCESS_TYPE} AS access_type,
+                           ts_rank({LIST_VECTOR}, q.query)
+                               + similarity(sl.name, %(term)s) AS rank,
+                           COUNT(*) OVER () AS total_items
+                    FROM StockLists sl
+                    CROSS JOIN q
+                    JOIN Users u ON sl.user_id = u.user_id
+                    WHERE {LIST_NAME_MATCH}
+                      AND {LIST_ACCESS}
+                    ORDER BY rank DESC, sl.list_id DESC
+                    LIMIT %(limit)s OFFSET %(offset)s
+                )
+                SELECT page.*,
+                       ts_headline('english', {NAME_HEADLINE_TEXT}, q.query, %(headline)s)
+                           AS highlight
+                FROM page CROSS JOIN q
+                ORDER BY page.rank DESC, page.list_id DESC
+                """,
+                {
+                    **_search_params(term, user_id, page, per_page),
+                    "headline": NAME_HEADLINE_OPTIONS,
+                },
+            )
+            return _paginated("stockLists", cur.fetchall(), page, per_page)
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+
+def search_reviews(term, user_id=None, list_id=None, page=1, per_page=20):
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            params = _search_params(term, user_id, page, per_page)
+            list_filter = ""
+            if list_id:
+                list_filter = "AND r.list_id = %(list_id)s"
+                params["list_id"] = list_id
+
+            cur.execute(
+                f"""
+                WITH q AS (SELECT websearch_to_tsquery('english', %(term)s) AS query),
+                page AS (
+                    SELECT r.*, u.username, sl.name AS list_name,
+                           ts_rank({REVIEW_VECTOR}, q.query)
+                               + similarity(r.content, %(term)s) AS rank,
+                           COUNT(*) OVER () AS total_items
+                    FROM Reviews r
+                    CROSS JOIN q
+                    JOIN StockLists sl ON r.list_id = sl.list_id
+                    JOIN Users u ON r.user_id = u.user_id
+                    WHERE ({REVIEW_VECTOR} @@ q.query OR r.content ILIKE %(pattern)s)
+                      AND {LIST_ACCESS}
+                      {list_filter}
+                    ORDER BY rank DESC, r.timestamp DESC
+                    LIMIT %(limit)s OFFSET %(offset)s
+                )
+                SELECT page.*,
+                       ts_headline('english', {REVIEW_HEADLINE_TEXT}, q.query, %(headline)s)
+                           AS highlight
+                FROM page CROSS JOIN q
+                ORDER BY page.rank DESC, page.timestamp DESC
+                """,
+                {**params, "headline": HEADLINE_OPTIONS},
+            )
+            return _paginated("reviews", cur.fetchall(), page, per_page)
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
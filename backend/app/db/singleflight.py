@@ -0,0 +1,148 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+from flask import Response, jsonify
+from psycopg2.extras import Json
+from .base import DB_POOL_SIZE, get_connection
+
+# Identical concurrent calls of a wrapped function run it once and share the
+# result. Within a process followers wait on the leader's event; with
+# SINGLEFLIGHT_SHARED=on, leaders in different workers also serialize on a
+# Postgres advisory lock and pick up a result stored while they waited.
+SINGLEFLIGHT_SHARED = os.environ.get("SINGLEFLIGHT_SHARED", "off").lower() == "on"
+# Stored results are only read by calls that were already waiting for them
+RESULT_RETENTION_SECONDS = 60
+# A shared leader needs two pooled connections at once (the lock's and
+# compute()'s). Capping shared leaders below the pool size always leaves one
+# for a compute(); leaders over the cap just compute in-process.
+SHARED_LEADERS = max(0, DB_POOL_SIZE // 2)
+
+_calls = {}
+_calls_lock = threading.Lock()
+_shared_slots = threading.BoundedSemaphore(SHARED_LEADERS) if SHARED_LEADERS else None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def materialize(result):
+    # Request-style functions return Response, (Response, status) or plain
+    # dicts; reduce them to a JSON-safe body and a status code
+    status = 200
+    if isinstance(result, tuple):
+        result, status = result[0], result[1]
+    elif isinstance(result, dict) and result.get("success") is False:
+        # Maintenance functions report failure in the body
+        status = 500
+    if not isinstance(result, Response):
+        result = jsonify(result)
+    return result.get_json(), status
+
+
+def _lock_id(key):
+    return int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], "big", signed=True)
+
+
+def _run_shared(key, compute):
+    if _shared_slots is None or not _shared_slots.acquire(blocking=False):
+        return compute()
+    try:
+        return _run_locked(key, compute)
+    finally:
+        _shared_slots.release()
+
+
+def _run_locked(key, compute):
+    # Holds the advisory lock on its own pooled connection while compute()
+    # uses another
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT clock_timestamp()")
+            waiting_since = cur.fetchone()[0]
+            conn.commit()
+            cur.execute("SELECT pg_advisory_lock(%s)", (_lock_id(key),))
+            try:
+                cur.execute(
+                    """
+                    SELECT body, status_code FROM SingleFlightResults
+                    WHERE key = %s AND created_at >= %s
+                    """,
+                    (key, waiting_since),
+                )
+                row = cur.fetchone()
+                conn.commit()
+                if row:
+                    return row[0], row[1]
+
+                body, status = compute()
+                cur.execute(
+                    """
+                    INSERT INTO SingleFlightResults (key, body, status_code, created_at)
+                    VALUES (%s, %s, %s, clock_timestamp())
+                    ON CONFLICT (key) DO UPDATE SET body = EXCLUDED.body,
+                        status_code = EXCLUDED.status_code,
+                        created_at = EXCLUDED.created_at
+                    """,
+                    (key, Json(body), status),
+                )
+                cur.execute(
+                    """
+                    DELETE FROM SingleFlightResults
+                    WHERE created_at < clock_timestamp() - make_interval(secs => %s)
+                    """,
+                    (RESULT_RETENTION_SECONDS,),
+                )
+                conn.commit()
+                return body, status
+            finally:
+                conn.rollback()
+                cur.execute("SELECT pg_advisory_unlock(%s)", (_lock_id(key),))
+                conn.commit()
+    finally:
+        conn.close()
+
+
+def single_flight(name):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = f"{name}:{json.dumps([args, kwargs], sort_keys=True, default=str)}"
+            with _calls_lock:
+                call = _calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _calls[key] = _Call()
+
+            def compute():
+                return materialize(fn(*args, **kwargs))
+
+            if leader:
+                try:
+                    call.result = (
+                        _run_shared(key, compute) if SINGLEFLIGHT_SHARED else compute()
+                    )
+                except Exception as e:
+                    call.error = e
+                finally:
+                    with _calls_lock:
+                        del _calls[key]
+                    call.done.set()
+            else:
+                call.done.wait()
+
+            if call.error:
+                return jsonify({"error": str(call.error)}), 500
+            # Every caller gets its own Response built from the shared body
+            body, status = call.result
+            return jsonify(body), status
+
+        return wrapper
+
+    return decorator
@@ -1,73 +1,177 @@
 from flask import jsonify
 from psycopg2.extras import RealDictCursor
+from app.executor import AnalyticsTimeout, analytics_pool
 from .base import get_connection
-from datetime import datetime, timedelta
-import random
+from .schema import (
+    STOCK_PRICES_COLUMNS,
+    STOCK_PRICES_FIELDS,
+    apply_migrations,
+    backfill_stocks,
+    create_stock_prices_indexes,
+    create_stock_prices_table,
+    partitioning_enabled,
+    swap_stock_prices_table,
+)
+from .latest_prices import record_bulk_price_load, record_price_change
+from .price_rollups import (
+    ROLLUP_INTERVALS,
+    count_rollup_points,
+    fetch_rollups,
+    pick_interval,
+)
+from .singleflight import single_flight
+from .symbol_catalog import symbol_catalog
+from .stock_partitions import (
+    ensure_partition_for_date,
+    forget_known_partitions,
+    is_partitioned,
+    load_stock_partition,
+    partition_name,
+)
+
 
 def create_stock_table():
+    # Never drops StockPrices; creates or upgrades it to the canonical schema
+    return apply_migrations()
+
+
+def load_stock_csv(years=None):
+    from .price_cache import ensure_price_file
+
+    migrated = apply_migrations()
+    if not migrated["success"]:
+        return migrated
+
+    if partitioning_enabled():
+        return load_partitioned_stock_csv(years)
+
     conn = get_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute("DROP TABLE IF EXISTS StockPrices")
-
-        cursor.execute("""
-            CREATE TABLE StockPrices(
-                timestamp DATE, 
-                open REAL NULL,
-                high REAL NULL, 
-                low REAL NULL, 
-                close REAL, 
-                volume INT, 
-                symbol VARCHAR(5),
-                PRIMARY KEY(symbol, timestamp)
-            )
+        # Load into a fresh table and swap it in, so the live table keeps
+        # serving until the new data is complete and indexed
+        cursor.execute("DROP TABLE IF EXISTS stockprices_load")
+        create_stock_prices_table(cursor, "stockprices_load", keys=False)
+        cursor.execute(f"""
+            COPY stockprices_load({STOCK_PRICES_FIELDS}) 
+            FROM '/data/SP500History.csv' 
+            DELIMITER ',' 
+            CSV HEADER
         """)
 
-        # Indexes for efficient querying
-        cursor.execute("""
-            CREATE INDEX idx_stockprices_symbol 
-            ON StockPrices(symbol)
-        """)
+        cursor.execute("SELECT COUNT(*) FROM stockprices_load")
+        count = cursor.fetchone()[0]
 
-        cursor.execute("""
-            CREATE INDEX idx_stockprices_timestamp 
-            ON StockPrices(timestamp)
-        """)
+        # Building indexes after COPY is much cheaper than maintaining them
+        cursor.execute(
+            "ALTER TABLE stockprices_load ADD PRIMARY KEY (symbol, timestamp)"
+        )
+        create_stock_prices_indexes(cursor, "stockprices_load")
+
+        swap_stock_prices_table(cursor, "stockprices_load")
+        backfill_stocks(cursor)
+        record_bulk_price_load(cursor)
 
         conn.commit()
-        return {
-            "success": True,
-            "message": "Stock table created with NULL allowed columns",
-        }
+        symbol_catalog.invalidate()
+        # Workers map the new prices from one file instead of each loading them
+        ensure_price_file(conn)
+        return {"success": True, "message": f"Successfully loaded {count} records"}
     except Exception as e:
         conn.rollback()
-        return {"success": False, "message": f"Error creating table: {str(e)}"}
+        return {"success": False, "message": f"Error loading CSV: {str(e)}"}
     finally:
         cursor.close()
         conn.close()
 
 
-def load_stock_csv():
+def load_partitioned_stock_csv(years=None):
+    from .price_cache import ensure_price_file
+
     conn = get_connection()
     cursor = conn.cursor()
+    swapped = []
+    converting = False
     try:
-        create_stock_table()
-        cursor.execute("DELETE FROM StockPrices")
-        cursor.execute("""
-            COPY StockPrices(timestamp, open, high, low, close, volume, symbol) 
-            FROM '/data/SP500History.csv' 
-            DELIMITER ',' 
+        # Converting from the heap layout builds a new partitioned parent and
+        # swaps it in; otherwise partitions are replaced one by one in place
+        converting = not is_partitioned(conn)
+        parent = "stockprices_load" if converting else "StockPrices"
+        if converting:
+            cursor.execute("DROP TABLE IF EXISTS stockprices_load")
+            create_stock_prices_table(cursor, parent, partitioned=True)
+            forget_known_partitions()
+
+        # Kept across the per-year commits below; dropped when done, since the
+        # connection goes back to the pool with its temp tables
+        cursor.execute("DROP TABLE IF EXISTS StockPricesStaging")
+        cursor.execute(f"""
+            CREATE TEMP TABLE StockPricesStaging ({STOCK_PRICES_COLUMNS})
+        """)
+        cursor.execute(f"""
+            COPY StockPricesStaging({STOCK_PRICES_FIELDS})
+            FROM '/data/SP500History.csv'
+            DELIMITER ','
             CSV HEADER
         """)
 
-        cursor.execute("SELECT COUNT(*) FROM StockPrices")
-        count = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT DISTINCT EXTRACT(YEAR FROM timestamp)::int
+            FROM StockPricesStaging
+            ORDER BY 1
+        """)
+        csv_years = [row[0] for row in cursor.fetchall()]
+        if years and not converting:
+            wanted = {int(year) for year in years}
+            csv_years = [year for year in csv_years if year in wanted]
+
+        # Each year is committed on its own. Replacing a partition detaches
+        # the old one, which locks all of StockPrices until the commit, so
+        # every read waits for each swap; committing per year keeps that to
+        # the catalog changes of one year instead of the whole load.
+        count = 0
+        for year in csv_years:
+            count += load_stock_partition(cursor, year, "StockPricesStaging", parent)
+            conn.commit()
+            swapped.append(year)
+
+        if converting:
+            swap_stock_prices_table(cursor, parent)
+        backfill_stocks(cursor)
+        record_bulk_price_load(cursor)
+        cursor.execute("DROP TABLE StockPricesStaging")
 
         conn.commit()
-        return {"success": True, "message": f"Successfully loaded {count} records"}
+        symbol_catalog.invalidate()
+        # Workers map the new prices from one file instead of each loading them
+        ensure_price_file(conn)
+        return {
+            "success": True,
+            "message": f"Successfully loaded {count} records",
+            "partitions": [partition_name(y) for y in csv_years],
+        }
     except Exception as e:
         conn.rollback()
-        return {"success": False, "message": f"Error loading CSV: {str(e)}"}
+        try:
+            # The temp table would otherwise go back to the pool with the
+            # connection, and a half-built parent would sit until the next load
+            cursor.execute("DROP TABLE IF EXISTS StockPricesStaging")
+            if converting:
+                cursor.execute("DROP TABLE IF EXISTS stockprices_load")
+                forget_known_partitions()
+            elif swapped:
+                # Years already committed are live; caches must not keep
+                # serving what they replaced
+                record_bulk_price_load(cursor)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+        return {
+            "success": False,
+            "message": f"Error loading CSV: {str(e)}",
+            # A failed conversion keeps the old table, so nothing was loaded
+            "partitions": [] if converting else [partition_name(y) for y in swapped],
+        }
     finally:
         cursor.close()
         conn.close()
@@ -157,150 +261,173 @@ def get_stock_data(symbol="", start_date="", end_date="", page=1, per_page=20):
         conn.close()
 
 
-def get_stock_symbols(search="", limit=100):
+def get_resampled_stock_data(
+    symbol, start_date="", end_date="", interval="week", points=None
+):
     conn = get_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            query = """
-                SELECT DISTINCT symbol
-                FROM StockPrices
-            """
-            params = []
-
-            if search:
-                query += " WHERE symbol ILIKE %s"
-                params.append(f"%{search}%")
-
-            query += " ORDER BY symbol LIMIT %s"
-            params.append(limit)
-
-            cur.execute(query, params)
-            symbols = [row["symbol"] for row in cur.fetchall()]
+            if interval == "auto":
+                # Rollup sizes come from the index, so picking is cheap
+                counts = count_rollup_points(cur, symbol, start_date, end_date)
+                interval = pick_interval(counts, points)
+                # Points was a minimum density here, not an LTTB target
+                points = None
+
+            if interval in ROLLUP_INTERVALS:
+                stocks = fetch_rollups(cur, symbol, interval, start_date, end_date)
+                source_points = sum(row["trading_days"] for row in stocks)
+            elif points:
+                stocks, source_points = _lttb_rows(
+                    conn, cur, symbol, start_date, end_date, points
+                )
+            else:
+                stocks = _daily_rows(cur, symbol, start_date, end_date)
+                source_points = len(stocks)
 
-            return jsonify({"symbols": symbols})
+            return jsonify(
+                {
+                    "stocks": stocks,
+                    "symbol": symbol,
+                    "interval": interval,
+                    "points": len(stocks),
+                    "source_points": source_points,
+                }
+            )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
         conn.close()
 
 
-def predict_stock_prices(symbol, days_to_predict=30):
-    conn = get_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                """
-                SELECT timestamp, close 
-                FROM StockPrices 
-                WHERE symbol = %s
-                ORDER BY timestamp ASC
-                """,
-                (symbol,),
-            )
-
-            historical_data = cur.fetchall()
-
-            if not historical_data:
-                return jsonify({"error": f"No historical data found for {symbol}"}), 404
-
-            # Extract close prices for prediction
-            prices = [float(item["close"]) for item in historical_data]
-            dates = [item["timestamp"] for item in historical_data]
+def _daily_rows(cur, symbol, start_date, end_date):
+    query = "SELECT * FROM StockPrices WHERE symbol = %s"
+    params = [symbol]
+    if start_date:
+        query += " AND timestamp >= %s"
+        params.append(start_date)
+    if end_date:
+        query += " AND timestamp <= %s"
+        params.append(end_date)
+    query += " ORDER BY timestamp"
+
+    cur.execute(query, params)
+    return cur.fetchall()
+
+
+def _lttb_rows(conn, cur, symbol, start_date, end_date, points):
+    # Picks the days on the close series as arrays, then reads back just
+    # those rows so the response has the same shape as get_stock_data
+    import numpy as np
+    from app.analytics.downsample import lttb
+    from .price_arrays import day_to_date_string, fetch_price_series
+
+    days, closes = fetch_price_series(conn, symbol, start_date, end_date)
+    finite = np.isfinite(closes[:, 0])
+    days, closes = days[finite], closes[finite, 0]
+    kept = days[lttb(days, closes, points)]
+
+    cur.execute(
+        """
+        SELECT * FROM StockPrices
+        WHERE symbol = %s AND timestamp = ANY(%s::date[])
+        ORDER BY timestamp
+        """,
+        (symbol, [day_to_date_string(day) for day in kept]),
+    )
+    return cur.fetchall(), len(days)
 
-            # A-Priori Optimization algorithm
-            if len(prices) < 20:
-                return jsonify({"error": "Insufficient data for prediction"}), 400
 
-            # Calculate statistical properties
-            mean_price = sum(prices) / len(prices)
-            last_price = prices[-1]
-
-            # Calculate historical volatility
-            returns = [prices[i] / prices[i - 1] - 1 for i in range(1, len(prices))]
-            mean_return = sum(returns) / len(returns)
-            volatility = (
-                sum((r - mean_return) ** 2 for r in returns) / len(returns)
-            ) ** 0.5
-
-            # Mean reversion factor
-            gamma = min(0.3, volatility * 2)
+def get_stock_symbols(search="", limit=100):
+    try:
+        # Served from the in-memory catalog instead of scanning StockPrices
+        return jsonify({"symbols": symbol_catalog.search(search, limit)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-            # Calculate trend based on recent data (last 5-10 days)
-            lookback = min(10, len(prices) - 1)
-            short_term_trend = (prices[-1] - prices[-lookback]) / lookback
 
-            # Calculate long-term trend
-            long_term_trend = (prices[-1] - prices[0]) / (len(prices) - 1)
+def get_price_matrix(
+    symbols, start_date=None, end_date=None, values="close", fill=False, max_points=None
+):
+    from app.analytics.series import column_lists, forward_fill, sample_rows, transform
+    from .price_arrays import day_to_date_string, fetch_close_matrix
 
-            # Blend short and long term trends based on volatility
-            trend_weight = max(0.3, 1.0 - volatility * 3)
-            trend = (
-                trend_weight * short_term_trend + (1 - trend_weight) * long_term_trend
-            )
+    conn = get_connection()
+    try:
+        # One query for every symbol, aligned on the union of trading days
+        days, closes = fetch_close_matrix(conn, symbols, start_date, end_date)
+        if fill:
+            closes = forward_fill(closes)
+
+        # Sample prices before transforming so returns span the sampled periods
+        total_days = len(days)
+        rows = sample_rows(total_days, max_points)
+        days, closes = days[rows], closes[rows]
+        columns = column_lists(transform(closes, values))
+
+        return jsonify(
+            {
+                "dates": [day_to_date_string(day) for day in days],
+                "series": dict(zip(symbols, columns)),
+                "missing_symbols": [
+                    symbol
+                    for symbol, column in zip(symbols, columns)
+                    if all(value is None for value in column)
+                ],
+                "values": values,
+                "forward_filled": fill,
+                "total_days": total_days,
+            }
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
 
-            # Ensure minimal trend if close to zero (avoid complete flatline)
-            if abs(trend) < 0.001 * last_price:
-                trend = (0.001 * last_price) * (1 if trend >= 0 else -1)
 
-            # Generate predictions
-            last_date = dates[-1]
-            predictions = []
-            current_price = last_price
+@single_flight("predict")
+def predict_stock_prices(symbol, days_to_predict=30):
+    # Analytics modules load on first use (or during startup warm-up)
+    import numpy as np
+    from app.analytics.prediction import predict_prices
+    from .price_arrays import day_to_date_string, fetch_price_series
 
+    conn = get_connection()
+    try:
+        # Full history as arrays: no per-row dicts, dates or Decimal objects
+        days, closes = fetch_price_series(conn, symbol)
+        prices = closes[:, 0]
+        finite = np.isfinite(prices)
+        days, prices = days[finite], prices[finite]
+
+        if not len(prices):
+            return jsonify({"error": f"No historical data found for {symbol}"}), 404
+
+        # A-Priori Optimization algorithm
+        if len(prices) < 20:
+            return jsonify({"error": "Insufficient data for prediction"}), 400
+
+        # The path itself is computed in an analytics worker
+        predictions = analytics_pool.run(
+            predict_prices,
+            prices,
+            day_to_date_string(days[-1]),
+            symbol,
+            days_to_predict,
             # Use combination of symbol and days to ensure consistent predictions for same parameters
-            random.seed(hash(symbol) + days_to_predict)
-
-            for i in range(1, days_to_predict + 1):
-                # Apply mean reversion effect
-                deviation_from_mean = (current_price - mean_price) / mean_price
-                mean_reversion = (
-                    gamma * mean_price * deviation_from_mean * abs(deviation_from_mean)
-                )
-
-                # Calculate next price with volatility-scaled noise
-                noise_scale = volatility * current_price * 0.5
-                noise = random.normalvariate(0, noise_scale)
-
-                # Combine factors to predict next price
-                next_price = current_price + trend - mean_reversion + noise
-
-                # Ensure price doesn't go negative
-                next_price = max(0.01, next_price)
-
-                # Dampen extreme moves based on historical volatility
-                max_daily_move = max(0.1, volatility * 2) * current_price
-                if next_price > current_price + max_daily_move:
-                    next_price = current_price + max_daily_move
-                elif next_price < current_price - max_daily_move:
-                    next_price = current_price - max_daily_move
-
-                # Update price for next iteration
-                current_price = next_price
-
-                # Slightly adjust trend to avoid straight lines
-                trend = 0.95 * trend + 0.05 * mean_return * current_price
-
-                # Calculate next date
-                next_date = (
-                    datetime.strptime(str(last_date), "%Y-%m-%d") + timedelta(days=i)
-                ).strftime("%Y-%m-%d")
-
-                predictions.append(
-                    {
-                        "timestamp": next_date,
-                        "predicted_close": round(next_price, 2),
-                        "symbol": symbol,
-                    }
-                )
-
-            return jsonify(
-                {
-                    "symbol": symbol,
-                    "predictions": predictions,
-                    "method": "A-Priori Optimization with Mean Reversion and Volatility Scaling",
-                }
-            )
-
+            hash(symbol) + days_to_predict,
+        )
+
+        return jsonify(
+            {
+                "symbol": symbol,
+                "predictions": predictions,
+                "method": "A-Priori Optimization with Mean Reversion and Volatility Scaling",
+            }
+        )
+
+    except AnalyticsTimeout as e:
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -331,6 +458,7 @@ def add_custom_stock_data(
                     (open_price, high, low, close, volume, symbol, timestamp),
                 )
                 updated_entry = cur.fetchone()
+                record_price_change(cur, symbol, timestamp, close)
                 conn.commit()
 
                 return jsonify(
@@ -340,6 +468,7 @@ def add_custom_stock_data(
                     }
                 ), 200
             else:
+                ensure_partition_for_date(conn, timestamp)
                 cur.execute(
                     """
                     INSERT INTO StockPrices (symbol, timestamp, open, high, low, close, volume)
@@ -349,7 +478,9 @@ def add_custom_stock_data(
                     (symbol, timestamp, open_price, high, low, close, volume),
                 )
                 new_entry = cur.fetchone()
+                record_price_change(cur, symbol, timestamp, close)
                 conn.commit()
+                symbol_catalog.register(symbol)
 
                 return jsonify(
                     {"message": "Stock data added successfully", "data": new_entry}
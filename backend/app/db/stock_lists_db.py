@@ -1,7 +1,18 @@
 from flask import jsonify
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from app.executor import AnalyticsTimeout, analytics_pool
 from .base import get_connection
+from .prepared import execute_prepared
+from .search_db import (
+    LIST_ACCESS,
+    LIST_ACCESS_TYPE,
+    LIST_NAME_MATCH,
+    search_pattern,
+)
+from .symbol_catalog import symbol_catalog
+from .friend_graph import are_friends_now
+from .singleflight import single_flight
 from datetime import datetime
 
 
@@ -62,6 +73,8 @@ def add_item_to_stock_list(list_id, symbol, num_shares):
             )
             item = cur.fetchone()
         conn.commit()
+        if not stock:
+            symbol_catalog.register(symbol, f"Company {symbol}")
         if item:
             return jsonify({"message": "Stock added to list", "item": item}), 201
         else:
@@ -76,56 +89,36 @@ def get_accessible_stock_lists(user_id=None, search_term=None):
     conn = get_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            params = []
-
-            if user_id:
-                # Get all lists accessible to the user (user created, shared with, public)
-                query = """
-                    SELECT sl.*, u.username as creator_name, 
-                           CASE 
-                               WHEN sl.user_id = %s THEN 'owned' 
-                               WHEN EXISTS (SELECT 1 FROM SharedLists WHERE list_id = sl.list_id AND shared_user = %s) THEN 'shared'
-                               ELSE 'public' 
-                           END as access_type
-                    FROM StockLists sl
-                    JOIN Users u ON sl.user_id = u.user_id
-                    WHERE (sl.user_id = %s
-                       OR EXISTS (SELECT 1 FROM SharedLists WHERE list_id = sl.list_id AND shared_user = %s)
-                       OR (sl.visibility = 'public'))
-                """
-                params.extend([user_id, user_id, user_id, user_id])
-            else:
-                query = """
-                    SELECT sl.*, u.username as creator_name, 'public' as access_type
-                    FROM StockLists sl
-                    JOIN Users u ON sl.user_id = u.user_id
-                    WHERE sl.visibility = 'public'
-                """
-
-            if search_term:
-                query += " AND sl.name ILIKE %s"
-                params.append(f"%{search_term}%")
-
-            query += " ORDER BY sl.list_id DESC;"
-
-            cur.execute(query, params)
-            lists = cur.fetchall()
-
-            # For each list get items
-            for stock_list in lists:
-                cur.execute(
-                    """
-                    SELECT sli.*, s.company_name
-                    FROM StockListItems sli
-                    JOIN Stocks s ON sli.symbol = s.symbol
-                    WHERE sli.list_id = %s;
-                    """,
-                    (stock_list["list_id"],),
-                )
-                items = cur.fetchall()
-                stock_list["items"] = items
-
-            return jsonify({"stockLists": lists}), 200
+            # Lists and their items in one query; the access rule and name
+            # match are the ones /search uses
+            search = f"AND {LIST_NAME_MATCH}" if search_term else ""
+            cur.execute(
+                f"""
+                SELECT sl.*, u.username AS creator_name,
+                       {LIST_ACCESS_TYPE} AS access_type,
+                       COALESCE((
+                           SELECT json_agg(
+                               to_jsonb(sli) || jsonb_build_object(
+                                   'company_name', s.company_name
+                               )
+                               ORDER BY sli.symbol
+                           )
+                           FROM StockListItems sli
+                           JOIN Stocks s ON sli.symbol = s.symbol
+                           WHERE sli.list_id = sl.list_id
+                       ), '[]') AS items
+                FROM StockLists sl
+                JOIN Users u ON sl.user_id = u.user_id
+                WHERE {LIST_ACCESS} {search}
+                ORDER BY sl.list_id DESC
+                """,
+                {
+                    "user_id": user_id,
+                    "term": search_term,
+                    "pattern": search_pattern(search_term) if search_term else None,
+                },
+            )
+            return jsonify({"stockLists": cur.fetchall()}), 200
     except psycopg2.Error as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -350,15 +343,7 @@ def share_stock_list(owner_id, list_id, receiver_id):
                 return jsonify({"error": "You cannot share with yourself"}), 400
 
             # Friendship check
-            user1, user2 = sorted([owner_id, receiver_id])
-            cur.execute(
-                """
-                SELECT 1 FROM Friends 
-                WHERE user1_id = %s AND user2_id = %s
-            """,
-                (user1, user2),
-            )
-            if not cur.fetchone():
+            if not are_friends_now(cur, owner_id, receiver_id):
                 return jsonify({"error": "You can only share with friends"}), 403
 
             # Insert into SharedLists
@@ -380,38 +365,59 @@ def share_stock_list(owner_id, list_id, receiver_id):
         conn.close()
 
 
+def can_view_list(cur, list_id, user_id=None):
+    # Check access (owned, shared, public)
+    if user_id is not None:
+        cur.execute(
+            """
+            SELECT 1
+            FROM StockLists sl
+            LEFT JOIN SharedLists sh ON sl.list_id = sh.list_id AND sh.shared_user = %s
+            WHERE sl.list_id = %s AND (
+                sl.visibility = 'public'
+                OR sl.user_id = %s
+                OR (sl.visibility = 'shared' AND sh.shared_user = %s)
+            )
+        """,
+            (user_id, list_id, user_id, user_id),
+        )
+    else:
+        cur.execute(
+            """
+            SELECT 1
+            FROM StockLists
+            WHERE list_id = %s AND visibility = 'public'
+        """,
+            (list_id,),
+        )
+    return cur.fetchone() is not None
+
+
 def get_stocklist_statistics(list_id, user_id, start_date=None, end_date=None):
     conn = get_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Check access (owned, shared, public)
-            if user_id is not None:
-                cur.execute(
-                    """
-                    SELECT 1
-                    FROM StockLists sl
-                    LEFT JOIN SharedLists sh ON sl.list_id = sh.list_id AND sh.shared_user = %s
-                    WHERE sl.list_id = %s AND (
-                        sl.visibility = 'public'
-                        OR sl.user_id = %s
-                        OR sh.shared_user = %s
-                    )
-                """,
-                    (user_id, list_id, user_id, user_id),
-                )
-            else:
-                cur.execute(
-                    """
-                    SELECT 1
-                    FROM StockLists
-                    WHERE list_id = %s AND visibility = 'public'
-                """,
-                    (list_id,),
-                )
-
-            if not cur.fetchone():
+            if not can_view_list(cur, list_id, user_id):
                 return jsonify({"error": "Stock list not found or access denied"}), 403
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+    # Statistics depend only on the list, so every user opening it can share
+    # one in-flight computation
+    return compute_stocklist_statistics(list_id, start_date, end_date)
 
+
+@single_flight("stocklist_statistics")
+def compute_stocklist_statistics(list_id, start_date=None, end_date=None):
+    from app.analytics.statistics import return_statistics
+    from .market import ensure_market_data, fetch_market_returns
+    from .price_arrays import fetch_close_matrix
+
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
             # Fetch stock list items
             cur.execute(
                 """
@@ -446,155 +452,31 @@ def get_stocklist_statistics(list_id, user_id, start_date=None, end_date=None):
                     ), 404
                 start_date = min_date.strftime("%Y-%m-%d")
 
-            symbols_str = "','".join(symbols)
-
             # Daily return stats
-            cur.execute(
-                f"""
-                WITH daily_prices AS (
-                    SELECT 
-                        symbol,
-                        timestamp,
-                        close,
-                        LAG(close) OVER (PARTITION BY symbol ORDER BY timestamp) AS prev_close
-                    FROM StockPrices
-                    WHERE symbol IN ('{symbols_str}')
-                    AND timestamp BETWEEN %s AND %s
-                ),
-                daily_returns AS (
-                    SELECT
-                        symbol,
-                        timestamp,
-                        ((close - prev_close) / prev_close) AS daily_return
-                    FROM daily_prices
-                    WHERE prev_close IS NOT NULL
-                ),
-                stock_stats AS (
-                    SELECT
-                        symbol,
-                        AVG(daily_return) AS mean_return,
-                        STDDEV(daily_return) AS stddev_return,
-                        COUNT(*) AS days
-                    FROM daily_returns
-                    GROUP BY symbol
-                )
-                SELECT
-                    symbol,
-                    mean_return,
-                    stddev_return,
-                    CASE 
-                        WHEN mean_return = 0 THEN NULL
-                        ELSE stddev_return / ABS(mean_return)
-                    END AS coefficient_of_variation,
-                    days
-                FROM stock_stats
-            """,
-                (start_date, end_date),
+            execute_prepared(
+                cur, "symbol_return_stats", (symbols, start_date, end_date)
             )
 
             stock_stats = cur.fetchall()
 
-            # Market returns for beta (NVDA proxy)
-            market_symbol = "NVDA"
-            cur.execute(
-                """
-                WITH prices AS (
-                    SELECT timestamp, close,
-                    LAG(close) OVER (ORDER BY timestamp) AS prev_close
-                    FROM StockPrices
-                    WHERE symbol = %s AND timestamp BETWEEN %s AND %s
-                )
-                SELECT timestamp, ((close - prev_close) / prev_close) AS market_return
-                FROM prices
-                WHERE prev_close IS NOT NULL
-            """,
-                (market_symbol, start_date, end_date),
+            # Stored benchmark returns and every stock's closes from one
+            # query; betas and correlations for all symbols come out of one
+            # call to an analytics worker
+            benchmark = ensure_market_data(conn)
+            market_days, market_returns = fetch_market_returns(
+                conn, benchmark, start_date, end_date
             )
-            market_returns = {
-                r["timestamp"]: r["market_return"] for r in cur.fetchall()
-            }
-
-            # Beta for each stock
-            betas = {}
-            for symbol in symbols:
-                cur.execute(
-                    """
-                    WITH prices AS (
-                        SELECT timestamp, close,
-                        LAG(close) OVER (ORDER BY timestamp) AS prev_close
-                        FROM StockPrices
-                        WHERE symbol = %s AND timestamp BETWEEN %s AND %s
-                    )
-                    SELECT timestamp, ((close - prev_close) / prev_close) AS stock_return
-                    FROM prices
-                    WHERE prev_close IS NOT NULL
-                """,
-                    (symbol, start_date, end_date),
-                )
-                rows = cur.fetchall()
-                pairs = [
-                    (r["stock_return"], market_returns[r["timestamp"]])
-                    for r in rows
-                    if r["timestamp"] in market_returns
-                ]
-
-                if pairs:
-                    stock_mean = sum(x[0] for x in pairs) / len(pairs)
-                    market_mean = sum(x[1] for x in pairs) / len(pairs)
-                    cov = sum(
-                        (x[0] - stock_mean) * (x[1] - market_mean) for x in pairs
-                    ) / len(pairs)
-                    var = sum((x[1] - market_mean) ** 2 for x in pairs) / len(pairs)
-                    betas[symbol] = round(cov / var if var else 0, 4)
-                else:
-                    betas[symbol] = 0
+            days, closes = fetch_close_matrix(conn, symbols, start_date, end_date)
+            beta_values, correlations = analytics_pool.run(
+                return_statistics, market_days, market_returns, days, closes
+            )
+            betas = dict(zip(symbols, beta_values.tolist()))
 
             # Correlation matrix
-            correlation_matrix = []
-            for symbol1 in symbols:
-                correlations = {}
-                for symbol2 in symbols:
-                    if symbol1 == symbol2:
-                        correlations[symbol2] = 1.0
-                        continue
-                    cur.execute(
-                        """
-                        WITH s1 AS (
-                            SELECT timestamp, close, 
-                            LAG(close) OVER (ORDER BY timestamp) AS prev_close
-                            FROM StockPrices WHERE symbol = %s AND timestamp BETWEEN %s AND %s
-                        ),
-                        r1 AS (
-                            SELECT timestamp, ((close - prev_close) / prev_close) AS r
-                            FROM s1 WHERE prev_close IS NOT NULL
-                        ),
-                        s2 AS (
-                            SELECT timestamp, close, 
-                            LAG(close) OVER (ORDER BY timestamp) AS prev_close
-                            FROM StockPrices WHERE symbol = %s AND timestamp BETWEEN %s AND %s
-                        ),
-                        r2 AS (
-                            SELECT timestamp, ((close - prev_close) / prev_close) AS r
-                            FROM s2 WHERE prev_close IS NOT NULL
-                        ),
-                        joined AS (
-                            SELECT r1.r AS r1, r2.r AS r2
-                            FROM r1 JOIN r2 ON r1.timestamp = r2.timestamp
-                        )
-                        SELECT CORR(r1, r2) AS correlation FROM joined
-                    """,
-                        (symbol1, start_date, end_date, symbol2, start_date, end_date),
-                    )
-                    result = cur.fetchone()
-                    correlation = (
-                        result["correlation"]
-                        if result and result["correlation"] is not None
-                        else 0
-                    )
-                    correlations[symbol2] = round(correlation, 4)
-                correlation_matrix.append(
-                    {"symbol": symbol1, "correlations": correlations}
-                )
+            correlation_matrix = [
+                {"symbol": symbol, "correlations": dict(zip(symbols, row))}
+                for symbol, row in zip(symbols, correlations.tolist())
+            ]
 
             # Add beta to stats and compute list beta
             total_shares = sum(h["num_shares"] for h in holdings)
@@ -619,12 +501,15 @@ def get_stocklist_statistics(list_id, user_id, start_date=None, end_date=None):
                 {
                     "list_id": list_id,
                     "date_range": {"start_date": start_date, "end_date": end_date},
+                    "benchmark": benchmark,
                     "stock_statistics": enriched_stats,
                     "list_beta": list_beta,
                     "correlation_matrix": correlation_matrix,
                 }
             ), 200
 
+    except AnalyticsTimeout as e:
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -0,0 +1,165 @@
+import threading
+from .base import get_connection
+from .schema import partitioning_enabled
+
+# Years known to have a partition in this process (avoids DDL lookups per write)
+_known_partitions = set()
+_partitions_lock = threading.Lock()
+
+
+def partition_name(year):
+    return f"stockprices_y{int(year)}"
+
+
+def partition_bounds(year):
+    year = int(year)
+    return f"{year}-01-01", f"{year + 1}-01-01"
+
+
+def _relation_exists(cur, name):
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+    return cur.fetchone()[0]
+
+
+def is_partitioned(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT EXISTS(
+                SELECT 1 FROM pg_partitioned_table pt
+                JOIN pg_class c ON c.oid = pt.partrelid
+                WHERE c.relname = 'stockprices'
+            )
+        """
+        )
+        return cur.fetchone()[0]
+
+
+def forget_known_partitions():
+    with _partitions_lock:
+        _known_partitions.clear()
+
+
+def list_stock_partitions(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = 'stockprices'
+            ORDER BY c.relname
+        """
+        )
+        return [row[0] for row in cur.fetchall()]
+
+
+def ensure_stock_partition(conn, year):
+    year = int(year)
+    if year in _known_partitions:
+        return False
+
+    start, end = partition_bounds(year)
+    name = partition_name(year)
+    with conn.cursor() as cur:
+        exists = _relation_exists(cur, name)
+        if not exists:
+            cur.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF StockPrices "
+                "FOR VALUES FROM (%s) TO (%s)",
+                (start, end),
+            )
+
+    # A partition created here only becomes visible once the caller commits,
+    # so it is remembered on the next lookup rather than now
+    if exists:
+        with _partitions_lock:
+            _known_partitions.add(year)
+    return not exists
+
+
+def ensure_partition_for_date(conn, date_value):
+    # Write paths call this before inserting a daily row so a new year never
+    # fails with "no partition of relation found for row"
+    if partitioning_enabled():
+        ensure_stock_partition(conn, str(date_value)[:4])
+
+
+def load_stock_partition(cur, year, source_table, parent="StockPrices"):
+    # Build the partition as a standalone table (no indexes while loading),
+    # then swap it in with ATTACH. Replacing an existing partition DETACHes
+    # it, which takes ACCESS EXCLUSIVE on the parent: reads of every year
+    # wait from there until the caller commits, so commit right after.
+    year = int(year)
+    start, end = partition_bounds(year)
+    name = partition_name(year)
+    staging = f"{name}_load"
+
+    cur.execute(f"DROP TABLE IF EXISTS {staging}")
+    cur.execute(f"CREATE TABLE {staging} (LIKE {parent} INCLUDING DEFAULTS)")
+    cur.execute(
+        f"""
+        INSERT INTO {staging} (timestamp, open, high, low, close, volume, symbol)
+        SELECT timestamp, open, high, low, close, volume, symbol
+        FROM {source_table}
+        WHERE timestamp >= %s AND timestamp < %s
+        ORDER BY timestamp, symbol
+    """,
+        (start, end),
+    )
+    rows = cur.rowcount
+
+    # Matching indexes are adopted by ATTACH instead of being rebuilt, and the
+    # CHECK constraint lets Postgres skip the partition bound validation scan
+    cur.execute(f"ALTER TABLE {staging} ADD PRIMARY KEY (symbol, timestamp)")
+    cur.execute(
+        f"CREATE INDEX {staging}_timestamp_brin ON {staging} USING BRIN (timestamp)"
+    )
+    cur.execute(
+        f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_bounds "
+        "CHECK (timestamp >= %s AND timestamp < %s)",
+        (start, end),
+    )
+
+    if _relation_exists(cur, name):
+        cur.execute(f"ALTER TABLE {parent} DETACH PARTITION {name}")
+        cur.execute(f"DROP TABLE {name}")
+
+    cur.execute(f"ALTER TABLE {staging} RENAME TO {name}")
+    cur.execute(f"ALTER INDEX {staging}_pkey RENAME TO {name}_pkey")
+    cur.execute(f"ALTER INDEX {staging}_timestamp_brin RENAME TO {name}_timestamp_brin")
+    cur.execute(
+        f"ALTER TABLE {parent} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+        (start, end),
+    )
+    cur.execute(f"ALTER TABLE {name} DROP CONSTRAINT {staging}_bounds")
+    return rows
+
+
+def create_stock_partitions(start_year, end_year):
+    conn = get_connection()
+    try:
+        if not is_partitioned(conn):
+            return {
+                "success": False,
+                "message": "StockPrices is not partitioned",
+            }
+
+        created = [
+            year
+            for year in range(int(start_year), int(end_year) + 1)
+            if ensure_stock_partition(conn, year)
+        ]
+        conn.commit()
+        return {
+            "success": True,
+            "message": f"Created {len(created)} partitions",
+            "created": created,
+            "partitions": list_stock_partitions(conn),
+        }
+    except Exception as e:
+        conn.rollback()
+        return {"success": False, "message": f"Error creating partitions: {str(e)}"}
+    finally:
+        conn.close()
@@ -1,7 +1,14 @@
 from flask import jsonify
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from app.executor import AnalyticsTimeout, analytics_pool
 from .base import get_connection
+from .prepared import execute_prepared
+from .stock_partitions import ensure_partition_for_date
+from .latest_prices import record_price_change
+from .ledger import COST_METHODS, apply_trade, rebuild_ledger
+from .singleflight import single_flight
+from .symbol_catalog import symbol_catalog
 from datetime import datetime
 
 
@@ -27,10 +34,7 @@ def handle_stock_transaction(
 
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             # Check if user owns the portfolio
-            cur.execute(
-                "SELECT user_id FROM Portfolios WHERE portfolio_id = %s",
-                (portfolio_id,),
-            )
+            execute_prepared(cur, "portfolio_owner", (portfolio_id,))
             portfolio = cur.fetchone()
 
             if not portfolio:
@@ -52,13 +56,6 @@ def handle_stock_transaction(
                     (symbol, f"Company {symbol}"),
                 )
 
-            # Get most recent stock price
-            cur.execute(
-                "SELECT * FROM StockPrices WHERE symbol = %s ORDER BY timestamp DESC LIMIT 1",
-                (symbol,),
-            )
-            latest_price = cur.fetchone()
-
             # Check if user owns enough shares
             if transaction_type == "sell":
                 cur.execute(
@@ -94,22 +91,22 @@ def handle_stock_transaction(
                 (balance_change, portfolio_id),
             )
 
-            # Update or insert stock holding
+            # Update or insert stock holding; cost basis lives in PositionLedger
             if transaction_type == "buy":
                 cur.execute(
                     """
                     INSERT INTO StockHoldings (portfolio_id, symbol, num_shares) 
                     VALUES (%s, %s, %s)
                     ON CONFLICT (portfolio_id, symbol) 
-                    DO UPDATE SET num_shares = StockHoldings.num_shares + %s
+                    DO UPDATE SET num_shares = StockHoldings.num_shares + EXCLUDED.num_shares
                 """,
-                    (portfolio_id, symbol, num_shares, num_shares),
+                    (portfolio_id, symbol, num_shares),
                 )
             else:
                 cur.execute(
                     """
                     UPDATE StockHoldings 
-                    SET num_shares = num_shares - %s 
+                    SET num_shares = num_shares - %s
                     WHERE portfolio_id = %s AND symbol = %s
                 """,
                     (num_shares, portfolio_id, symbol),
@@ -136,6 +133,7 @@ def handle_stock_transaction(
             )
 
             transaction = cur.fetchone()
+            apply_trade(cur, transaction)
 
             # Record price data if it's for today and dne
             cur.execute(
@@ -146,6 +144,7 @@ def handle_stock_transaction(
 
             if not existing_price_data and current_date >= "2018-02-08":
                 # Record  transactions price as todays price
+                ensure_partition_for_date(conn, current_date)
                 cur.execute(
                     """
                     INSERT INTO StockPrices (symbol, timestamp, open, high, low, close, volume)
@@ -161,8 +160,11 @@ def handle_stock_transaction(
                         num_shares,
                     ),
                 )
+                record_price_change(cur, symbol, current_date, price_per_share)
 
             conn.commit()
+            if not stock:
+                symbol_catalog.register(symbol, f"Company {symbol}")
 
             # Get updated balance and holdings
             cur.execute(
@@ -200,10 +202,7 @@ def get_portfolio_stock_transactions(portfolio_id, user_id):
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             # Check if user owns portfolio
-            cur.execute(
-                "SELECT 1 FROM Portfolios WHERE portfolio_id = %s AND user_id = %s",
-                (portfolio_id, user_id),
-            )
+            execute_prepared(cur, "portfolio_owned_by", (portfolio_id, user_id))
 
             if not cur.fetchone():
                 return jsonify({"error": "Portfolio not found or access denied"}), 403
@@ -234,10 +233,7 @@ def get_stock_holdings(portfolio_id, user_id):
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             # Check if user owns portfolio
-            cur.execute(
-                "SELECT 1 FROM Portfolios WHERE portfolio_id = %s AND user_id = %s",
-                (portfolio_id, user_id),
-            )
+            execute_prepared(cur, "portfolio_owned_by", (portfolio_id, user_id))
 
             if not cur.fetchone():
                 return jsonify({"error": "Portfolio not found or access denied"}), 403
@@ -246,11 +242,10 @@ def get_stock_holdings(portfolio_id, user_id):
             cur.execute(
                 """
                 SELECT sh.symbol, sh.num_shares, s.company_name,
-                    (SELECT close FROM StockPrices sp 
-                     WHERE sp.symbol = sh.symbol 
-                     ORDER BY timestamp DESC LIMIT 1) as current_price
+                    lp.close as current_price
                 FROM StockHoldings sh
                 JOIN Stocks s ON sh.symbol = s.symbol
+                LEFT JOIN LatestStockPrices lp ON lp.symbol = sh.symbol
                 WHERE sh.portfolio_id = %s
                 ORDER BY s.company_name
             """,
@@ -275,19 +270,102 @@ def get_stock_holdings(portfolio_id, user_id):
         conn.close()
 
 
-def get_portfolio_statistics(portfolio_id, user_id, start_date=None, end_date=None):
+def get_portfolio_pnl(portfolio_id, user_id, method="fifo"):
     conn = get_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             # Check if user owns portfolio
+            execute_prepared(cur, "portfolio_owned_by", (portfolio_id, user_id))
+
+            if not cur.fetchone():
+                return jsonify({"error": "Portfolio not found or access denied"}), 403
+
+            # Column names come from the COST_METHODS whitelist
+            cost, realized = COST_METHODS[method]
             cur.execute(
-                "SELECT 1 FROM Portfolios WHERE portfolio_id = %s AND user_id = %s",
-                (portfolio_id, user_id),
+                f"""
+                SELECT pl.symbol, pl.shares,
+                    pl.{cost}::float8 AS cost_basis,
+                    pl.{realized}::float8 AS realized_pnl,
+                    lp.close AS current_price,
+                    pl.shares * lp.close AS market_value,
+                    pl.shares * lp.close - pl.{cost}::float8 AS unrealized_pnl
+                FROM PositionLedger pl
+                LEFT JOIN LatestStockPrices lp ON lp.symbol = pl.symbol
+                WHERE pl.portfolio_id = %s
+                ORDER BY pl.symbol
+            """,
+                (portfolio_id,),
             )
+            positions = cur.fetchall()
+
+            return jsonify(
+                {
+                    "method": method,
+                    "positions": positions,
+                    "realized_pnl": sum(p["realized_pnl"] for p in positions),
+                    "unrealized_pnl": sum(
+                        p["unrealized_pnl"] or 0 for p in positions if p["shares"]
+                    ),
+                }
+            ), 200
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+
+def rebuild_portfolio_ledger(portfolio_id, user_id):
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Check if user owns portfolio
+            execute_prepared(cur, "portfolio_owned_by", (portfolio_id, user_id))
+
+            if not cur.fetchone():
+                return jsonify({"error": "Portfolio not found or access denied"}), 403
+
+            # Trades on this portfolio wait for the rebuild rather than race it
+            cur.execute(
+                "SELECT 1 FROM Portfolios WHERE portfolio_id = %s FOR UPDATE",
+                (portfolio_id,),
+            )
+            count = rebuild_ledger(cur, portfolio_id)
+        conn.commit()
+        return jsonify({"message": f"Rebuilt {count} positions"}), 200
+    except psycopg2.Error as e:
+        conn.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+
+def get_portfolio_statistics(portfolio_id, user_id, start_date=None, end_date=None):
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Check if user owns portfolio
+            execute_prepared(cur, "portfolio_owned_by", (portfolio_id, user_id))
 
             if not cur.fetchone():
                 return jsonify({"error": "Portfolio not found or access denied"}), 403
+    except psycopg2.Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+    return compute_portfolio_statistics(portfolio_id, start_date, end_date)
 
+
+@single_flight("portfolio_statistics")
+def compute_portfolio_statistics(portfolio_id, start_date=None, end_date=None):
+    from app.analytics.statistics import return_statistics
+    from .market import ensure_market_data, fetch_market_returns
+    from .price_arrays import fetch_close_matrix
+
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
             # Get all holdings for portfolio
             cur.execute(
                 """
@@ -324,255 +402,32 @@ def get_portfolio_statistics(portfolio_id, user_id, start_date=None, end_date=No
 
             # Get symbols list
             symbols = [h["symbol"] for h in holdings]
-            symbols_str = "','".join(symbols)
 
             # Calculate statistics for each holding using SQL window functions
-            cur.execute(
-                f"""
-                WITH daily_prices AS (
-                    SELECT 
-                        symbol,
-                        timestamp,
-                        close,
-                        LAG(close) OVER (PARTITION BY symbol ORDER BY timestamp) AS prev_close
-                    FROM 
-                        StockPrices
-                    WHERE 
-                        symbol IN ('{symbols_str}')
-                        AND timestamp BETWEEN %s AND %s
-                ),
-                daily_returns AS (
-                    SELECT
-                        symbol,
-                        timestamp,
-                        close,
-                        ((close - prev_close) / prev_close) AS daily_return
-                    FROM
-                        daily_prices
-                    WHERE
-                        prev_close IS NOT NULL
-                ),
-                stock_stats AS (
-                    SELECT
-                        symbol,
-                        AVG(daily_return) AS mean_return,
-                        STDDEV(daily_return) AS stddev_return,
-                        COUNT(*) AS days
-                    FROM
-                        daily_returns
-                    GROUP BY
-                        symbol
-                )
-                SELECT
-                    symbol,
-                    mean_return,
-                    stddev_return,
-                    CASE 
-                        WHEN mean_return = 0 THEN NULL
-                        ELSE stddev_return / ABS(mean_return)
-                    END AS coefficient_of_variation,
-                    days
-                FROM
-                    stock_stats
-            """,
-                (start_date, end_date),
+            execute_prepared(
+                cur, "symbol_return_stats", (symbols, start_date, end_date)
             )
 
             stock_stats = cur.fetchall()
 
-            # Calculate market returns for beta calculation (using NVDA proxy)
-            # Using NVDA as our market proxy instead of SPY for fun :)
-            market_symbol = "NVDA"
-            cur.execute(
-                """
-                WITH market_prices AS (
-                    SELECT 
-                        timestamp,
-                        close,
-                        LAG(close) OVER (ORDER BY timestamp) AS prev_close
-                    FROM 
-                        StockPrices
-                    WHERE 
-                        symbol = %s
-                        AND timestamp BETWEEN %s AND %s
-                ),
-                market_returns AS (
-                    SELECT
-                        timestamp,
-                        ((close - prev_close) / prev_close) AS market_return
-                    FROM
-                        market_prices
-                    WHERE
-                        prev_close IS NOT NULL
-                )
-                SELECT
-                    timestamp,
-                    market_return
-                FROM
-                    market_returns
-                ORDER BY
-                    timestamp
-            """,
-                (market_symbol, start_date, end_date),
+            # Stored benchmark returns and every stock's closes from one
+            # query; betas and correlations for all symbols come out of one
+            # call to an analytics worker
+            benchmark = ensure_market_data(conn)
+            market_days, market_returns = fetch_market_returns(
+                conn, benchmark, start_date, end_date
             )
-
-            market_returns = {
-                row["timestamp"]: row["market_return"] for row in cur.fetchall()
-            }
-
-            # Calculate beta for each stock
-            betas = {}
-            for symbol in symbols:
-                cur.execute(
-                    """
-                    WITH stock_prices AS (
-                        SELECT 
-                            timestamp,
-                            close,
-                            LAG(close) OVER (ORDER BY timestamp) AS prev_close
-                        FROM 
-                            StockPrices
-                        WHERE 
-                            symbol = %s
-                            AND timestamp BETWEEN %s AND %s
-                    ),
-                    stock_returns AS (
-                        SELECT
-                            timestamp,
-                            ((close - prev_close) / prev_close) AS stock_return
-                        FROM
-                            stock_prices
-                        WHERE
-                            prev_close IS NOT NULL
-                    )
-                    SELECT
-                        timestamp,
-                        stock_return
-                    FROM
-                        stock_returns
-                    ORDER BY
-                        timestamp
-                """,
-                    (symbol, start_date, end_date),
-                )
-
-                stock_returns = cur.fetchall()
-
-                # Calculate covariance and beta
-                stock_market_pairs = []
-                for row in stock_returns:
-                    if row["timestamp"] in market_returns:
-                        stock_market_pairs.append(
-                            (row["stock_return"], market_returns[row["timestamp"]])
-                        )
-
-                if stock_market_pairs:
-                    # Calculate means
-                    stock_mean = sum(p[0] for p in stock_market_pairs) / len(
-                        stock_market_pairs
-                    )
-                    market_mean = sum(p[1] for p in stock_market_pairs) / len(
-                        stock_market_pairs
-                    )
-
-                    # Calculate covariance
-                    covariance = sum(
-                        (p[0] - stock_mean) * (p[1] - market_mean)
-                        for p in stock_market_pairs
-                    ) / len(stock_market_pairs)
-
-                    # Calculate market variance
-                    market_variance = sum(
-                        (p[1] - market_mean) ** 2 for p in stock_market_pairs
-                    ) / len(stock_market_pairs)
-
-                    # Calculate beta
-                    beta = covariance / market_variance if market_variance != 0 else 0
-                    betas[symbol] = round(beta, 4)
-                else:
-                    betas[symbol] = 0
+            days, closes = fetch_close_matrix(conn, symbols, start_date, end_date)
+            beta_values, correlations = analytics_pool.run(
+                return_statistics, market_days, market_returns, days, closes
+            )
+            betas = dict(zip(symbols, beta_values.tolist()))
 
             # Calculate correlation matrix
-            correlation_matrix = []
-            for symbol1 in symbols:
-                correlations = {}
-                for symbol2 in symbols:
-                    if symbol1 == symbol2:
-                        correlations[symbol2] = 1.0
-                        continue
-
-                    cur.execute(
-                        """
-                        WITH stock1_prices AS (
-                            SELECT 
-                                timestamp,
-                                close,
-                                LAG(close) OVER (ORDER BY timestamp) AS prev_close
-                            FROM 
-                                StockPrices
-                            WHERE 
-                                symbol = %s
-                                AND timestamp BETWEEN %s AND %s
-                        ),
-                        stock1_returns AS (
-                            SELECT
-                                timestamp,
-                                ((close - prev_close) / prev_close) AS return
-                            FROM
-                                stock1_prices
-                            WHERE
-                                prev_close IS NOT NULL
-                        ),
-                        stock2_prices AS (
-                            SELECT 
-                                timestamp,
-                                close,
-                                LAG(close) OVER (ORDER BY timestamp) AS prev_close
-                            FROM 
-                                StockPrices
-                            WHERE 
-                                symbol = %s
-                                AND timestamp BETWEEN %s AND %s
-                        ),
-                        stock2_returns AS (
-                            SELECT
-                                timestamp,
-                                ((close - prev_close) / prev_close) AS return
-                            FROM
-                                stock2_prices
-                            WHERE
-                                prev_close IS NOT NULL
-                        ),
-                        joined_returns AS (
-                            SELECT
-                                s1.return AS return1,
-                                s2.return AS return2
-                            FROM
-                                stock1_returns s1
-                            JOIN
-                                stock2_returns s2
-                            ON
-                                s1.timestamp = s2.timestamp
-                        )
-                        SELECT
-                            CORR(return1, return2) AS correlation
-                        FROM
-                            joined_returns
-                    """,
-                        (symbol1, start_date, end_date, symbol2, start_date, end_date),
-                    )
-
-                    result = cur.fetchone()
-                    correlation = (
-                        result["correlation"]
-                        if result and result["correlation"] is not None
-                        else 0
-                    )
-                    correlations[symbol2] = round(correlation, 4)
-
-                correlation_matrix.append(
-                    {"symbol": symbol1, "correlations": correlations}
-                )
+            correlation_matrix = [
+                {"symbol": symbol, "correlations": dict(zip(symbols, row))}
+                for symbol, row in zip(symbols, correlations.tolist())
+            ]
 
             # Add beta and coefficient of variation to stock stats
             stats_with_beta = []
@@ -595,12 +450,15 @@ def get_portfolio_statistics(portfolio_id, user_id, start_date=None, end_date=No
                 {
                     "portfolio_id": portfolio_id,
                     "date_range": {"start_date": start_date, "end_date": end_date},
+                    "benchmark": benchmark,
                     "stock_statistics": stats_with_beta,
                     "portfolio_beta": round(portfolio_beta, 4),
                     "correlation_matrix": correlation_matrix,
                 }
             ), 200
 
+    except AnalyticsTimeout as e:
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -0,0 +1,204 @@
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict
+from .base import get_connection
+
+# Other workers register symbols in their own process, so reload periodically
+SYMBOL_CATALOG_TTL = float(os.environ.get("SYMBOL_CATALOG_TTL", "300"))
+
+# Ranking tiers, best first
+EXACT_TICKER = 100
+TICKER_PREFIX = 90
+NAME_PREFIX = 70
+TICKER_SUBSTRING = 60
+NAME_SUBSTRING = 50
+FUZZY = 40
+MIN_SIMILARITY = 0.3
+
+# Substring candidates come from an index of every 1- to 3-character piece of
+# each ticker and name; longer queries intersect their 3-grams' postings
+SUBSTRING_GRAM = 3
+
+
+def ngrams(text, n):
+    return {text[i : i + n] for i in range(len(text) - n + 1)}
+
+
+def trigrams(text):
+    # Same padding as pg_trgm: two leading blanks and one trailing per word
+    grams = set()
+    for word in text.lower().split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class _CatalogIndex:
+    # Immutable snapshot; searches never lock, updates swap in a new one
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.tickers = sorted(entries)
+        self.name_tokens = sorted(
+            (token, symbol)
+            for symbol, name in entries.items()
+            for token in (name or "").lower().split()
+        )
+        self.grams = {}
+        self.gram_index = defaultdict(set)
+        self.substring_index = defaultdict(set)
+        for symbol, name in entries.items():
+            grams = trigrams(f"{symbol} {name or ''}")
+            self.grams[symbol] = grams
+            for gram in grams:
+                self.gram_index[gram].add(symbol)
+            for text in (symbol.lower(), (name or "").lower()):
+                for n in range(1, SUBSTRING_GRAM + 1):
+                    for gram in ngrams(text, n):
+                        self.substring_index[gram].add(symbol)
+
+    def substring_candidates(self, lower):
+        # Superset of the symbols whose ticker or name contains lower
+        grams = ngrams(lower, min(len(lower), SUBSTRING_GRAM))
+        postings = sorted(
+            (self.substring_index.get(gram, set()) for gram in grams), key=len
+        )
+        return postings[0].intersection(*postings[1:])
+
+    def search(self, query, limit):
+        if not query:
+            return self.tickers[:limit]
+
+        upper, lower = query.upper(), query.lower()
+        scores = {}
+
+        def rank(symbol, score):
+            if score > scores.get(symbol, 0):
+                scores[symbol] = score
+
+        if upper in self.entries:
+            rank(upper, EXACT_TICKER)
+
+        # Prefix matches via binary search over the sorted tickers/name words
+        start = bisect.bisect_left(self.tickers, upper)
+        for symbol in self.tickers[start:]:
+            if not symbol.startswith(upper):
+                break
+            rank(symbol, TICKER_PREFIX)
+
+        start = bisect.bisect_left(self.name_tokens, (lower, ""))
+        for token, symbol in self.name_tokens[start:]:
+            if not token.startswith(lower):
+                break
+            rank(symbol, NAME_PREFIX)
+
+        for symbol in self.substring_candidates(lower):
+            name = self.entries[symbol]
+            if upper in symbol:
+                rank(symbol, TICKER_SUBSTRING)
+            elif name and lower in name.lower():
+                rank(symbol, NAME_SUBSTRING)
+
+        # Trigram similarity catches typos and out-of-order fragments
+        query_grams = trigrams(query)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for symbol in self.gram_index.get(gram, ()):
+                shared[symbol] += 1
+        for symbol, count in shared.items():
+            similarity = count / (len(query_grams) + len(self.grams[symbol]) - count)
+            if similarity >= MIN_SIMILARITY:
+                rank(symbol, FUZZY * similarity)
+
+        ranked = sorted(
+            scores.items(), key=lambda item: (-item[1], len(item[0]), item[0])
+        )
+        return [symbol for symbol, _ in ranked[:limit]]
+
+
+class SymbolCatalog:
+    def __init__(self):
+        self._index = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _load_entries(self):
+        conn = get_connection()
+        try:
+            with conn.cursor() as cur:
+                # Loose index scan over the PK: one probe per distinct symbol
+                # instead of a DISTINCT over every price row
+                cur.execute("""
+                    WITH RECURSIVE price_symbols AS (
+                        SELECT MIN(symbol) AS symbol FROM StockPrices
+                        UNION ALL
+                        SELECT (
+                            SELECT MIN(symbol) FROM StockPrices
+                            WHERE symbol > price_symbols.symbol
+                        )
+                        FROM price_symbols
+                        WHERE price_symbols.symbol IS NOT NULL
+                    )
+                    SELECT symbol, NULL FROM price_symbols WHERE symbol IS NOT NULL
+                    UNION ALL
+                    SELECT symbol, company_name FROM Stocks
+                """)
+                entries = {}
+                for symbol, company_name in cur.fetchall():
+                    if company_name or symbol not in entries:
+                        entries[symbol] = company_name
+                return entries
+        finally:
+            conn.close()
+
+    def _stale(self):
+        return time.monotonic() - self._loaded_at > SYMBOL_CATALOG_TTL
+
+    def _current(self):
+        index = self._index
+        if index is not None and not self._stale():
+            return index
+        # One caller reloads. While there is a snapshot the others keep
+        # searching it; with none (first use, invalidated) they wait.
+        if self._refresh_lock.acquire(blocking=index is None):
+            try:
+                index = self._index
+                if index is None or self._stale():
+                    index = self.refresh()
+            finally:
+                self._refresh_lock.release()
+        return index
+
+    def refresh(self):
+        entries = self._load_entries()
+        index = _CatalogIndex(entries)
+        with self._lock:
+            self._index = index
+            self._loaded_at = time.monotonic()
+        return index
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+    def register(self, symbol, company_name=None):
+        with self._lock:
+            index = self._index
+            if index is None:
+                return
+            if symbol in index.entries and (
+                not company_name or index.entries[symbol] == company_name
+            ):
+                return
+            entries = dict(index.entries)
+            entries[symbol] = company_name or entries.get(symbol)
+            self._index = _CatalogIndex(entries)
+
+    def search(self, query="", limit=100):
+        return self._current().search(query.strip(), limit)
+
+
+symbol_catalog = SymbolCatalog()
@@ -0,0 +1,274 @@
+import importlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+# CPU-bound analytics (predictions, statistics, backtests, screens) run in a
+# bounded pool of spawned worker processes, so a long computation doesn't hold
+# the GIL the request threads need. Arrays of SHARED_MEMORY_MIN_BYTES or more
+# are copied once into shared memory and mapped read-only by the worker
+# instead of being pickled through the pipe. A call that outlives its timeout
+# (or is cancelled) kills its worker, which is replaced.
+ANALYTICS_PROCESSES = int(os.environ.get("ANALYTICS_PROCESSES", "2"))
+ANALYTICS_TIMEOUT = float(os.environ.get("ANALYTICS_TIMEOUT", "60"))
+SHARED_MEMORY_MIN_BYTES = 64 * 1024
+
+
+class AnalyticsTimeout(Exception):
+    pass
+
+
+class AnalyticsCancelled(Exception):
+    pass
+
+
+class SharedArray:
+    # Stands in for an array inside a task's arguments
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+
+def _walk(value, convert):
+    if isinstance(value, tuple):
+        return tuple(_walk(item, convert) for item in value)
+    if isinstance(value, list):
+        return [_walk(item, convert) for item in value]
+    if isinstance(value, dict):
+        return {key: _walk(item, convert) for key, item in value.items()}
+    return convert(value)
+
+
+def _share(value, blocks):
+    import numpy as np
+
+    def convert(item):
+        if (
+            not isinstance(item, np.ndarray)
+            or item.nbytes < SHARED_MEMORY_MIN_BYTES
+            or item.dtype.hasobject
+        ):
+            return item
+        block = shared_memory.SharedMemory(create=True, size=item.nbytes)
+        blocks.append(block)
+        np.ndarray(item.shape, item.dtype, buffer=block.buf)[...] = item
+        return SharedArray(block.name, item.shape, item.dtype.str)
+
+    return _walk(value, convert)
+
+
+def _attach(value, blocks):
+    import numpy as np
+
+    def convert(item):
+        if not isinstance(item, SharedArray):
+            return item
+        block = shared_memory.SharedMemory(item.name)
+        blocks.append(block)
+        array = np.ndarray(item.shape, item.dtype, buffer=block.buf)
+        array.flags.writeable = False
+        return array
+
+    return _walk(value, convert)
+
+
+def _release_blocks(blocks, unlink=False):
+    for block in blocks:
+        try:
+            block.close()
+            if unlink:
+                block.unlink()
+        except (BufferError, FileNotFoundError):
+            # A leftover view keeps the mapping until it's collected
+            pass
+
+
+def _worker_main(conn, preload):
+    for module in preload:
+        importlib.import_module(module)
+    while True:
+        try:
+            fn, args, kwargs = conn.recv()
+        except EOFError:
+            return
+        blocks = []
+        try:
+            args, kwargs = _attach((args, kwargs), blocks)
+            reply = (True, fn(*args, **kwargs))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # Result or exception couldn't be pickled; nothing was sent
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+        # Views into the blocks must go before the blocks are closed
+        del args, kwargs, reply
+        _release_blocks(blocks)
+
+
+class _Worker:
+    def __init__(self, context, preload):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child, preload),
+            name="analytics-worker",
+            daemon=True,
+        )
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class Task:
+    # One call running on one worker. result() is for the submitting thread;
+    # cancel() may come from any thread.
+    def __init__(self, pool, worker, blocks):
+        self._pool = pool
+        self._worker = worker
+        self._blocks = blocks
+        self._lock = threading.Lock()
+        self._done = False
+        self._outcome = None
+        self.cancelled = False
+
+    def _finish(self, outcome, replace):
+        # Hands the worker back (or replaces it) exactly once
+        with self._lock:
+            if self._done:
+                return False
+            self._done = True
+            self._outcome = outcome
+            self.cancelled = outcome is None
+        _release_blocks(self._blocks, unlink=True)
+        if replace:
+            self._pool._replace(self._worker)
+        else:
+            self._pool._idle.put(self._worker)
+        return True
+
+    def cancel(self):
+        return self._finish(None, replace=True)
+
+    def result(self, timeout=None):
+        if not self._done:
+            replace = False
+            try:
+                outcome = (
+                    self._worker.conn.recv()
+                    if self._worker.conn.poll(timeout)
+                    else None
+                )
+            except (EOFError, OSError):
+                # Killed by cancel() from another thread, or died on its own
+                outcome = (False, RuntimeError("Analytics worker exited unexpectedly"))
+                replace = True
+            if outcome is None:
+                if self.cancel():
+                    raise AnalyticsTimeout(
+                        f"Analytics computation timed out after {timeout:.1f}s"
+                    )
+            else:
+                self._finish(outcome, replace)
+
+        if self.cancelled:
+            raise AnalyticsCancelled("Analytics computation was cancelled")
+        ok, value = self._outcome
+        if not ok:
+            raise value
+        return value
+
+
+class AnalyticsPool:
+    def __init__(self, processes):
+        self.processes = processes
+        # Spawned, not forked: workers never inherit this process's threads,
+        # locks or database connections
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._preload = ()
+
+    def start(self, preload=None):
+        # preload: modules each worker (and each replacement) imports up front
+        with self._lock:
+            if preload is not None:
+                self._preload = tuple(preload)
+            if not self._started:
+                for _ in range(self.processes):
+                    self._idle.put(_Worker(self._context, self._preload))
+                self._started = True
+
+    def _replace(self, worker):
+        worker.stop()
+        self._idle.put(_Worker(self._context, self._preload))
+
+    def submit(self, fn, args=(), kwargs=None, timeout=None):
+        # Waits up to timeout for an idle worker; fn must be importable
+        # (module level) since it's pickled by name
+        self.start()
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise AnalyticsTimeout("All analytics workers are busy") from None
+
+        blocks = []
+        try:
+            task = (fn, *_share((tuple(args), kwargs or {}), blocks))
+            worker.conn.send(task)
+        except BaseException:
+            _release_blocks(blocks, unlink=True)
+            self._replace(worker)
+            raise
+        return Task(self, worker, blocks)
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        if self.processes <= 0:
+            return fn(*args, **kwargs)
+        deadline = time.monotonic() + (timeout or ANALYTICS_TIMEOUT)
+        task = self.submit(fn, args, kwargs, timeout or ANALYTICS_TIMEOUT)
+        return task.result(max(0.0, deadline - time.monotonic()))
+
+    def map(self, fn, calls, timeout=None):
+        # fn(*args) for each args in calls, side by side on as many workers
+        # as are free; results in call order. Tasks already running never
+        # wait on a worker, so concurrent maps can't deadlock each other.
+        if self.processes <= 0:
+            return [fn(*args) for args in calls]
+        deadline = time.monotonic() + (timeout or ANALYTICS_TIMEOUT)
+
+        def remaining():
+            return max(0.0, deadline - time.monotonic())
+
+        pending, results = [], []
+        try:
+            for args in calls:
+                while True:
+                    try:
+                        wait = 0 if pending else remaining()
+                        pending.append(self.submit(fn, args, timeout=wait))
+                        break
+                    except AnalyticsTimeout:
+                        if not pending:
+                            raise
+                        results.append(pending.pop(0).result(remaining()))
+            while pending:
+                results.append(pending.pop(0).result(remaining()))
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+        return results
+
+
+analytics_pool = AnalyticsPool(ANALYTICS_PROCESSES)
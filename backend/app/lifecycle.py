@@ -0,0 +1,198 @@
+import importlib
+import os
+import threading
+import time
+import psycopg2
+from flask import jsonify, request
+from app.db.base import DB_POOL_SIZE, DB_SETTINGS, get_connection
+from app.db.jobs import start_job_workers
+from app.db.market import ensure_market_data
+from app.db.prepared import prepare_all
+from app.db.schema import apply_migrations
+from app.db.stock_db import check_stock_data_exists, load_stock_csv
+from app.db.symbol_catalog import symbol_catalog
+from app.executor import analytics_pool
+
+# Startup runs in the background: wait for Postgres, migrate, load prices if
+# missing (one process at a time), warm pooled connections and caches, then
+# flip to ready. Until then every route except the probes answers 503.
+
+# Arbitrary key for pg_advisory_lock so only one process loads the CSV
+LOADER_LOCK_ID = 4304302
+DB_RETRY_MAX_DELAY = float(os.environ.get("STARTUP_DB_RETRY_MAX_DELAY", "5"))
+
+# Imported during warm-up so the first analytics request doesn't pay for them
+ANALYTICS_MODULES = [
+    "numpy",
+    "app.db.price_arrays",
+    "app.db.price_cache",
+    "app.analytics.optimizer",
+    "app.analytics.series",
+    "app.analytics.downsample",
+    "app.analytics.indicators",
+    "app.analytics.screener",
+    "app.analytics.backtest",
+    "app.analytics.statistics",
+    "app.analytics.prediction",
+]
+
+UNGATED_PATHS = {"/", "/healthz", "/readyz"}
+
+
+def wait_for_database():
+    delay = 0.1
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            psycopg2.connect(connect_timeout=3, **DB_SETTINGS).close()
+            return attempts
+        except psycopg2.OperationalError as e:
+            if attempts == 1 or attempts % 10 == 0:
+                print(f"Waiting for database (attempt {attempts}): {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, DB_RETRY_MAX_DELAY)
+
+
+def migrate():
+    result = apply_migrations()
+    if not result["success"]:
+        raise RuntimeError(result["message"])
+    return result
+
+
+def load_prices_once():
+    # Other processes block here, then find the data already loaded
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (LOADER_LOCK_ID,))
+            conn.commit()
+            try:
+                if check_stock_data_exists():
+                    return "Stock data already exists"
+                print("Loading stock data from CSV file...")
+                result = load_stock_csv()
+                if not result["success"]:
+                    raise RuntimeError(result["message"])
+                return result["message"]
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (LOADER_LOCK_ID,))
+                conn.commit()
+    finally:
+        conn.close()
+
+
+def warm_pool():
+    # Check out every pooled connection at once so each is opened and has the
+    # hot statements prepared before the first request
+    conns = []
+    try:
+        for _ in range(DB_POOL_SIZE):
+            conns.append(get_connection())
+        for conn in conns:
+            with conn.cursor() as cur:
+                prepare_all(cur)
+            conn.commit()
+    finally:
+        for conn in conns:
+            conn.close()
+    return len(conns)
+
+
+def warm_caches():
+    from app.db.price_cache import ensure_price_file
+
+    for module in ANALYTICS_MODULES:
+        importlib.import_module(module)
+    # Spawned analytics workers import the same modules before traffic
+    analytics_pool.start(preload=ANALYTICS_MODULES)
+    symbol_catalog.refresh()
+    conn = get_connection()
+    try:
+        ensure_market_data(conn, betas=True)
+        # Maps the shared price file, building it first if no process has
+        ensure_price_file(conn)
+    finally:
+        conn.close()
+
+
+class Lifecycle:
+    def __init__(self):
+        self.phase = "idle"
+        self.error = None
+        self.timings = {}
+        self.gating = False
+
+    @property
+    def ready(self):
+        return self.phase == "ready"
+
+    def _step(self, phase, fn):
+        self.phase = phase
+        started = time.perf_counter()
+        result = fn()
+        self.timings[phase] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def run(self, app, boot_started, load_data=True):
+        started = time.perf_counter()
+        self.timings["imports"] = round((started - boot_started) * 1000, 1)
+        try:
+            self._step("waiting_for_db", wait_for_database)
+            self._step("migrating", migrate)
+            if load_data:
+                print(f"Stock data: {self._step('loading', load_prices_once)}")
+            self._step("warming_pool", warm_pool)
+            self._step("warming_caches", warm_caches)
+            start_job_workers(app)
+        except Exception as e:
+            print(f"Startup failed in phase {self.phase}: {e}")
+            self.phase = "failed"
+            self.error = str(e)
+            return
+
+        self.timings["total"] = round((time.perf_counter() - boot_started) * 1000, 1)
+        self.phase = "ready"
+        print(f"Backend ready, startup timings (ms): {self.timings}")
+
+    def start(self, app, boot_started, load_data=True):
+        self.gating = True
+        thread = threading.Thread(
+            target=self.run, args=(app, boot_started, load_data), daemon=True
+        )
+        thread.start()
+        return thread
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "phase": self.phase,
+            "error": self.error,
+            "timings_ms": self.timings,
+        }
+
+
+lifecycle = Lifecycle()
+
+
+def register_lifecycle(app):
+    @app.route("/healthz", methods=["GET"])
+    def healthz():
+        # Liveness only: the process is up and serving
+        return jsonify({"status": "ok"}), 200
+
+    @app.route("/readyz", methods=["GET"])
+    def readyz():
+        ready = lifecycle.ready or not lifecycle.gating
+        return jsonify(lifecycle.status()), 200 if ready else 503
+
+    @app.before_request
+    def gate_until_ready():
+        if not lifecycle.gating or lifecycle.ready:
+            return None
+        if request.path in UNGATED_PATHS or request.method == "OPTIONS":
+            return None
+        response = jsonify({"error": "Service is starting", "phase": lifecycle.phase})
+        response.headers["Retry-After"] = "5"
+        return response, 503
@@ -1,8 +1,7 @@
-from app import create_app
-from app.db.stock_db import load_stock_csv, check_stock_data_exists
+from app import BOOT_STARTED, create_app
+from app.db.stock_db import load_stock_csv
+from app.lifecycle import lifecycle, load_prices_once, migrate
 from flask import jsonify
-import threading
-import time
 import os
 
 app = create_app()
@@ -21,13 +20,8 @@ def load_stocks():
 
 # Load stock data
 def ensure_stock_data_loaded():
-    if not check_stock_data_exists():
-        print("Loading stock data from CSV file...")
-        result = load_stock_csv()
-        print(f"Stock data loading result: {result}")
-        return "Stock data loaded"
-    else:
-        return "Stock data already exists"
+    print(f"Schema migrations: {migrate()}")
+    return load_prices_once()
 
 
 # Route to trigger data loading
@@ -37,20 +31,12 @@ def trigger_data_load():
     return message
 
 
-# Environment variable to indicate first run
+# Environment variable to indicate first run; later runs still migrate and
+# warm up, but skip the price load check
 first_run = os.environ.get("FIRST_RUN", "true").lower() == "true"
 
-if first_run:
-
-    def delayed_data_load():
-        time.sleep(5)
-        ensure_stock_data_loaded()
-
-    thread = threading.Thread(target=delayed_data_load)
-    thread.daemon = True
-    thread.start()
-
-    os.environ["FIRST_RUN"] = "false"
+lifecycle.start(app, BOOT_STARTED, load_data=first_run)
+os.environ["FIRST_RUN"] = "false"
 
 
 if __name__ == "__main__":
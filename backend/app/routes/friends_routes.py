@@ -1,5 +1,10 @@
 from flask import Blueprint, request, jsonify
-from app.db.friends_db import get_users_friends, remove_friend
+from app.db.friends_db import (
+    get_users_friends,
+    remove_friend,
+    get_mutual_friends,
+    get_friend_suggestions,
+)
 
 friends_bp = Blueprint("friends_bp", __name__, url_prefix="/friends")
 
@@ -24,3 +29,28 @@ def delete_friend():
         return jsonify({"error": "User ID and Friend ID are required"}), 400
 
     return remove_friend(user_id, friend_id)
+
+
+@friends_bp.route("/mutual", methods=["GET"])
+def mutual_friends():
+    user_id = request.args.get("userId", type=int)
+    other_id = request.args.get("otherId", type=int)
+
+    if not user_id or not other_id:
+        return jsonify({"error": "User ID and other user ID are required"}), 400
+
+    return get_mutual_friends(user_id, other_id)
+
+
+@friends_bp.route("/suggestions", methods=["GET"])
+def friend_suggestions():
+    user_id = request.args.get("userId", type=int)
+    limit = request.args.get("limit", 10, type=int)
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    if limit < 1 or limit > 100:
+        return jsonify({"error": "Limit must be between 1 and 100"}), 400
+
+    return get_friend_suggestions(user_id, limit)
@@ -0,0 +1,12 @@
+from flask import Blueprint, request
+from app.db.jobs import get_job
+
+jobs_bp = Blueprint("jobs_bp", __name__, url_prefix="/jobs")
+
+
+@jobs_bp.route("/<int:job_id>", methods=["GET"])
+def view_job(job_id):
+    # ?wait=N long-polls up to N seconds for the job to finish
+    wait = request.args.get("wait", 0, type=float)
+
+    return get_job(job_id, max(wait, 0))
@@ -1,15 +1,21 @@
 from flask import Blueprint, request, jsonify
+from app.db.jobs import enqueue_job_response
+from app.db.optimizer_db import optimize_portfolio
 from app.db.portfolios_db import (
     create_portfolio,
     transfer_funds,
     view_user_portfolios,
     get_portfolio_by_id,
+    get_portfolio_summary,
 )
+from app.db.ledger import COST_METHODS
 from app.db.stock_transactions_db import (
     handle_stock_transaction,
     get_portfolio_stock_transactions,
     get_stock_holdings,
     get_portfolio_statistics,
+    get_portfolio_pnl,
+    rebuild_portfolio_ledger,
 )
 
 portfolio_bp = Blueprint("portfolio_bp", __name__, url_prefix="/portfolios")
@@ -96,6 +102,43 @@ def get_portfolio_holdings(portfolio_id):
     return get_stock_holdings(portfolio_id, user_id)
 
 
+@portfolio_bp.route("/<int:portfolio_id>/summary", methods=["GET"])
+def get_summary(portfolio_id):
+    user_id = request.args.get("user_id")
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    return get_portfolio_summary(portfolio_id, user_id)
+
+
+@portfolio_bp.route("/<int:portfolio_id>/pnl", methods=["GET"])
+def get_pnl(portfolio_id):
+    user_id = request.args.get("user_id")
+    method = request.args.get("method", "fifo")
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    if method not in COST_METHODS:
+        return jsonify(
+            {"error": f"Method must be one of: {', '.join(COST_METHODS)}"}
+        ), 400
+
+    return get_portfolio_pnl(portfolio_id, user_id, method)
+
+
+@portfolio_bp.route("/<int:portfolio_id>/ledger/rebuild", methods=["POST"])
+def rebuild_ledger_route(portfolio_id):
+    data = request.json or {}
+    user_id = data.get("user_id")
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    return rebuild_portfolio_ledger(portfolio_id, user_id)
+
+
 @portfolio_bp.route("/<int:portfolio_id>/statistics", methods=["GET"])
 def get_statistics(portfolio_id):
     user_id = request.args.get("user_id")
@@ -105,9 +148,40 @@ def get_statistics(portfolio_id):
     if not user_id:
         return jsonify({"error": "User ID is required"}), 400
 
+    if request.args.get("async") == "1":
+        return enqueue_job_response(
+            "portfolio_statistics",
+            {
+                "portfolio_id": portfolio_id,
+                "user_id": user_id,
+                "start_date": start_date,
+                "end_date": end_date,
+            },
+            owner_id=user_id,
+        )
+
     return get_portfolio_statistics(portfolio_id, user_id, start_date, end_date)
 
 
+@portfolio_bp.route("/<int:portfolio_id>/optimize", methods=["GET"])
+def optimize_portfolio_route(portfolio_id):
+    user_id = request.args.get("user_id")
+    start_date = request.args.get("start_date")
+    end_date = request.args.get("end_date")
+    risk_free_rate = request.args.get("risk_free_rate", 0.0, type=float)
+    points = request.args.get("points", 25, type=int)
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    if points < 2 or points > 200:
+        return jsonify({"error": "Points must be between 2 and 200"}), 400
+
+    return optimize_portfolio(
+        portfolio_id, user_id, start_date, end_date, risk_free_rate, points
+    )
+
+
 @portfolio_bp.route("/transfer", methods=["POST"])
 def transfer_between_portfolios():
     data = request.json
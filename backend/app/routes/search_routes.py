@@ -0,0 +1,47 @@
+from flask import Blueprint, request, jsonify
+from app.db.search_db import search_stock_lists, search_reviews
+
+search_bp = Blueprint("search_bp", __name__, url_prefix="/search")
+
+MAX_PER_PAGE = 100
+
+
+def _search_args():
+    term = request.args.get("q", "").strip()
+    user_id = request.args.get("userId", type=int)
+    page = request.args.get("page", 1, type=int)
+    per_page = request.args.get("per_page", 20, type=int)
+    return term, user_id, page, per_page
+
+
+def _invalid(term, page, per_page):
+    if not term:
+        return jsonify({"error": "Search term is required"}), 400
+    if page < 1 or per_page < 1 or per_page > MAX_PER_PAGE:
+        return jsonify(
+            {"error": f"page must be >= 1 and per_page between 1 and {MAX_PER_PAGE}"}
+        ), 400
+    return None
+
+
+@search_bp.route("/lists", methods=["GET"])
+def search_lists():
+    term, user_id, page, per_page = _search_args()
+
+    error = _invalid(term, page, per_page)
+    if error:
+        return error
+
+    return search_stock_lists(term, user_id, page, per_page)
+
+
+@search_bp.route("/reviews", methods=["GET"])
+def search_review_content():
+    term, user_id, page, per_page = _search_args()
+    list_id = request.args.get("listId", type=int)
+
+    error = _invalid(term, page, per_page)
+    if error:
+        return error
+
+    return search_reviews(term, user_id, list_id, page, per_page)
@@ -1,4 +1,7 @@
 from flask import Blueprint, request, jsonify
+from app.db.backtest_db import backtest_stock_list
+from app.db.jobs import enqueue_job_response
+from app.db.optimizer_db import optimize_stock_list
 from app.db.stock_lists_db import (
     create_stock_list,
     add_item_to_stock_list,
@@ -164,4 +167,57 @@ def view_stocklist_statistics(list_id):
     start_date = request.args.get("start_date")
     end_date = request.args.get("end_date")
 
+    if request.args.get("async") == "1":
+        return enqueue_job_response(
+            "stocklist_statistics",
+            {
+                "list_id": list_id,
+                "user_id": user_id,
+                "start_date": start_date,
+                "end_date": end_date,
+            },
+            owner_id=user_id,
+        )
+
     return get_stocklist_statistics(list_id, user_id, start_date, end_date)
+
+
+@stock_list_bp.route("/<int:list_id>/optimize", methods=["GET"])
+def optimize_list(list_id):
+    user_id = request.args.get("user_id")
+    start_date = request.args.get("start_date")
+    end_date = request.args.get("end_date")
+    risk_free_rate = request.args.get("risk_free_rate", 0.0, type=float)
+    points = request.args.get("points", 25, type=int)
+
+    if points < 2 or points > 200:
+        return jsonify({"error": "Points must be between 2 and 200"}), 400
+
+    return optimize_stock_list(
+        list_id, user_id, start_date, end_date, risk_free_rate, points
+    )
+
+
+@stock_list_bp.route("/<int:list_id>/backtest", methods=["POST"])
+def backtest_list(list_id):
+    data = request.get_json(silent=True) or {}
+    start_date = data.get("start_date")
+    end_date = data.get("end_date")
+    initial_capital = data.get("initial_capital", 10000)
+    risk_free_rate = data.get("risk_free_rate", 0)
+
+    if not isinstance(initial_capital, (int, float)) or initial_capital <= 0:
+        return jsonify({"error": "Initial capital must be a positive number"}), 400
+
+    if not isinstance(risk_free_rate, (int, float)):
+        return jsonify({"error": "Risk-free rate must be a number"}), 400
+
+    return backtest_stock_list(
+        list_id,
+        data.get("user_id"),
+        data.get("variants"),
+        start_date,
+        end_date,
+        float(initial_capital),
+        float(risk_free_rate),
+    )
@@ -1,24 +1,56 @@
 from flask import Blueprint, request, jsonify
+from app.db.backtest_db import backtest_weights
+from app.db.jobs import enqueue_job_response
 from app.db.stock_db import (
     load_stock_csv,
     get_stock_data,
+    get_resampled_stock_data,
     get_stock_symbols,
+    get_price_matrix,
     predict_stock_prices,
     add_custom_stock_data,
 )
+from app.db.export_db import EXPORT_FORMATS, export_stock_prices
+from app.db.indicators_db import get_stock_indicators
+from app.db.market import get_symbol_betas
+from app.db.price_rollups import ROLLUP_INTERVALS
+from app.db.screener_db import screen_stocks
+from app.db.stock_partitions import create_stock_partitions
 from datetime import datetime
 from psycopg2.extras import RealDictCursor
 from app.db.base import get_connection
+from app.db.prepared import execute_prepared
 
 stock_bp = Blueprint("stock_bp", __name__, url_prefix="/stocks")
 
+MAX_MATRIX_SYMBOLS = 50
+MAX_RESAMPLE_POINTS = 5000
+RESAMPLE_INTERVALS = ("day", "auto") + ROLLUP_INTERVALS
+
 
 @stock_bp.route("/load", methods=["POST"])
 def load_stocks():
-    result = load_stock_csv()
+    # Optional list of years limits a partitioned reload to those partitions
+    data = request.get_json(silent=True) or {}
+    if request.args.get("async") == "1":
+        return enqueue_job_response("load_stock_csv", {"years": data.get("years")})
+
+    result = load_stock_csv(data.get("years"))
     return jsonify(result)
 
 
+@stock_bp.route("/partitions", methods=["POST"])
+def create_partitions():
+    data = request.json
+    start_year = data.get("start_year")
+    end_year = data.get("end_year", start_year)
+
+    if not start_year:
+        return jsonify({"error": "Start year is required"}), 400
+
+    return jsonify(create_stock_partitions(start_year, end_year))
+
+
 @stock_bp.route("/", methods=["GET"])
 def get_stocks():
     symbol = request.args.get("symbol", "")
@@ -26,6 +58,33 @@ def get_stocks():
     end_date = request.args.get("end_date", "")
     page = int(request.args.get("page", 1))
     per_page = int(request.args.get("per_page", 20))
+    interval = request.args.get("interval", "day")
+    points = request.args.get("points", type=int)
+
+    # Resampled series come back whole, in one response, instead of paged.
+    # interval=auto uses points as a minimum density and picks the coarsest
+    # resolution that meets it; with interval=day, points selects by LTTB
+    if interval != "day" or points is not None:
+        if not symbol:
+            return jsonify({"error": "Symbol is required for resampling"}), 400
+
+        if interval not in RESAMPLE_INTERVALS:
+            return jsonify({"error": "Interval must be day, week, month or auto"}), 400
+
+        if interval in ROLLUP_INTERVALS and points is not None:
+            return jsonify(
+                {"error": "Points cannot be combined with week or month"}
+            ), 400
+
+        if interval == "auto" and points is None:
+            return jsonify({"error": "Points is required with interval=auto"}), 400
+
+        if points is not None and (points < 3 or points > MAX_RESAMPLE_POINTS):
+            return jsonify(
+                {"error": f"Points must be between 3 and {MAX_RESAMPLE_POINTS}"}
+            ), 400
+
+        return get_resampled_stock_data(symbol, start_date, end_date, interval, points)
 
     return get_stock_data(symbol, start_date, end_date, page, per_page)
 
@@ -38,6 +97,141 @@ def list_symbols():
     return get_stock_symbols(search, limit)
 
 
+def _symbols_arg():
+    # Symbols as ?symbols=AAPL,MSFT or repeated ?symbol=, deduplicated
+    symbols = request.args.getlist("symbol")
+    for value in request.args.getlist("symbols"):
+        symbols.extend(value.split(","))
+    return list(dict.fromkeys(s.strip().upper() for s in symbols if s.strip()))
+
+
+@stock_bp.route("/matrix", methods=["GET"])
+def get_stock_matrix():
+    symbols = _symbols_arg()
+    start_date = request.args.get("start_date")
+    end_date = request.args.get("end_date")
+    values = request.args.get("values", "close")
+    fill = request.args.get("fill") == "1"
+    max_points = request.args.get("max_points", type=int)
+
+    if not symbols:
+        return jsonify({"error": "At least one symbol is required"}), 400
+
+    if len(symbols) > MAX_MATRIX_SYMBOLS:
+        return jsonify(
+            {"error": f"At most {MAX_MATRIX_SYMBOLS} symbols can be compared"}
+        ), 400
+
+    if values not in ("close", "returns", "cumulative"):
+        return jsonify({"error": "Values must be close, returns or cumulative"}), 400
+
+    if max_points is not None and max_points < 2:
+        return jsonify({"error": "Max points must be at least 2"}), 400
+
+    return get_price_matrix(symbols, start_date, end_date, values, fill, max_points)
+
+
+@stock_bp.route("/export", methods=["GET"])
+def export_stocks():
+    # Streams every matching row: ?symbols=AAPL,MSFT&start_date=&end_date=
+    # &format=csv|ndjson, all optional
+    symbols = _symbols_arg()
+    start_date = request.args.get("start_date")
+    end_date = request.args.get("end_date")
+    fmt = request.args.get("format", "csv")
+
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "Format must be csv or ndjson"}), 400
+
+    return export_stock_prices(symbols, start_date, end_date, fmt)
+
+
+@stock_bp.route("/indicators", methods=["GET"])
+def get_indicators():
+    symbols = _symbols_arg()
+    indicators = request.args.get("indicators", "")
+    start_date = request.args.get("start_date")
+    end_date = request.args.get("end_date")
+
+    if not symbols:
+        return jsonify({"error": "At least one symbol is required"}), 400
+
+    if len(symbols) > MAX_MATRIX_SYMBOLS:
+        return jsonify(
+            {"error": f"At most {MAX_MATRIX_SYMBOLS} symbols can be requested"}
+        ), 400
+
+    try:
+        for value in (start_date, end_date):
+            if value:
+                datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+
+    return get_stock_indicators(symbols, indicators, start_date, end_date)
+
+
+@stock_bp.route("/betas", methods=["GET"])
+def get_betas():
+    # Full-history beta of every symbol (or just ?symbols=) against the
+    # configured benchmark, or another one given as ?benchmark= ("equal",
+    # "volume" or a ticker with price history)
+    symbols = _symbols_arg()
+    benchmark = request.args.get("benchmark")
+
+    if benchmark and not (benchmark.isalnum() and len(benchmark) <= 10):
+        return jsonify({"error": "Invalid benchmark"}), 400
+
+    return get_symbol_betas(symbols, benchmark)
+
+
+@stock_bp.route("/screen", methods=["GET"])
+def screen():
+    # e.g. ?filter=return_90 > 0.1 and beta < 0.5&sort=-return_90&limit=20
+    filter_text = request.args.get("filter", "")
+    sort_text = request.args.get("sort", "")
+    fields_text = request.args.get("fields", "")
+    limit = request.args.get("limit", 50, type=int)
+
+    if limit < 1 or limit > 500:
+        return jsonify({"error": "Limit must be between 1 and 500"}), 400
+
+    return screen_stocks(filter_text, sort_text, fields_text, limit)
+
+
+@stock_bp.route("/backtest", methods=["POST"])
+def backtest():
+    # Ad-hoc weights, e.g. {"weights": {"AAPL": 0.6, "MSFT": 0.4}}
+    data = request.get_json(silent=True) or {}
+    start_date = data.get("start_date")
+    end_date = data.get("end_date")
+    initial_capital = data.get("initial_capital", 10000)
+    risk_free_rate = data.get("risk_free_rate", 0)
+
+    if not isinstance(initial_capital, (int, float)) or initial_capital <= 0:
+        return jsonify({"error": "Initial capital must be a positive number"}), 400
+
+    if not isinstance(risk_free_rate, (int, float)):
+        return jsonify({"error": "Risk-free rate must be a number"}), 400
+
+    if not data.get("weights"):
+        return jsonify({"error": "Weights are required"}), 400
+
+    if isinstance(data["weights"], dict) and len(data["weights"]) > MAX_MATRIX_SYMBOLS:
+        return jsonify(
+            {"error": f"At most {MAX_MATRIX_SYMBOLS} symbols can be backtested"}
+        ), 400
+
+    return backtest_weights(
+        data["weights"],
+        data.get("variants"),
+        start_date,
+        end_date,
+        float(initial_capital),
+        float(risk_free_rate),
+    )
+
+
 @stock_bp.route("/predict/<symbol>", methods=["GET"])
 def predict_stock_future(symbol):
     days = request.args.get("days", 30, type=int)
@@ -48,6 +242,11 @@ def predict_stock_future(symbol):
     if days <= 0 or days > 365:
         return jsonify({"error": "Days to predict must be between 1 and 365"}), 400
 
+    if request.args.get("async") == "1":
+        return enqueue_job_response(
+            "predict", {"symbol": symbol, "days_to_predict": days}
+        )
+
     return predict_stock_prices(symbol, days)
 
 
@@ -92,10 +291,7 @@ def get_current_price(symbol):
     conn = get_connection()
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(
-                "SELECT * FROM StockPrices WHERE symbol = %s ORDER BY timestamp DESC LIMIT 1",
-                (symbol.upper(),),
-            )
+            execute_prepared(cur, "latest_price", (symbol.upper(),))
             price_data = cur.fetchone()
 
             if not price_data:
@@ -0,0 +1,354 @@
+"""End-to-end load generator for the SNFS API.
+
+Drives the blueprints registered in ``create_app()`` with a weighted traffic
+mix, either in-process through Flask's test client or over HTTP against a
+running server, and reports throughput, latency percentiles and error rates
+per route for every concurrency stage.
+
+    python -m bench.loadtest --target inprocess --stages 1,4,8 --duration 10
+    python -m bench.loadtest --target http://localhost:8000 \
+        --mix prices=60,stats=15,trades=10,reviews=8,friends=7
+"""
+
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+DEFAULT_MIX = "prices=60,stats=15,trades=10,reviews=8,friends=7"
+
+
+# Each scenario returns (route label, method, path, json body, accepted statuses)
+def price_requests(ctx, rng):
+    symbol = rng.choice(ctx.symbols)
+    choice = rng.random()
+    if choice < 0.5:
+        query = urlencode(
+            {"symbol": symbol, "start_date": ctx.start_date, "per_page": 250}
+        )
+        return "GET /stocks/", "GET", f"/stocks/?{query}", None, (200,)
+    if choice < 0.8:
+        return (
+            "GET /stocks/current-price/<symbol>",
+            "GET",
+            f"/stocks/current-price/{symbol}",
+            None,
+            (200, 404),
+        )
+    if choice < 0.9:
+        query = urlencode({"search": symbol[:1], "limit": 20})
+        return "GET /stocks/symbols", "GET", f"/stocks/symbols?{query}", None, (200,)
+    return (
+        "GET /stocks/predict/<symbol>",
+        "GET",
+        f"/stocks/predict/{symbol}?days=30",
+        None,
+        (200, 400, 404),
+    )
+
+
+def stats_requests(ctx, rng):
+    if rng.random() < 0.5:
+        return (
+            "GET /stocklists/<id>/statistics",
+            "GET",
+            f"/stocklists/{ctx.list_id}/statistics?user_id={ctx.user_id}",
+            None,
+            (200, 404),
+        )
+    return (
+        "GET /portfolios/<id>/statistics",
+        "GET",
+        f"/portfolios/{ctx.portfolio_id}/statistics?user_id={ctx.user_id}",
+        None,
+        (200, 404),
+    )
+
+
+def trade_requests(ctx, rng):
+    if rng.random() < 0.3:
+        return (
+            "GET /portfolios/<id>/holdings",
+            "GET",
+            f"/portfolios/{ctx.portfolio_id}/holdings?user_id={ctx.user_id}",
+            None,
+            (200,),
+        )
+    # Alternate buys and sells so holdings and balance stay roughly flat
+    body = {
+        "portfolio_id": ctx.portfolio_id,
+        "user_id": ctx.user_id,
+        "symbol": rng.choice(ctx.symbols),
+        "transaction_type": "buy" if rng.random() < 0.55 else "sell",
+        "num_shares": 1,
+        "price_per_share": 1,
+    }
+    return (
+        "POST /portfolios/stock-transaction",
+        "POST",
+        "/portfolios/stock-transaction",
+        body,
+        (201, 400),
+    )
+
+
+def review_requests(ctx, rng):
+    if rng.random() < 0.7:
+        return (
+            "GET /reviews/list/<id>",
+            "GET",
+            f"/reviews/list/{ctx.list_id}?user_id={ctx.user_id}",
+            None,
+            (200,),
+        )
+    return (
+        "GET /reviews/user/<id>",
+        "GET",
+        f"/reviews/user/{ctx.user_id}",
+        None,
+        (200,),
+    )
+
+
+def friend_requests(ctx, rng):
+    choice = rng.random()
+    if choice < 0.5:
+        return (
+            "GET /friends/view",
+            "GET",
+            f"/friends/view?userId={ctx.user_id}",
+            None,
+            (200,),
+        )
+    if choice < 0.8 or not ctx.friend_username:
+        return (
+            "GET /requests/view",
+            "GET",
+            f"/requests/view?userId={ctx.user_id}",
+            None,
+            (200,),
+        )
+    # Already friends / already pending are expected answers under load
+    body = {"senderId": ctx.user_id, "receiverUsername": ctx.friend_username}
+    return "POST /requests/send", "POST", "/requests/send", body, (201, 400)
+
+
+SCENARIOS = {
+    "prices": price_requests,
+    "stats": stats_requests,
+    "trades": trade_requests,
+    "reviews": review_requests,
+    "friends": friend_requests,
+}
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}'")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("Traffic mix must have a positive weight")
+    return mix
+
+
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body):
+        response = self.client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HTTPClient:
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        conn_class = (
+            http.client.HTTPSConnection
+            if parts.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.conn = conn_class(parts.netloc, timeout=timeout)
+
+    def request(self, method, path, body):
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            # Drop the keep-alive connection so the next request reconnects
+            self.conn.close()
+            return None
+
+
+class RouteStats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(
+        0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1)
+    )
+    return sorted_values[rank]
+
+
+def run_stage(make_client, ctx, mix, concurrency, duration, seed):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    results = defaultdict(RouteStats)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id):
+        rng = random.Random(seed * 1000 + worker_id)
+        client = make_client()
+        local = defaultdict(RouteStats)
+        while time.perf_counter() < deadline:
+            scenario = SCENARIOS[rng.choices(names, weights)[0]]
+            route, method, path, body, accepted = scenario(ctx, rng)
+            start = time.perf_counter()
+            status = client.request(method, path, body)
+            elapsed = time.perf_counter() - start
+            stats = local[route]
+            stats.latencies.append(elapsed)
+            if status not in accepted:
+                stats.errors += 1
+        with lock:
+            for route, stats in local.items():
+                results[route].latencies.extend(stats.latencies)
+                results[route].errors += stats.errors
+
+    threads = [
+        threading.Thread(target=worker, args=(i,), daemon=True)
+        for i in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    report = {}
+    for route, stats in sorted(results.items()):
+        latencies = sorted(stats.latencies)
+        count = len(latencies)
+        report[route] = {
+            "requests": count,
+            "errors": stats.errors,
+            "throughput_rps": round(count / wall, 2),
+            "error_rate": round(stats.errors / count, 4) if count else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        }
+    total = sum(r["requests"] for r in report.values())
+    errors = sum(r["errors"] for r in report.values())
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(wall, 2),
+        "total_requests": total,
+        "throughput_rps": round(total / wall, 2),
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "routes": report,
+    }
+
+
+def print_stage(stage):
+    print(
+        f"\n== concurrency {stage['concurrency']}: "
+        f"{stage['total_requests']} requests, {stage['throughput_rps']} req/s, "
+        f"error rate {stage['error_rate']:.2%}"
+    )
+    header = f"{'route':<40}{'req':>7}{'rps':>9}{'err':>8}"
+    header += f"{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    for route, r in stage["routes"].items():
+        print(
+            f"{route:<40}{r['requests']:>7}{r['throughput_rps']:>9}"
+            f"{r['error_rate']:>8.2%}{r['p50_ms']:>9}{r['p90_ms']:>9}"
+            f"{r['p99_ms']:>9}{r['max_ms']:>9}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the SNFS API")
+    parser.add_argument(
+        "--target",
+        default="inprocess",
+        help="'inprocess' or a base URL such as http://localhost:8000",
+    )
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument(
+        "--stages", default="1,2,4,8", help="Comma separated concurrency ramp"
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds/stage")
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--portfolio-id", type=int, default=1)
+    parser.add_argument("--list-id", type=int, default=1)
+    parser.add_argument("--friend-username", default="")
+    parser.add_argument("--symbols", default="AAPL,MSFT,AMZN,GOOGL,NVDA,JPM,XOM")
+    parser.add_argument("--start-date", default="2017-01-01")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="json_path", help="Write the report here")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    args.symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+
+    if args.target == "inprocess":
+        from app import create_app
+
+        app = create_app()
+
+        def make_client():
+            return InProcessClient(app)
+    else:
+
+        def make_client():
+            return HTTPClient(args.target, args.timeout)
+
+    stages = []
+    ramp = [int(s) for s in args.stages.split(",") if s.strip()]
+    for seed_offset, concurrency in enumerate(ramp):
+        stage = run_stage(
+            make_client,
+            args,
+            mix,
+            concurrency,
+            args.duration,
+            args.seed + seed_offset,
+        )
+        print_stage(stage)
+        stages.append(stage)
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(
+                {"target": args.target, "mix": mix, "stages": stages}, f, indent=2
+            )
+
+
+if __name__ == "__main__":
+    main()
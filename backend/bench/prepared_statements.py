@@ -0,0 +1,102 @@
+"""Plain vs server-side prepared execution of the hot fixed-shape queries.
+
+For every statement in ``app.db.prepared.PREPARED_QUERIES`` this times N
+executions with the query text re-sent (parse + plan each call) against N
+``EXECUTE`` calls on a pooled connection, and reports the server-side planning
+time of the plain query from ``EXPLAIN (SUMMARY)``.
+
+    python -m bench.prepared_statements --iterations 2000 \
+        --user-id 1 --portfolio-id 1 --symbol AAPL --symbols AAPL,MSFT,NVDA
+"""
+
+import argparse
+import re
+import time
+
+from app.db.base import get_connection
+from app.db.prepared import PREPARED_QUERIES, execute_prepared
+
+
+def sample_params(args):
+    return {
+        "portfolio_owned_by": (args.portfolio_id, args.user_id),
+        "portfolio_owner": (args.portfolio_id,),
+        "latest_price": (args.symbol,),
+        "user_friends": (args.user_id, args.user_id),
+        "symbol_return_stats": (
+            args.symbols.split(","),
+            args.start_date,
+            args.end_date,
+        ),
+    }
+
+
+def planning_time_ms(cur, query, params):
+    cur.execute("EXPLAIN (SUMMARY ON) " + query, params)
+    for (line,) in cur.fetchall():
+        match = re.search(r"Planning Time: ([\d.]+) ms", line)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def time_calls(run, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        run()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--portfolio-id", type=int, default=1)
+    parser.add_argument("--symbol", default="AAPL")
+    parser.add_argument("--symbols", default="AAPL,MSFT,NVDA")
+    parser.add_argument("--start-date", default="2013-02-08")
+    parser.add_argument("--end-date", default="2018-02-07")
+    parser.add_argument("--only", help="Comma separated statement names")
+    args = parser.parse_args(argv)
+
+    params = sample_params(args)
+    names = args.only.split(",") if args.only else list(PREPARED_QUERIES)
+
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            print(
+                f"{'statement':<26}{'plan ms':>9}{'plain us':>11}"
+                f"{'prepared us':>13}{'saved':>8}"
+            )
+            for name in names:
+                query, values = PREPARED_QUERIES[name], params[name]
+
+                def plain():
+                    cur.execute(query, values)
+                    cur.fetchall()
+
+                def prepared():
+                    execute_prepared(cur, name, values)
+                    cur.fetchall()
+
+                # Warm both paths (PREPARE happens on the first call)
+                plain()
+                prepared()
+                plan_ms = planning_time_ms(cur, query, values)
+                plain_us = time_calls(plain, args.iterations)
+                prepared_us = time_calls(prepared, args.iterations)
+                conn.rollback()
+
+                saved = (plain_us - prepared_us) / plain_us if plain_us else 0.0
+                plan = f"{plan_ms:.3f}" if plan_ms is not None else "n/a"
+                print(
+                    f"{name:<26}{plan:>9}{plain_us:>11.1f}"
+                    f"{prepared_us:>13.1f}{saved:>8.1%}"
+                )
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
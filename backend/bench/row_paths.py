@@ -0,0 +1,85 @@
+"""RealDictCursor rows vs the tuple/NumPy fast path on full-history reads.
+
+Fetches the complete price history (one symbol, or every symbol with --all)
+both ways and reports wall time and peak Python heap (tracemalloc) per path.
+It needs a loaded database; no results have been recorded yet, so the array
+path's advantage is expected rather than measured.
+
+    python -m bench.row_paths --symbol AAPL --repeat 5
+    python -m bench.row_paths --all
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from psycopg2.extras import RealDictCursor
+
+from app.db.base import get_connection
+from app.db.price_arrays import DAY_NUMBER, fetch_matrix
+
+FIELDS = ("open", "high", "low", "close", "volume")
+
+
+def dict_rows(conn, where, params):
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(
+            f"SELECT timestamp, {', '.join(FIELDS)} FROM StockPrices {where} "
+            "ORDER BY symbol, timestamp",
+            params,
+        )
+        return cur.fetchall()
+
+
+def array_rows(conn, where, params):
+    columns = ", ".join(f"COALESCE({f}, 'NaN')::float8" for f in FIELDS)
+    return fetch_matrix(
+        conn,
+        f"SELECT {DAY_NUMBER}, {columns} FROM StockPrices {where} "
+        "ORDER BY symbol, timestamp",
+        params,
+        len(FIELDS) + 1,
+    )
+
+
+def measure(fetch, repeat):
+    best = float("inf")
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = fetch()
+        best = min(best, time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        rows = len(result)
+        del result
+    return rows, best, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbol", default="AAPL")
+    parser.add_argument("--all", action="store_true", help="Every symbol")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    where, params = ("", ()) if args.all else ("WHERE symbol = %s", (args.symbol,))
+    conn = get_connection()
+    try:
+        print(f"{'path':<14}{'rows':>10}{'best ms':>10}{'peak MiB':>10}")
+        for name, fetch in (
+            ("RealDictCursor", dict_rows),
+            ("numpy arrays", array_rows),
+        ):
+            rows, seconds, peak = measure(
+                lambda: fetch(conn, where, params), args.repeat
+            )
+            print(f"{name:<14}{rows:>10}{seconds * 1000:>10.1f}{peak / 2**20:>10.1f}")
+            conn.rollback()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
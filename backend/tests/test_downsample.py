@@ -0,0 +1,42 @@
+import numpy as np
+from app.analytics.downsample import lttb
+
+
+def test_short_series_and_tiny_thresholds_keep_every_point():
+    x = np.arange(10)
+    y = np.sin(x)
+    assert np.array_equal(lttb(x, y, 10), np.arange(10))
+    assert np.array_equal(lttb(x, y, 50), np.arange(10))
+    assert np.array_equal(lttb(x, y, 2), np.arange(10))
+
+
+def test_keeps_endpoints_and_one_increasing_point_per_bucket():
+    x = np.arange(1000)
+    y = np.random.default_rng(0).normal(size=1000).cumsum()
+    kept = lttb(x, y, 50)
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 999
+    assert np.all(np.diff(kept) > 0)
+
+    edges = np.linspace(1, 999, 49).astype(np.int64)
+    for bucket, index in enumerate(kept[1:-1]):
+        assert edges[bucket] <= index < edges[bucket + 1]
+
+
+def test_peaks_and_troughs_survive():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[437] = 10.0
+    y[712] = -10.0
+    kept = lttb(x, y, 20)
+    assert 437 in kept
+    assert 712 in kept
+
+
+def test_uneven_x_spacing():
+    # Dates as day numbers skip weekends; x is used as given
+    x = np.array([0, 1, 2, 3, 4, 7, 8, 9, 10, 11, 14, 15], dtype=float)
+    y = np.array([1, 2, 1, 2, 9, 2, 1, 2, 1, 2, 1, 2], dtype=float)
+    kept = lttb(x, y, 5)
+    assert len(kept) == 5
+    assert 4 in kept
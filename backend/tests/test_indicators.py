@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+from app.analytics.indicators import (
+    bollinger,
+    compute,
+    ewm,
+    macd,
+    pack_columns,
+    parse_indicators,
+    rolling_mean,
+    rolling_std,
+    rsi,
+    spec_key,
+)
+
+
+def column(*values):
+    return np.array(values, dtype=float)[:, None]
+
+
+def test_pack_columns_moves_valid_rows_up_in_order():
+    closes = np.array([[np.nan, 1.0], [2.0, np.nan], [3.0, 4.0]])
+    order, (packed,) = pack_columns(np.isfinite(closes), closes)
+    assert np.array_equal(packed[:2, 0], [2.0, 3.0])
+    assert np.array_equal(packed[:2, 1], [1.0, 4.0])
+    assert np.isnan(packed[2]).all()
+    # order maps packed rows back to the original rows (dates)
+    assert np.array_equal(order[:2, 0], [1, 2])
+
+
+def test_rolling_windows_need_a_full_window_of_finite_values():
+    x = column(1, 2, 3, 4, np.nan, 6, 7, 8)
+    mean = rolling_mean(x, 3)[:, 0]
+    assert np.isnan(mean[:2]).all()
+    assert np.allclose(mean[2:4], [2.0, 3.0])
+    assert np.isnan(mean[4:7]).all()
+    assert mean[7] == pytest.approx(7.0)
+
+    std = rolling_std(column(1, 2, 3, 4), 4)[:, 0]
+    assert std[3] == pytest.approx(np.std([1, 2, 3, 4]))
+
+
+def test_ewm_steps_over_gaps_and_honours_min_periods():
+    x = column(1, np.nan, 3)
+    out = ewm(x, 0.5)[:, 0]
+    assert out[0] == 1.0
+    assert np.isnan(out[1])
+    assert out[2] == pytest.approx(2.0)
+    assert np.isnan(ewm(x, 0.5, min_periods=3)[:, 0]).all()
+
+
+def test_rsi_is_100_for_a_series_that_only_rises():
+    value = rsi(column(*range(1, 31)), 14)["rsi"][:, 0]
+    assert np.isnan(value[:14]).all()
+    assert np.allclose(value[14:], 100.0)
+
+
+def test_rsi_of_a_mirrored_series_is_mirrored():
+    # Reflecting prices swaps gains and losses
+    close = 100 + np.random.default_rng(1).normal(size=(60, 1)).cumsum(axis=0)
+    value = rsi(close, 14)["rsi"][14:]
+    mirrored = rsi(200 - close, 14)["rsi"][14:]
+    assert np.allclose(value + mirrored, 100.0)
+
+
+def test_flat_prices_give_zero_macd_and_collapsed_bands():
+    close = column(*([5.0] * 40))
+    lines = macd(close, 3, 6, 2)
+    assert np.allclose(lines["macd"][6:], 0.0)
+    assert np.allclose(lines["histogram"][6:], 0.0)
+
+    bands = bollinger(close, 5, 2.0)
+    assert np.allclose(bands["upper"][4:], 5.0)
+    assert np.allclose(bands["lower"][4:], 5.0)
+
+
+def test_every_symbol_is_computed_independently():
+    close = np.column_stack([np.arange(1.0, 31.0), np.arange(30.0, 0.0, -1)])
+    value = rsi(close, 14)["rsi"]
+    assert np.allclose(value[14:, 0], 100.0)
+    assert np.allclose(value[14:, 1], 0.0)
+
+
+def test_parse_indicators_fills_defaults_and_drops_duplicates():
+    specs = parse_indicators("rsi, MACD:8:21, bollinger:20:2.5, rsi:14")
+    assert specs == [
+        ("rsi", (14,)),
+        ("macd", (8, 21, 9)),
+        ("bollinger", (20, 2.5)),
+    ]
+    assert spec_key("bollinger", (20, 2.5)) == "bollinger:20:2.5"
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["", "sma", "rsi:14:3", "rsi:abc", "rsi:0", "macd:12:26:501"],
+)
+def test_parse_indicators_rejects_bad_specs(text):
+    with pytest.raises(ValueError):
+        parse_indicators(text)
+
+
+def test_compute_keys_results_by_spec():
+    prices = {"close": column(*range(1, 41))}
+    results = compute(parse_indicators("rsi,macd:3:6:2"), prices)
+    assert set(results) == {"rsi:14", "macd:3:6:2"}
+    assert set(results["macd:3:6:2"]) == {"macd", "signal", "histogram"}
@@ -0,0 +1,97 @@
+from datetime import datetime
+from decimal import Decimal
+from psycopg2.extras import RealDictRow
+from app.db.ledger import TRANSACTION_FIELDS, Position, replay
+
+
+def trade(transaction_id, kind, num_shares, price, symbol="AAPL", portfolio_id=1):
+    return (
+        transaction_id,
+        portfolio_id,
+        symbol,
+        kind,
+        num_shares,
+        Decimal(price),
+        datetime(2024, 1, transaction_id),
+    )
+
+
+HISTORY = [
+    trade(1, "buy", 10, "100"),
+    trade(2, "buy", 10, "120"),
+    trade(3, "sell", 15, "130"),
+]
+
+
+def test_position_average_and_fifo_cost():
+    position = Position()
+    position.buy(10, Decimal("100"))
+    position.buy(10, Decimal("120"))
+    touched = position.sell(15, Decimal("130"))
+
+    assert position.shares == 5
+    assert position.cost_avg == Decimal("550")
+    assert position.realized_avg == Decimal("300")
+    # FIFO: all of the first lot, then 5 of the second
+    assert position.cost_fifo == Decimal("600")
+    assert position.realized_fifo == Decimal("350")
+    assert [lot[1] for lot in touched] == [0, 5]
+    assert [lot[1:] for lot in position.lots] == [[5, Decimal("120")]]
+
+
+def test_sell_beyond_known_shares_counts_the_rest_at_zero_cost():
+    position = Position()
+    position.buy(5, Decimal("10"))
+    position.sell(8, Decimal("20"))
+
+    assert position.shares == 0
+    assert position.cost_avg == position.cost_fifo == 0
+    assert position.realized_avg == position.realized_fifo == Decimal("110")
+
+
+def test_replay_matches_incremental_updates():
+    incremental = Position()
+    for _, _, _, kind, num_shares, price, _ in HISTORY:
+        if kind == "buy":
+            incremental.buy(num_shares, price)
+        else:
+            incremental.sell(num_shares, price)
+
+    positions, lots = replay(HISTORY)
+
+    assert positions[(1, "AAPL")].ledger_values() == incremental.ledger_values()
+    # One lot per buy, with what's left of it after the sell
+    assert [(lot[2], lot[6]) for lot in lots] == [(1, 0), (2, 5)]
+
+
+def test_replay_reads_dict_rows():
+    # RealDictCursor rows unpack to their keys, so replay must read by name
+    rows = []
+    for values in HISTORY:
+        row = RealDictRow()
+        row.update(zip(TRANSACTION_FIELDS, values))
+        rows.append(row)
+
+    dict_positions, dict_lots = replay(rows)
+    tuple_positions, tuple_lots = replay(HISTORY)
+
+    assert dict_positions[(1, "AAPL")].ledger_values() == (
+        tuple_positions[(1, "AAPL")].ledger_values()
+    )
+    assert dict_lots == tuple_lots
+
+
+def test_replay_keeps_positions_apart():
+    positions, _ = replay(
+        [
+            trade(1, "buy", 3, "10", symbol="AAPL"),
+            trade(2, "buy", 4, "20", symbol="MSFT"),
+            trade(3, "buy", 5, "30", symbol="AAPL", portfolio_id=2),
+        ]
+    )
+
+    assert {key: p.shares for key, p in positions.items()} == {
+        (1, "AAPL"): 3,
+        (1, "MSFT"): 4,
+        (2, "AAPL"): 5,
+    }
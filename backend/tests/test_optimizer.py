@@ -0,0 +1,37 @@
+import numpy as np
+from app.analytics.optimizer import (
+    max_sharpe_weights,
+    min_variance_weights,
+    portfolio_stats,
+)
+
+
+def test_max_sharpe_with_positive_excess_returns():
+    mean = np.array([0.10, 0.05])
+    cov = np.diag([0.04, 0.01])
+    weights = max_sharpe_weights(mean, cov)
+    expected = np.array([2.5, 5.0]) / 7.5
+    assert np.allclose(weights, expected)
+
+
+def test_max_sharpe_falls_back_without_a_tangency_portfolio():
+    # Every asset loses money: normalizing inv(C)(mu - rf) would give the
+    # lower tangency, the portfolio with the worst Sharpe ratio
+    mean = np.array([-0.10, -0.20, -0.05])
+    cov = np.array(
+        [
+            [0.04, 0.01, 0.00],
+            [0.01, 0.09, 0.02],
+            [0.00, 0.02, 0.16],
+        ]
+    )
+    weights = max_sharpe_weights(mean, cov)
+    min_var = min_variance_weights(cov)
+    assert np.allclose(weights, min_var)
+
+    lower = np.linalg.solve(cov, mean)
+    lower /= lower.sum()
+    assert (
+        portfolio_stats(weights, mean, cov)["sharpe"]
+        > portfolio_stats(lower, mean, cov)["sharpe"]
+    )
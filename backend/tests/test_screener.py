@@ -0,0 +1,175 @@
+import numpy as np
+import pytest
+from app.analytics.screener import (
+    MAX_FILTER_DEPTH,
+    MAX_FILTER_LENGTH,
+    compute_metrics,
+    evaluate,
+    filter_metrics,
+    parse_fields,
+    parse_filter,
+    parse_sort,
+    sort_order,
+)
+
+NAN = np.nan
+
+
+def test_and_binds_tighter_than_or():
+    node = parse_filter("return_90 > 0.1 or beta < 0.5 and close >= 10")
+    assert node == (
+        "or",
+        ("compare", ">", ("metric", "return_90"), ("number", 0.1)),
+        (
+            "and",
+            ("compare", "<", ("metric", "beta_252"), ("number", 0.5)),
+            ("compare", ">=", ("metric", "close"), ("number", 10.0)),
+        ),
+    )
+
+
+def test_parentheses_not_and_negative_numbers():
+    node = parse_filter("NOT (return_21 < -.05 OR close = 1e2)")
+    assert node == (
+        "not",
+        (
+            "or",
+            ("compare", "<", ("metric", "return_21"), ("number", -0.05)),
+            ("compare", "=", ("metric", "close"), ("number", 100.0)),
+        ),
+    )
+    assert filter_metrics(node) == ["return_21", "close"]
+
+
+def test_blank_filter_matches_everything():
+    assert parse_filter("  ") is None
+    assert evaluate(None, {}, 3).tolist() == [True, True, True]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "pe_ratio > 5",
+        "close >",
+        "close > 5 and",
+        "(close > 5",
+        "close > 5)",
+        "close 5",
+        "close > -beta",
+        "close > 5; drop table",
+        "__import__('os')",
+    ],
+)
+def test_invalid_filters_raise_value_error(text):
+    with pytest.raises(ValueError):
+        parse_filter(text)
+
+
+def test_nesting_and_length_are_bounded():
+    deep = "(" * (MAX_FILTER_DEPTH + 1) + "close > 1" + ")" * (MAX_FILTER_DEPTH + 1)
+    with pytest.raises(ValueError, match="nested"):
+        parse_filter(deep)
+    with pytest.raises(ValueError, match="nested"):
+        parse_filter("not " * (MAX_FILTER_DEPTH + 1) + "close > 1")
+
+    allowed = "(" * MAX_FILTER_DEPTH + "close > 1" + ")" * MAX_FILTER_DEPTH
+    assert parse_filter(allowed) is not None
+
+    with pytest.raises(ValueError, match="longer"):
+        parse_filter("close > 1 or " * (MAX_FILTER_LENGTH // 10) + "close > 1")
+
+
+def test_unknown_values_never_match_even_under_not():
+    metrics = {"close": np.array([5.0, NAN, 20.0])}
+    assert evaluate(parse_filter("close > 10"), metrics, 3).tolist() == [
+        False,
+        False,
+        True,
+    ]
+    assert evaluate(parse_filter("not close > 10"), metrics, 3).tolist() == [
+        True,
+        False,
+        False,
+    ]
+    assert evaluate(parse_filter("not not close > 10"), metrics, 3).tolist() == [
+        False,
+        False,
+        True,
+    ]
+
+
+def test_and_or_follow_three_valued_logic():
+    metrics = {
+        "close": np.array([NAN, NAN, NAN, 1.0]),
+        "return_5": np.array([1.0, -1.0, NAN, NAN]),
+    }
+    # unknown OR true is true; unknown AND false is false, so NOT of it is true
+    either = parse_filter("close > 0 or return_5 > 0")
+    assert evaluate(either, metrics, 4).tolist() == [True, False, False, True]
+    neither = parse_filter("not (close > 0 and return_5 > 0)")
+    assert evaluate(neither, metrics, 4).tolist() == [False, True, False, False]
+
+
+def test_comparing_two_metrics_and_constants():
+    metrics = {
+        "return_5": np.array([0.1, 0.2, NAN]),
+        "return_21": np.array([0.2, 0.1, 0.3]),
+    }
+    node = parse_filter("return_5 < return_21")
+    assert evaluate(node, metrics, 3).tolist() == [True, False, False]
+    assert evaluate(parse_filter("1 < 2"), metrics, 3).tolist() == [True] * 3
+
+
+def test_sort_puts_nan_last_in_both_directions():
+    metrics = {"close": np.array([3.0, NAN, 1.0, 2.0])}
+    indexes = np.arange(4)
+    ascending = sort_order(indexes, parse_sort("close"), metrics)
+    descending = sort_order(indexes, parse_sort("-close"), metrics)
+    assert ascending.tolist() == [2, 3, 0, 1]
+    assert descending.tolist() == [0, 3, 2, 1]
+
+
+def test_sort_keys_and_fields():
+    assert parse_sort("-return_90, +beta") == [
+        ("return_90", True),
+        ("beta_252", False),
+    ]
+    assert parse_fields("close,Beta") == ["close", "beta_252"]
+    assert "close" in parse_fields("")
+    with pytest.raises(ValueError):
+        parse_sort("-nope")
+
+
+def test_metrics_measure_back_from_each_symbols_last_close():
+    days = 300
+    growth = 1.001 ** np.arange(days)
+    closes = np.column_stack([100 * growth, 50 * growth])
+    # The second symbol stops trading 10 days early
+    closes[-10:, 1] = NAN
+    volumes = np.full_like(closes, 1000.0)
+    market = np.full(days, 0.001)
+
+    metrics = compute_metrics(closes, volumes, market)
+    assert metrics["close"][0] == pytest.approx(100 * growth[-1])
+    assert metrics["close"][1] == pytest.approx(50 * growth[-11])
+    assert np.allclose(metrics["return_21"], 1.001**21 - 1)
+    assert np.allclose(metrics["volatility_21"], 0.0, atol=1e-9)
+    assert np.allclose(metrics["avg_volume_63"], 1000.0)
+
+
+def test_beta_is_the_slope_on_market_returns():
+    market = np.random.default_rng(2).normal(0, 0.01, 300)
+    market[0] = NAN
+    returns = np.column_stack([1.5 * market, -0.5 * market])
+    closes = 100 * np.cumprod(1 + np.nan_to_num(returns), axis=0)
+    metrics = compute_metrics(closes, np.ones_like(closes), market)
+    assert np.allclose(metrics["beta_252"], [1.5, -0.5])
+    assert np.allclose(metrics["beta_21"], [1.5, -0.5])
+
+
+def test_windows_longer_than_the_history_are_nan():
+    closes = np.linspace(10, 20, 30)[:, None]
+    metrics = compute_metrics(closes, np.ones_like(closes), np.zeros(30))
+    assert np.isfinite(metrics["return_21"][0])
+    assert np.isnan(metrics["return_63"][0])
+    assert np.isnan(metrics["volatility_252"][0])
@@ -48,17 +48,21 @@ CREATE TABLE IF NOT EXISTS StockTransactions (
 );
 
 -- Stock Prices table
+-- Canonical definition (app/db/schema.py): float8/int8 for analytics and no FK
+-- to Stocks so bulk loads skip per-row checks; loaders backfill Stocks instead
 CREATE TABLE IF NOT EXISTS StockPrices (
-    symbol VARCHAR(5) NOT NULL REFERENCES Stocks(symbol) ON DELETE CASCADE,
     timestamp DATE NOT NULL,
-    open DECIMAL(15, 2) NOT NULL,
-    high DECIMAL(15, 2) NOT NULL,
-    low DECIMAL(15, 2) NOT NULL,
-    close DECIMAL(15, 2) NOT NULL,
-    volume BIGINT NOT NULL,
+    open DOUBLE PRECISION NULL,
+    high DOUBLE PRECISION NULL,
+    low DOUBLE PRECISION NULL,
+    close DOUBLE PRECISION,
+    volume BIGINT,
+    symbol VARCHAR(5) NOT NULL,
     PRIMARY KEY (symbol, timestamp)
 );
 
+CREATE INDEX IF NOT EXISTS idx_stockprices_timestamp ON StockPrices(timestamp);
+
 -- Stock Predictions table
 CREATE TABLE IF NOT EXISTS StockPredictions (
     symbol VARCHAR(5) NOT NULL REFERENCES Stocks(symbol) ON DELETE CASCADE,